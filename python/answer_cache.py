@@ -0,0 +1,137 @@
+"""
+SEMANTIC ANSWER CACHE
+Serves a stored answer when a new question is close enough (cosine) to one
+that was already answered. Sits in front of retrieval + LLM in rag_query.
+"""
+
+# ==================== SECTION 1: IMPORTS ====================
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+# ==================== SECTION 2: CACHE ====================
+class SemanticAnswerCache:
+    """
+    Size-bounded LRU + TTL cache keyed by question embedding.
+
+    - get() returns the answer of the most similar cached question if its
+      cosine similarity is >= threshold, else None
+    - entries older than ttl_seconds are dropped
+    - the whole cache is cleared when the Chroma collection is rebuilt
+      (detected through chroma_db/metadata.json, which build_chromadb rewrites)
+    """
+    def __init__(self, threshold=0.92, max_entries=1000, ttl_seconds=3600,
+                 index_marker="./chroma_db/metadata.json"):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.index_marker = index_marker
+
+        self._entries = OrderedDict()   # key -> (unit embedding, answer, created_at)
+        self._next_key = 0
+        self._matrix = None             # stacked embeddings, rebuilt lazily
+        self._matrix_keys = []
+        self._lock = threading.Lock()
+        self._fingerprint = None        # read on first lookup, not at construction
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    # ---------- public API ----------
+    def get(self, embedding):
+        """Return a cached answer for a semantically equivalent question, or None"""
+        vec = self._unit(embedding)
+        with self._lock:
+            self._check_index()
+            self._expire()
+
+            if self._entries:
+                matrix, keys = self._stacked()
+                scores = matrix @ vec
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    key = keys[best]
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return self._entries[key][1]
+
+            self.misses += 1
+            return None
+
+    def put(self, embedding, answer):
+        """Store an answer under its question embedding"""
+        vec = self._unit(embedding)
+        with self._lock:
+            self._check_index()
+            self._entries[self._next_key] = (vec, answer, time.monotonic())
+            self._next_key += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            self._matrix = None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+            self.invalidations += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "threshold": self.threshold,
+        }
+
+    # ---------- internals ----------
+    @staticmethod
+    def _unit(embedding):
+        vec = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def _stacked(self):
+        if self._matrix is None:
+            self._matrix_keys = list(self._entries)
+            self._matrix = np.stack([self._entries[k][0] for k in self._matrix_keys])
+        return self._matrix, self._matrix_keys
+
+    def _expire(self):
+        if not self.ttl_seconds:
+            return
+        cutoff = time.monotonic() - self.ttl_seconds
+        expired = [k for k, (_, _, created) in self._entries.items() if created < cutoff]
+        for k in expired:
+            del self._entries[k]
+        if expired:
+            self.expirations += len(expired)
+            self._matrix = None
+
+    def _index_fingerprint(self):
+        try:
+            st = os.stat(self.index_marker)
+            return (st.st_mtime_ns, st.st_size)
+        except OSError:
+            return None
+
+    def _check_index(self):
+        """Drop everything if the collection was rebuilt since the last lookup"""
+        fingerprint = self._index_fingerprint()
+        if fingerprint != self._fingerprint:
+            self._fingerprint = fingerprint
+            if self._entries:
+                self._entries.clear()
+                self._matrix = None
+                self.invalidations += 1
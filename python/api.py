@@ -1,17 +1,206 @@
-from fastapi import FastAPI
+import json
+from typing import List
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-import uvicorn
-from rag_query import ask_university_rag
+from metrics import REGISTRY, GaugeCallback, start_trace, trace_writer
+from llm_scheduler import LLMUnavailableError
+from rag_query import (
+    answer_cache, ask_university_rag_async, ask_university_rag_batch, ask_university_rag_stream,
+    close_llm_clients, embedding_cache, get_llm_router, get_runtime, runtime, RagConfig,
+    save_embedding_cache, single_flight, StageTimeoutError,
+)
 
 app = FastAPI()
 
+REGISTRY.register(GaugeCallback(
+    "rag_runtime_ready", "1 when the retrieval runtime is loaded and warm", [],
+    lambda: {(): int(runtime.ready)}))
+REGISTRY.register(GaugeCallback(
+    "rag_answer_cache", "Semantic answer cache counters", ["stat"],
+    lambda: {(name,): value for name, value in answer_cache.stats().items()} if answer_cache else {}))
+REGISTRY.register(GaugeCallback(
+    "rag_embedding_cache", "Query embedding cache counters", ["stat"],
+    lambda: {(name,): float(value) for name, value in embedding_cache.stats().items()} if embedding_cache else {}))
+REGISTRY.register(GaugeCallback(
+    "rag_llm_circuit_open", "1 while a provider's circuit breaker is open or half-open", ["provider"],
+    lambda: {(p.name,): int(p.health.state != "closed") for p in get_llm_router().providers}))
+REGISTRY.register(GaugeCallback(
+    "rag_traces_dropped", "Trace records dropped because the writer queue was full", [],
+    lambda: {(): trace_writer.dropped} if trace_writer else {}))
+
 class QuestionRequest(BaseModel):
     question: str
 
+class BatchQuestionRequest(BaseModel):
+    questions: List[str]
+
+@app.on_event("startup")
+def load_retrieval_runtime():
+    """Load + warm Chroma and the embedding model once, before serving traffic"""
+    if trace_writer is not None:
+        trace_writer.start()
+    try:
+        get_runtime()
+    except Exception:
+        # Keep the worker up; /healthz reports 503 and /ask retries the load
+        pass
+
+@app.on_event("shutdown")
+async def close_pooled_clients():
+    await close_llm_clients()
+    save_embedding_cache()
+    if trace_writer is not None:
+        trace_writer.close()
+
+@app.get("/healthz")
+async def healthz():
+    status = runtime.status()
+    if not status["ready"]:
+        return JSONResponse(status_code=503, content=status)
+    return status
+
+@app.get("/cache/stats")
+async def cache_stats():
+    if answer_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **answer_cache.stats()}
+
+@app.get("/cache/embeddings/stats")
+async def embedding_cache_stats():
+    """Hit/miss counters of the query embedding cache"""
+    if embedding_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **embedding_cache.stats()}
+
+@app.get("/coalescing/stats")
+async def coalescing_stats():
+    """How many /ask requests joined an identical in-flight question"""
+    return {"enabled": RagConfig.SINGLE_FLIGHT_ENABLED, **single_flight.stats()}
+
+@app.get("/llm/stats")
+async def llm_stats():
+    """Per-provider health, circuit state, latency percentiles and admission control"""
+    return get_llm_router().stats()
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus text exposition"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
 @app.post("/ask")
-async def ask_question(request: QuestionRequest):
-    answer = ask_university_rag(request.question, provider="groq")
-    return {"answer": answer}
+async def ask_question(request: QuestionRequest, http_request: Request):
+    trace = start_trace("/ask", http_request.headers.get("x-request-id"))
+    headers = {"X-Request-ID": trace.request_id}
+    try:
+        answer = await ask_university_rag_async(request.question)
+    except StageTimeoutError as e:
+        trace.finish("timeout")
+        raise HTTPException(status_code=504, detail=str(e), headers=headers)
+    except LLMUnavailableError as e:
+        trace.finish("rejected")
+        raise _unavailable(e, headers)
+    except Exception:
+        trace.finish("error")
+        raise
+    trace.finish("ok")
+    return JSONResponse({"answer": answer}, headers=headers)
+
+def _unavailable(error, headers):
+    """429 (rate limited) or 503 (queue full / provider down) with Retry-After"""
+    return HTTPException(
+        status_code=error.status_code,
+        detail=str(error),
+        headers={**headers, "Retry-After": error.retry_after_header},
+    )
+
+def _batch_item(question, answer):
+    if isinstance(answer, LLMUnavailableError):
+        return {"question": question, "error": str(answer), "retry_after": answer.retry_after_header}
+    if isinstance(answer, Exception):
+        return {"question": question, "error": str(answer)}
+    return {"question": question, "answer": answer}
+
+@app.post("/ask/batch")
+async def ask_questions_batch(request: BatchQuestionRequest, http_request: Request):
+    """Answer many questions in one call (evaluation and cache pre-warming jobs)"""
+    if len(request.questions) > RagConfig.BATCH_MAX_QUESTIONS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {RagConfig.BATCH_MAX_QUESTIONS} questions per batch",
+        )
+    trace = start_trace("/ask/batch", http_request.headers.get("x-request-id"))
+    headers = {"X-Request-ID": trace.request_id}
+    try:
+        answers = await ask_university_rag_batch(request.questions)
+    except StageTimeoutError as e:
+        trace.finish("timeout")
+        raise HTTPException(status_code=504, detail=str(e), headers=headers)
+    except Exception:
+        trace.finish("error")
+        raise
+    trace.finish("ok")
+    return JSONResponse(
+        {"answers": [_batch_item(question, answer) for question, answer in zip(request.questions, answers)]},
+        headers=headers,
+    )
+
+def _sse(data, event=None):
+    """Format one Server-Sent Event"""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.post("/ask/stream")
+async def ask_question_stream(request: QuestionRequest, http_request: Request):
+    """
+    Same as /ask but streams the answer token by token as SSE.
+    The first piece is produced before the response starts, so timeouts and
+    LLM admission rejections still get a real 504/429/503 status.
+    """
+    # Started here; the streaming task runs in a copy of this context and sees the same trace
+    trace = start_trace("/ask/stream", http_request.headers.get("x-request-id"))
+    headers = {"X-Request-ID": trace.request_id}
+    pieces = ask_university_rag_stream(request.question)
+    try:
+        first = await pieces.__anext__()
+    except StopAsyncIteration:
+        first = None
+    except StageTimeoutError as e:
+        trace.finish("timeout")
+        raise HTTPException(status_code=504, detail=str(e), headers=headers)
+    except LLMUnavailableError as e:
+        trace.finish("rejected")
+        raise _unavailable(e, headers)
+    except Exception:
+        trace.finish("error")
+        raise
+    
+    async def event_stream():
+        outcome = "ok"
+        try:
+            if first is not None:
+                yield _sse({"token": first})
+                async for text in pieces:
+                    yield _sse({"token": text})
+            yield _sse({"request_id": trace.request_id}, event="done")
+        except StageTimeoutError as e:
+            outcome = "timeout"
+            yield _sse({"error": str(e)}, event="error")
+        except LLMUnavailableError as e:
+            outcome = "rejected"
+            yield _sse({"error": str(e), "retry_after": e.retry_after_header}, event="error")
+        except Exception:
+            outcome = "error"
+            raise
+        finally:
+            trace.finish(outcome)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", **headers},
+    )
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=8000)
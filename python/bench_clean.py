@@ -0,0 +1,229 @@
+"""
+HTML CLEANING BENCHMARK
+
+Runs the original BeautifulSoup cleaner (html_cleaner.extract_text_reference)
+and the lxml engine (html_cleaner.extract_text) over the same corpus,
+reports pages/sec for both and fails if any page's text differs. Then runs
+the scraper's clean and chunk stages through a StagePool with 1..N
+processes and checks every process count produces the same output. The chunk
+stage needs the embedding model's tokenizer; without a local one (or with
+--no-chunk) only the clean stage is timed.
+
+The corpus is every .html file in the given directories (default: the
+fixture site) plus seeded synthetic pages shaped like the university's
+WordPress pages: menus, breadcrumbs, share bars, widgets, comments, related
+posts, footers, scripts and the boilerplate phrases the cleaner strips.
+
+Usage:
+    python bench_clean.py                              # fixtures + 200 synthetic pages
+    python bench_clean.py --corpus data/raw_html --synthetic 0 --rounds 3
+    python bench_clean.py --synthetic 5000 --processes 1,2,4,8
+    python bench_clean.py --no-chunk                   # skip the tokenizer-based chunk stage
+    python bench_clean.py --out bench_results/clean_after.json
+"""
+
+# ==================== SECTION 1: IMPORTS ====================
+import json
+import os
+import platform
+import random
+import sys
+import time
+
+from html_cleaner import extract_text, extract_text_reference
+
+WORDS = ("admission fee semester scholarship merit program computer science faculty "
+         "department deadline apply office contact registrar exam result hostel transport "
+         "undergraduate graduate campus library research student policy form test interview").split()
+
+# ==================== SECTION 2: CORPUS ====================
+def sentence(rng, n=None):
+    words = rng.choices(WORDS, k=n or rng.randint(6, 18))
+    return " ".join(words).capitalize() + rng.choice([".", ".", ".", "?", "!"])
+
+def paragraph(rng):
+    return " ".join(sentence(rng) for _ in range(rng.randint(2, 6)))
+
+def synthetic_page(i, rng):
+    """One WordPress-style page; every unwanted tag/class/id and boilerplate phrase shows up somewhere"""
+    menu = "".join(f'<li class="menu-item"><a href="/p{j}/">{sentence(rng, 2)}</a></li>' for j in range(rng.randint(20, 60)))
+    body = []
+    for _ in range(rng.randint(4, 14)):
+        kind = rng.random()
+        if kind < 0.55:
+            body.append(f"<p>{paragraph(rng)} <a href='/x'>Read More</a></p>")
+        elif kind < 0.7:
+            rows = "".join(f"<tr><td>{sentence(rng, 3)}</td><td>Rs. {rng.randint(10, 300)},000</td></tr>"
+                           for _ in range(rng.randint(3, 10)))
+            body.append(f"<table class='fee-table'><tbody>{rows}</tbody></table>")
+        elif kind < 0.85:
+            body.append("<ul>" + "".join(f"<li>{sentence(rng)}</li>" for _ in range(rng.randint(3, 8))) + "</ul>")
+        else:
+            body.append(f"<h2>{sentence(rng, 4)}</h2><div class='entry-meta meta'>Posted on 12 March 2024</div>")
+    comments = "".join(f"<li class='comment'><p>{sentence(rng)}</p></li>" for _ in range(rng.randint(0, 8)))
+    related = "".join(f"<article><h3>{sentence(rng, 5)}</h3><p>{sentence(rng)}</p></article>" for _ in range(3))
+    return f"""<!DOCTYPE html>
+<html lang="en-US"><head><meta charset="UTF-8">
+<title>{sentence(rng, 3)} Archives - Muhammad Ali Jinnah University</title>
+<style>.menu-item{{display:inline}} body{{margin:0}}</style>
+<script type="application/ld+json">{{"@type":"WebPage","name":"page {i}"}}</script>
+<script>window.dataLayer=window.dataLayer||[];function gtag(){{dataLayer.push(arguments)}}</script>
+</head><body class="page-template page-id-{i}">
+<header id="masthead"><nav id="navigation" class="main-navigation"><ul>{menu}</ul></nav></header>
+<div class="breadcrumb"><a href="/">Home</a> &raquo; {sentence(rng, 2)}</div>
+<main id="main"><article class="post-{i} page">
+<h1 class="entry-title">{sentence(rng, 4)} - Muhammad Ali Jinnah University</h1>
+<div class="entry-content">{"".join(body)}
+<p>For details contact admissions@jinnah.edu or call 021-111-164-664 &amp; visit the campus.</p>
+</div>
+<div class="share social-share">Share: <a href="#">Facebook</a> <a href="#">Twitter</a></div>
+<div class="tags">Tags: {sentence(rng, 3)}</div>
+<nav class="post-navigation"><span>Previous post</span> <span>Next post</span></nav>
+<div class="pagination"><a>1</a> <a>2</a></div>
+</article>
+<section class="related-posts"><h2>You may also like</h2>{related}</section>
+<div id="comments" class="comments-area"><ol>{comments}</ol></div>
+</main>
+<aside id="sidebar" class="widget-area"><div class="widget">{paragraph(rng)}</div></aside>
+<footer><p>&copy; 2024 Muhammad Ali Jinnah University</p><a href="https://wa.me/">WhatsApp us</a></footer>
+<noscript><img src="/pixel.gif"></noscript>
+<script src="/wp-includes/js/jquery.min.js"></script>
+</body></html>"""
+
+def load_corpus(directories, synthetic=200, seed=42):
+    pages = []
+    for directory in directories:
+        for name in sorted(os.listdir(directory)):
+            if name.endswith(".html"):
+                with open(os.path.join(directory, name), "r", encoding="utf-8", errors="replace") as f:
+                    pages.append((os.path.join(directory, name), f.read()))
+    rng = random.Random(seed)
+    pages += [(f"synthetic/{i}", synthetic_page(i, rng)) for i in range(synthetic)]
+    return pages
+
+# ==================== SECTION 3: BENCHMARK ====================
+def time_cleaner(cleaner, pages, rounds):
+    """Best pages/sec over `rounds` passes (plus the outputs of the last pass)"""
+    best = None
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        outputs = [cleaner(html) for _, html in pages]
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return len(pages) / best, outputs
+
+def run_stages(pages, process_counts, chunk=True):
+    """Clean (+ chunk) stage throughput per process count (pool start-up not timed)"""
+    from uni_web_scrapper import StagePool, clean_html, chunk_text
+    total_bytes = sum(len(html.encode("utf-8")) for _, html in pages)
+    rows, expected = [], None
+    for processes in process_counts:
+        with StagePool(processes) as stages:
+            t0 = time.perf_counter()
+            cleaned = [clean for clean, _ in stages.map(clean_html, (html for _, html in pages))]
+            clean_s = time.perf_counter() - t0
+            chunks, chunk_rate = None, None
+            if chunk:
+                texts = [text for text in cleaned if text]
+                t1 = time.perf_counter()
+                chunks = list(stages.map(chunk_text, texts))
+                chunk_rate = round(len(texts) / (time.perf_counter() - t1), 1)
+        expected = expected or (cleaned, chunks)
+        rows.append({
+            "processes": processes,
+            "clean_pages_per_sec": round(len(pages) / clean_s, 1),
+            "clean_mb_per_sec": round(total_bytes / 1024 / 1024 / clean_s, 2),
+            "chunk_pages_per_sec": chunk_rate,
+            "identical": (cleaned, chunks) == expected,
+        })
+        print(f"   {processes} process(es): clean {rows[-1]['clean_pages_per_sec']} pages/sec"
+              + (f", chunk {chunk_rate} pages/sec" if chunk else ""))
+    return rows
+
+def tokenizer_available():
+    """The chunk stage needs a local tokenizer; say so instead of failing the whole run"""
+    from token_chunker import find_tokenizer
+    try:
+        find_tokenizer()
+        return True
+    except FileNotFoundError as e:
+        print(f"⚠️ Skipping the chunk stage: {e}")
+        return False
+
+def run_benchmark(pages, rounds=3, process_counts=(1,), chunk=True):
+    total_bytes = sum(len(html.encode("utf-8")) for _, html in pages)
+    print(f"🧹 {len(pages)} pages, {total_bytes / 1024 / 1024:.1f} MB, best of {rounds} rounds")
+
+    before_rate, expected = time_cleaner(extract_text_reference, pages, rounds)
+    after_rate, got = time_cleaner(extract_text, pages, rounds)
+    mismatches = [name for (name, _), a, b in zip(pages, expected, got) if a != b]
+
+    chunk = chunk and tokenizer_available()
+    print(f"⚙️ Clean{'/chunk' if chunk else ''} stages with {', '.join(map(str, process_counts))} processes...")
+    stages = run_stages(pages, process_counts, chunk)
+
+    return {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {"pages": len(pages), "bytes": total_bytes, "rounds": rounds,
+                   "processes": list(process_counts), "chunk": chunk},
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "before_pages_per_sec": round(before_rate, 1),
+        "after_pages_per_sec": round(after_rate, 1),
+        "speedup": round(after_rate / before_rate, 2),
+        "identical": not mismatches and all(row["identical"] for row in stages),
+        "mismatches": mismatches[:20],
+        "stages": stages,
+    }
+
+# ==================== SECTION 4: REPORTING ====================
+def print_report(results):
+    print("\n" + "="*60)
+    print("📊 HTML CLEANING THROUGHPUT")
+    print("="*60)
+    print(f"  BeautifulSoup multi-pass  {results['before_pages_per_sec']:10.1f} pages/sec")
+    print(f"  lxml single-pass          {results['after_pages_per_sec']:10.1f} pages/sec")
+    print(f"  speedup                   {results['speedup']:10.2f}x")
+
+    print("\n⚙️ Pipeline stages (StagePool):")
+    print(f"  {'processes':>9}{'clean pages/s':>15}{'clean MB/s':>12}{'chunk pages/s':>15}")
+    for row in results["stages"]:
+        chunk_rate = row["chunk_pages_per_sec"]
+        print(f"  {row['processes']:>9}{row['clean_pages_per_sec']:>15.1f}"
+              f"{row['clean_mb_per_sec']:>12.2f}{'skipped' if chunk_rate is None else chunk_rate:>15}"
+              f"{'' if row['identical'] else '   ❌ output differs'}")
+
+    if results["identical"]:
+        print("\n✅ Output identical on every page and process count")
+    else:
+        print(f"\n❌ Output differs on {len(results['mismatches'])}+ pages: {results['mismatches'][:5]}")
+
+def save_results(results, path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"\n💾 Results saved: {path}")
+
+# ==================== SECTION 5: MAIN EXECUTION ====================
+if __name__ == "__main__":
+    argv = sys.argv[1:]
+
+    def option(name, default):
+        return argv[argv.index(name) + 1] if name in argv else default
+
+    directories = option("--corpus", "fixtures/site").split(",")
+    synthetic = int(option("--synthetic", 200))
+    rounds = int(option("--rounds", 3))
+    default_processes = "1" if (os.cpu_count() or 1) == 1 else f"1,{os.cpu_count()}"
+    process_counts = [int(n) for n in option("--processes", default_processes).split(",")]
+    out_path = option("--out", f"bench_results/clean_{time.strftime('%Y%m%d_%H%M%S')}.json")
+
+    results = run_benchmark(load_corpus(directories, synthetic), rounds, process_counts,
+                            chunk="--no-chunk" not in argv)
+    print_report(results)
+    save_results(results, out_path)
+    if not results["identical"]:
+        sys.exit(1)
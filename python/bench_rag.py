@@ -0,0 +1,182 @@
+"""
+RAG LATENCY BENCHMARK
+
+Runs a fixed question set against the local index with a deterministic fake
+LLM (no Groq key, no network) and reports p50/p95/p99 per stage and end to end.
+Results are saved as JSON so two runs can be diffed.
+
+Usage:
+    python bench_rag.py                                  # 20 rounds, instant fake LLM
+    python bench_rag.py --rounds 50 --llm-latency-ms 800 # simulate provider latency
+    python bench_rag.py --embed-cache                    # serve repeated questions from the embedding cache
+    python bench_rag.py --out bench_results/after.json --compare bench_results/before.json
+"""
+
+# ==================== SECTION 1: IMPORTS ====================
+import hashlib
+import json
+import math
+import os
+import platform
+import sys
+import time
+
+from rag_query import (
+    RagConfig, SAMPLE_QUESTIONS, clean_answer, create_rag_prompt, embed_question,
+    hybrid_search, init_embedding_model, init_lexical_index, init_vector_store,
+)
+
+STAGES = ["encode", "retrieve", "prompt", "llm", "postprocess", "end_to_end"]
+
+# ==================== SECTION 2: FAKE LLM ====================
+class FakeLLM:
+    """
+    Deterministic stand-in for the provider: same prompt -> same answer.
+    The answer carries a citation and a Sources: block so postprocessing
+    does real work. latency_ms simulates provider time with a fixed sleep.
+    """
+    def __init__(self, latency_ms=0):
+        self.latency_ms = latency_ms
+
+    def __call__(self, prompt):
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:12]
+        return (
+            f"Based on the university website, here is the answer ({digest}) [1]. "
+            "Please contact the relevant office for details [2].\n\n"
+            "Sources: jinnah.edu"
+        )
+
+# ==================== SECTION 3: STATS ====================
+def percentile(values, pct):
+    """Nearest-rank percentile (values in seconds, result in ms)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[rank] * 1000
+
+def summarize(samples):
+    return {
+        stage: {
+            "count": len(values),
+            "mean_ms": sum(values) / len(values) * 1000 if values else None,
+            "p50_ms": percentile(values, 50),
+            "p95_ms": percentile(values, 95),
+            "p99_ms": percentile(values, 99),
+        }
+        for stage, values in samples.items()
+    }
+
+# ==================== SECTION 4: BENCHMARK ====================
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+def run_benchmark(rounds=20, llm_latency_ms=0, questions=SAMPLE_QUESTIONS, embed_cache=False):
+    cold = {}
+    collection, cold["store_open"] = timed(init_vector_store)
+    model, cold["model_load"] = timed(init_embedding_model)
+    lexical_index, cold["lexical_load"] = timed(init_lexical_index)
+
+    llm = FakeLLM(llm_latency_ms)
+    samples = {stage: [] for stage in STAGES}
+
+    # One untimed pass so lazy init inside torch / Chroma isn't counted
+    for question in questions:
+        hybrid_search(question, embed_question(question, model, embed_cache), collection, RagConfig.TOP_K, lexical_index)
+
+    print(f"\n⏱️ Running {rounds} rounds x {len(questions)} questions...")
+    for _ in range(rounds):
+        for question in questions:
+            start = time.perf_counter()
+            # Rounds repeat the same questions, so the embedding cache is off unless asked for
+            embedding, t = timed(embed_question, question, model, embed_cache)
+            samples["encode"].append(t)
+            (chunks, sources, scores), t = timed(
+                hybrid_search, question, embedding, collection, RagConfig.TOP_K, lexical_index
+            )
+            samples["retrieve"].append(t)
+            (prompt, _), t = timed(create_rag_prompt, question, chunks, sources)
+            samples["prompt"].append(t)
+            answer, t = timed(llm, prompt)
+            samples["llm"].append(t)
+            _, t = timed(clean_answer, answer)
+            samples["postprocess"].append(t)
+            samples["end_to_end"].append(time.perf_counter() - start)
+
+    return {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {
+            "rounds": rounds,
+            "questions": len(questions),
+            "llm_latency_ms": llm_latency_ms,
+            "top_k": RagConfig.TOP_K,
+            "hybrid": lexical_index is not None,
+            "vector_backend": RagConfig.VECTOR_BACKEND,
+            "encoder_backend": RagConfig.ENCODER_BACKEND,
+            "embed_cache": embed_cache,
+            "documents": collection.count(),
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "cold_start_ms": {stage: seconds * 1000 for stage, seconds in cold.items()},
+        "stages": summarize(samples),
+    }
+
+# ==================== SECTION 5: REPORTING ====================
+def fmt(value):
+    return f"{value:9.2f}" if value is not None else "        -"
+
+def print_report(results, baseline=None):
+    print("\n" + "="*60)
+    print("📊 COLD START")
+    print("="*60)
+    for stage, ms in results["cold_start_ms"].items():
+        print(f"  {stage:<14}{fmt(ms)} ms")
+
+    print("\n" + "="*60)
+    print("📊 PER-STAGE LATENCY (ms)")
+    print("="*60)
+    print(f"  {'stage':<14}{'p50':>9}{'p95':>9}{'p99':>9}" + ("   Δp95 vs baseline" if baseline else ""))
+    for stage in STAGES:
+        row = results["stages"][stage]
+        line = f"  {stage:<14}{fmt(row['p50_ms'])}{fmt(row['p95_ms'])}{fmt(row['p99_ms'])}"
+        if baseline and stage in baseline.get("stages", {}):
+            old = baseline["stages"][stage]["p95_ms"]
+            if old:
+                line += f"   {(row['p95_ms'] - old) / old * 100:+6.1f}%"
+        print(line)
+
+def save_results(results, path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"\n💾 Results saved: {path}")
+
+# ==================== SECTION 6: MAIN EXECUTION ====================
+if __name__ == "__main__":
+    argv = sys.argv[1:]
+
+    def option(name, default):
+        return argv[argv.index(name) + 1] if name in argv else default
+
+    rounds = int(option("--rounds", 20))
+    llm_latency_ms = float(option("--llm-latency-ms", 0))
+    out_path = option("--out", f"bench_results/rag_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    compare_path = option("--compare", None)
+
+    results = run_benchmark(rounds, llm_latency_ms, embed_cache="--embed-cache" in argv)
+
+    baseline = None
+    if compare_path:
+        with open(compare_path, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    print_report(results, baseline)
+    save_results(results, out_path)
@@ -0,0 +1,171 @@
+"""
+COLD START BENCHMARK
+
+Starts fresh interpreters and measures what an autoscaled worker pays before
+it can answer: importing rag_query, loading + warming the retrieval runtime,
+and the first answer (fake LLM, so no key or network). Also lists the
+slowest imports from `python -X importtime` and checks that importing
+rag_query doesn't pull in chromadb / torch / the LLM SDKs.
+
+Usage:
+    python bench_startup.py                      # 5 cold starts
+    python bench_startup.py --runs 10 --out bench_results/startup_after.json
+    python bench_startup.py --compare bench_results/startup_before.json
+"""
+
+# ==================== SECTION 1: IMPORTS ====================
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+HEAVY_MODULES = ["chromadb", "torch", "sentence_transformers", "onnxruntime", "groq", "httpx", "fastapi"]
+PHASES = ["process_ms", "import_ms", "runtime_start_ms", "first_answer_ms", "time_to_first_answer_ms"]
+
+# ==================== SECTION 2: CHILD PROCESS ====================
+def cold_start():
+    """Runs inside a fresh interpreter; returns phase timings in ms"""
+    t0 = time.perf_counter()
+    import rag_query
+    import_ms = (time.perf_counter() - t0) * 1000
+    heavy_after_import = [name for name in HEAVY_MODULES if name in sys.modules]
+
+    from bench_rag import FakeLLM
+    llm = FakeLLM()
+    rag_query.get_llm_response = lambda prompt, provider="auto": llm(prompt)
+
+    t1 = time.perf_counter()
+    rag_query.get_runtime()
+    runtime_start_ms = (time.perf_counter() - t1) * 1000
+
+    t2 = time.perf_counter()
+    rag_query.ask_university_rag(rag_query.SAMPLE_QUESTIONS[0])
+    first_answer_ms = (time.perf_counter() - t2) * 1000
+
+    return {
+        "import_ms": import_ms,
+        "runtime_start_ms": runtime_start_ms,
+        "first_answer_ms": first_answer_ms,
+        "time_to_first_answer_ms": (time.perf_counter() - t0) * 1000,
+        "heavy_after_import": heavy_after_import,
+        "heavy_after_answer": [name for name in HEAVY_MODULES if name in sys.modules],
+    }
+
+def run_child(*args):
+    """Run this script in a new interpreter; returns (last stdout line, stderr, wall ms)"""
+    t0 = time.perf_counter()
+    proc = subprocess.run([sys.executable, *args], capture_output=True, text=True)
+    wall_ms = (time.perf_counter() - t0) * 1000
+    if proc.returncode != 0:
+        raise RuntimeError(f"child failed ({proc.returncode}):\n{proc.stderr[-2000:]}")
+    lines = proc.stdout.strip().splitlines()
+    return (lines[-1] if lines else ""), proc.stderr, wall_ms
+
+# ==================== SECTION 3: IMPORT PROFILE ====================
+def slowest_imports(module="rag_query", top=10):
+    """Top-level imports of `module` by cumulative time, from -X importtime"""
+    _, stderr, _ = run_child("-X", "importtime", "-c", f"import {module}")
+    children, direct = [], []
+    for line in stderr.splitlines():
+        # "import time:   self_us |   cumulative_us | <two spaces per nesting level>name"
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        # A module is printed after its own imports, one level deeper
+        if depth == 1:
+            children.append((int(cumulative_us), name.strip()))
+        elif depth == 0:
+            if name.strip() == module:
+                direct = children
+            children = []
+    direct.sort(reverse=True)
+    return [{"module": name, "cumulative_ms": round(us / 1000, 1)} for us, name in direct[:top]]
+
+# ==================== SECTION 4: BENCHMARK ====================
+def run_benchmark(runs=5):
+    samples = {phase: [] for phase in PHASES}
+    heavy = None
+    for i in range(runs):
+        line, _, wall_ms = run_child(os.path.abspath(__file__), "_child")
+        result = json.loads(line)
+        samples["process_ms"].append(wall_ms)
+        for phase in PHASES[1:]:
+            samples[phase].append(result[phase])
+        heavy = {"after_import": result["heavy_after_import"], "after_first_answer": result["heavy_after_answer"]}
+        print(f"   run {i + 1}/{runs}: first answer after {result['time_to_first_answer_ms']:.0f} ms")
+
+    return {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {
+            "runs": runs,
+            "vector_backend": os.getenv("RAG_VECTOR_BACKEND", "chroma"),
+            "encoder_backend": os.getenv("RAG_ENCODER_BACKEND", "torch"),
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "phases": {
+            phase: {"median_ms": statistics.median(values), "max_ms": max(values)}
+            for phase, values in samples.items()
+        },
+        "heavy_modules": heavy,
+        "slowest_imports": slowest_imports(),
+    }
+
+# ==================== SECTION 5: REPORTING ====================
+def print_report(results, baseline=None):
+    print("\n" + "="*60)
+    print("📊 COLD START (median of %d runs)" % results["config"]["runs"])
+    print("="*60)
+    for phase in PHASES:
+        row = results["phases"][phase]
+        line = f"  {phase:<26}{row['median_ms']:9.1f} ms"
+        old = baseline["phases"].get(phase, {}).get("median_ms") if baseline else None
+        if old:
+            line += f"   {(row['median_ms'] - old) / old * 100:+6.1f}%"
+        print(line)
+
+    print(f"\n  heavy modules after import:       {results['heavy_modules']['after_import'] or 'none'}")
+    print(f"  heavy modules after first answer: {results['heavy_modules']['after_first_answer']}")
+
+    print("\n📦 Slowest imports of rag_query:")
+    for row in results["slowest_imports"]:
+        print(f"  {row['module']:<26}{row['cumulative_ms']:9.1f} ms")
+
+def save_results(results, path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"\n💾 Results saved: {path}")
+
+# ==================== SECTION 6: MAIN EXECUTION ====================
+if __name__ == "__main__":
+    argv = sys.argv[1:]
+
+    if argv and argv[0] == "_child":
+        print(json.dumps(cold_start()))
+        sys.exit(0)
+
+    def option(name, default):
+        return argv[argv.index(name) + 1] if name in argv else default
+
+    runs = int(option("--runs", 5))
+    out_path = option("--out", f"bench_results/startup_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    compare_path = option("--compare", None)
+
+    print(f"⏱️ Measuring {runs} cold starts...")
+    results = run_benchmark(runs)
+
+    baseline = None
+    if compare_path:
+        with open(compare_path, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    print_report(results, baseline)
+    save_results(results, out_path)
@@ -0,0 +1,233 @@
+"""
+MULTI-WORKER MEMORY BENCHMARK
+
+Starts the API with 1..N workers (gunicorn with and without preload, or
+`uvicorn --workers`), waits until every worker's runtime is warm, sends a
+few /ask requests to a local stub LLM so the workers have actually served
+traffic, then reads RSS / PSS / USS of every process from
+/proc/<pid>/smaps_rollup (Linux). PSS counts shared pages once across the
+group, so total PSS is the real footprint and
+
+    per-worker overhead = (total PSS with N workers - with 1 worker) / (N - 1)
+
+Usage:
+    python bench_workers.py                                  # 1,2,4 workers, preload on/off
+    python bench_workers.py --workers 1,4 --modes preload,uvicorn --requests 100
+    RAG_VECTOR_BACKEND=mmap RAG_ENCODER_BACKEND=onnx python bench_workers.py
+"""
+
+# ==================== SECTION 1: IMPORTS ====================
+import json
+import os
+import platform
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from llm_stub_server import start_llm_stub
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+READY_LINE = "Retrieval runtime ready"
+MODES = {
+    "preload": "gunicorn, model/index loaded before fork",
+    "no-preload": "gunicorn, every worker loads its own copy",
+    "uvicorn": "uvicorn --workers (spawned, nothing shared but mmap files)",
+}
+
+# ==================== SECTION 2: PROCESS MEMORY ====================
+def process_tree(pid):
+    """pid and all of its descendants"""
+    pids, pending = [], [pid]
+    while pending:
+        current = pending.pop()
+        pids.append(current)
+        try:
+            with open(f"/proc/{current}/task/{current}/children") as f:
+                pending.extend(int(child) for child in f.read().split())
+        except OSError:
+            pass
+    return pids
+
+def memory_of(pid):
+    """RSS / PSS / USS (private) in MB from smaps_rollup"""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 3 and parts[-1] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    return {
+        "pid": pid,
+        "rss_mb": round(fields.get("Rss", 0), 1),
+        "pss_mb": round(fields.get("Pss", 0), 1),
+        "uss_mb": round(fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0), 1),
+    }
+
+# ==================== SECTION 3: SERVER LIFECYCLE ====================
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def server_command(mode, workers, port):
+    if mode == "uvicorn":
+        return [sys.executable, "-m", "uvicorn", "api:app", "--host", "127.0.0.1",
+                "--port", str(port), "--workers", str(workers)]
+    return [sys.executable, "-m", "gunicorn", "-c", os.path.join(HERE, "gunicorn_conf.py"),
+            "--bind", f"127.0.0.1:{port}", "--workers", str(workers), "api:app"]
+
+def start_server(mode, workers, port, llm_url, timeout=600):
+    """Launch the server and block until `workers` runtimes report ready"""
+    env = {
+        **os.environ,
+        "PYTHONUNBUFFERED": "1",
+        "RAG_PRELOAD": "0" if mode == "no-preload" else "1",
+        "WEB_CONCURRENCY": str(workers),
+        "RAG_LLM_PROVIDERS": "local",
+        "RAG_LOCAL_LLM_URL": llm_url,
+        "RAG_ANSWER_CACHE": "0",      # every request should reach retrieval
+        "RAG_EMBED_CACHE_PATH": "",   # don't rewrite the real cache file on shutdown
+    }
+    proc = subprocess.Popen(server_command(mode, workers, port), env=env, cwd=os.getcwd(),
+                            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    ready = threading.Semaphore(0)
+    log = []
+
+    def read_output():
+        for line in proc.stdout:
+            log.append(line)
+            if READY_LINE in line:
+                ready.release()
+
+    threading.Thread(target=read_output, daemon=True).start()
+    deadline = time.monotonic() + timeout
+    for _ in range(workers):
+        if not ready.acquire(timeout=max(0.0, deadline - time.monotonic())) or proc.poll() is not None:
+            stop_server(proc)
+            raise RuntimeError(f"{mode} x{workers} did not become ready:\n{''.join(log[-30:])}")
+    return proc
+
+def stop_server(proc):
+    if proc.poll() is None:
+        proc.send_signal(signal.SIGTERM)
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+
+def send_questions(port, count, concurrency=8):
+    """POST /ask `count` times; returns how many succeeded"""
+    from rag_query import SAMPLE_QUESTIONS
+
+    def ask(i):
+        body = json.dumps({"question": f"{SAMPLE_QUESTIONS[i % len(SAMPLE_QUESTIONS)]} ({i})"}).encode("utf-8")
+        request = urllib.request.Request(f"http://127.0.0.1:{port}/ask", data=body,
+                                         headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request, timeout=60) as response:
+                return response.status == 200
+        except OSError:
+            return False
+
+    with ThreadPoolExecutor(concurrency) as pool:
+        return sum(pool.map(ask, range(count)))
+
+# ==================== SECTION 4: BENCHMARK ====================
+def measure(mode, workers, llm_url, requests):
+    port = free_port()
+    t0 = time.perf_counter()
+    proc = start_server(mode, workers, port, llm_url)
+    ready_s = time.perf_counter() - t0
+    try:
+        answered = send_questions(port, requests) if requests else 0
+        time.sleep(1)
+        processes = [memory_of(pid) for pid in process_tree(proc.pid)]
+    finally:
+        stop_server(proc)
+    return {
+        "mode": mode,
+        "workers": workers,
+        "ready_seconds": round(ready_s, 2),
+        "answered": answered,
+        "total_rss_mb": round(sum(p["rss_mb"] for p in processes), 1),
+        "total_pss_mb": round(sum(p["pss_mb"] for p in processes), 1),
+        "processes": processes,
+    }
+
+def per_worker_overhead(rows):
+    """(total PSS at max workers - at min workers) / extra workers, per mode"""
+    overhead = {}
+    for mode in {row["mode"] for row in rows}:
+        runs = sorted((r for r in rows if r["mode"] == mode), key=lambda r: r["workers"])
+        if len(runs) >= 2 and runs[-1]["workers"] > runs[0]["workers"]:
+            extra = runs[-1]["workers"] - runs[0]["workers"]
+            overhead[mode] = round((runs[-1]["total_pss_mb"] - runs[0]["total_pss_mb"]) / extra, 1)
+    return overhead
+
+def run_benchmark(worker_counts, modes, requests):
+    _, llm_url, _ = start_llm_stub(latency=0.01, token_delay=0)
+    rows = []
+    for mode in modes:
+        for workers in worker_counts:
+            print(f"🚀 {mode} x{workers}: starting...")
+            row = measure(mode, workers, llm_url, requests)
+            print(f"   ready in {row['ready_seconds']}s, {row['answered']}/{requests} answered, "
+                  f"PSS {row['total_pss_mb']} MB, RSS {row['total_rss_mb']} MB")
+            rows.append(row)
+    return {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {
+            "vector_backend": os.getenv("RAG_VECTOR_BACKEND", "chroma"),
+            "encoder_backend": os.getenv("RAG_ENCODER_BACKEND", "torch"),
+            "requests": requests,
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "runs": rows,
+        "per_worker_pss_mb": per_worker_overhead(rows),
+    }
+
+# ==================== SECTION 5: REPORTING ====================
+def print_report(results):
+    print("\n" + "="*72)
+    print("📊 MEMORY BY WORKER COUNT (MB)")
+    print("="*72)
+    print(f"  {'mode':<12}{'workers':>8}{'total PSS':>11}{'total RSS':>11}{'max USS':>9}{'ready s':>9}")
+    for row in results["runs"]:
+        max_uss = max(p["uss_mb"] for p in row["processes"])
+        print(f"  {row['mode']:<12}{row['workers']:>8}{row['total_pss_mb']:>11.1f}"
+              f"{row['total_rss_mb']:>11.1f}{max_uss:>9.1f}{row['ready_seconds']:>9.2f}")
+    print("\n📈 Cost of each extra worker (PSS):")
+    for mode, mb in sorted(results["per_worker_pss_mb"].items()):
+        print(f"  {mode:<12}{mb:9.1f} MB   ({MODES[mode]})")
+
+def save_results(results, path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"\n💾 Results saved: {path}")
+
+# ==================== SECTION 6: MAIN EXECUTION ====================
+if __name__ == "__main__":
+    argv = sys.argv[1:]
+
+    def option(name, default):
+        return argv[argv.index(name) + 1] if name in argv else default
+
+    worker_counts = [int(n) for n in option("--workers", "1,2,4").split(",")]
+    modes = option("--modes", "preload,no-preload").split(",")
+    requests = int(option("--requests", 50))
+    out_path = option("--out", f"bench_results/workers_{time.strftime('%Y%m%d_%H%M%S')}.json")
+
+    results = run_benchmark(worker_counts, modes, requests)
+    print_report(results)
+    save_results(results, out_path)
@@ -0,0 +1,152 @@
+"""
+BM25 INVERTED INDEX
+Lexical index built next to the Chroma collection so exact tokens (course
+codes, fee figures, email addresses) can be found even when dense retrieval
+misses them. Postings are stored as flat NumPy arrays with per-posting
+BM25 weights precomputed, so a query is a handful of vectorized adds.
+"""
+
+# ==================== SECTION 1: IMPORTS ====================
+import hashlib
+import json
+import re
+from collections import Counter, defaultdict
+
+import numpy as np
+
+INDEX_PATH = "chroma_db/bm25_index.npz"
+
+def chunk_id(chunk):
+    """
+    Stable ID from source URL + chunk text (unchanged chunks keep their ID).
+    The Chroma collection and the saved index both use it (see build_chromadb.py).
+    """
+    digest = hashlib.sha256(f"{chunk['source']}\n{chunk['text']}".encode("utf-8")).hexdigest()
+    return f"c_{digest[:32]}"
+
+# ==================== SECTION 2: TOKENIZER ====================
+# Emails first so they stay one token, then words/numbers that may contain
+# inner - . , / joiners (CS-101, 145,000, 3.5, 2024/25)
+TOKEN_REGEX = re.compile(
+    r"[a-z0-9._%+-]+@[a-z0-9.-]+\.[a-z]{2,}"
+    r"|[a-z0-9]+(?:[-.,/][a-z0-9]+)*"
+)
+NUMBER_COMMA_REGEX = re.compile(r"(?<=\d),(?=\d)")
+
+STOPWORDS = frozenset("""
+a an and are as at be by for from has have how i in is it its of on or
+that the this to was what when where which who will with you your
+""".split())
+
+def tokenize(text):
+    """Lowercase tokens; thousands separators dropped so 145,000 == 145000"""
+    text = NUMBER_COMMA_REGEX.sub("", text.lower())
+    return [t for t in TOKEN_REGEX.findall(text) if t not in STOPWORDS]
+
+# ==================== SECTION 3: INDEX ====================
+class BM25Index:
+    """
+    vocab:   term -> term id
+    offsets: postings of term t live in [offsets[t], offsets[t+1])
+    doc_ids: posting -> document row
+    weights: posting -> precomputed BM25 weight (idf * saturated tf)
+    ids:     document row -> chunk id
+    """
+    def __init__(self, vocab, offsets, doc_ids, weights, ids):
+        self.vocab = vocab
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.weights = weights
+        self.ids = ids
+
+    @property
+    def n_docs(self):
+        return len(self.ids)
+
+    @classmethod
+    def build(cls, ids, texts, k1=1.5, b=0.75):
+        """Build from parallel lists of chunk ids and texts"""
+        vocab = {}
+        term_col, row_col, tf_col = [], [], []
+        doc_len = np.zeros(len(ids), dtype=np.float32)
+        for row, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            doc_len[row] = sum(counts.values())
+            term_col.extend(vocab.setdefault(term, len(vocab)) for term in counts)
+            tf_col.extend(counts.values())
+            row_col.extend([row] * len(counts))
+
+        # Group postings by term with one stable sort instead of per-term lists
+        terms = np.array(term_col, dtype=np.int64)
+        order = np.argsort(terms, kind="stable")
+        rows = np.array(row_col, dtype=np.int32)[order]
+        tfs = np.array(tf_col, dtype=np.float32)[order]
+        df = np.bincount(terms, minlength=len(vocab))
+
+        offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(df, out=offsets[1:])
+
+        avgdl = float(doc_len.mean()) if len(ids) else 0.0
+        norm = k1 * (1 - b + b * doc_len / (avgdl or 1.0))
+        idf = np.log(1 + (len(ids) - df + 0.5) / (df + 0.5)).astype(np.float32)
+        weights = np.repeat(idf, df) * tfs * (k1 + 1) / (tfs + norm[rows])
+
+        return cls(vocab, offsets, rows, weights.astype(np.float32), list(ids))
+
+    def search(self, query, top_k=10):
+        """Return [(chunk id, score)] best first"""
+        scores = np.zeros(self.n_docs, dtype=np.float32)
+        matched = False
+        for term in set(tokenize(query)):
+            t = self.vocab.get(term)
+            if t is None:
+                continue
+            lo, hi = self.offsets[t], self.offsets[t + 1]
+            scores[self.doc_ids[lo:hi]] += self.weights[lo:hi]
+            matched = True
+        if not matched:
+            return []
+
+        k = min(top_k, self.n_docs)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.ids[row], float(scores[row])) for row in top if scores[row] > 0]
+
+    # ---------- persistence ----------
+    def save(self, path=INDEX_PATH):
+        terms = [None] * len(self.vocab)
+        for term, t in self.vocab.items():
+            terms[t] = term
+        with open(path, "wb") as f:
+            np.savez(
+                f,
+                offsets=self.offsets,
+                doc_ids=self.doc_ids,
+                weights=self.weights,
+                terms=np.array(json.dumps(terms)),
+                ids=np.array(json.dumps(self.ids)),
+            )
+
+    @classmethod
+    def load(cls, path=INDEX_PATH):
+        with np.load(path, allow_pickle=False) as data:
+            terms = json.loads(str(data["terms"]))
+            return cls(
+                vocab={term: t for t, term in enumerate(terms)},
+                offsets=data["offsets"],
+                doc_ids=data["doc_ids"],
+                weights=data["weights"],
+                ids=json.loads(str(data["ids"])),
+            )
+
+# ==================== SECTION 4: RANK FUSION ====================
+def reciprocal_rank_fusion(rankings, k=60):
+    """
+    Fuse several ranked id lists: score(id) = sum(1 / (k + rank)).
+    Returns [(id, fused score)] best first.
+    """
+    fused = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, 1):
+            fused[doc_id] += 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
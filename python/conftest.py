@@ -0,0 +1,7 @@
+import os
+
+# These are scripts that run against real data / the Groq API, not pytest tests
+collect_ignore = ["test_embeddings.py", "test_groq_delete.py"]
+
+# Don't write request traces from the tests
+os.environ.setdefault("RAG_TRACE_FILE", "")
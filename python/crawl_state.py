@@ -0,0 +1,111 @@
+"""
+CRAWL STATE STORE
+Remembers, per URL, what we saw last time (sitemap lastmod, ETag,
+Last-Modified, content hash) so `uni_web_scrapper.py update` can skip
+unchanged pages and emit a changeset of added / modified / removed pages.
+"""
+
+# ==================== SECTION 1: IMPORTS ====================
+import hashlib
+import json
+import os
+import time
+
+STATE_PATH = "data/crawl_state.json"
+CHANGESET_PATH = "data/changeset.json"
+
+# ==================== SECTION 2: HELPERS ====================
+def content_hash(text):
+    """Stable hash of cleaned page text ("" for pages that were dropped)"""
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+def write_json_atomic(path, data, indent=2):
+    """Write JSON to a temp file then rename, so a crash never leaves half a file"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=indent, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+# ==================== SECTION 3: STATE STORE ====================
+class CrawlState:
+    """
+    url -> {"lastmod", "etag", "last_modified", "hash", "fetched_at"}
+    """
+    def __init__(self, path=STATE_PATH):
+        self.path = path
+        self.pages = {}
+
+    @classmethod
+    def load(cls, path=STATE_PATH):
+        state = cls(path)
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                state.pages = json.load(f).get("pages", {})
+        return state
+
+    def save(self):
+        write_json_atomic(self.path, {"updated_at": time.time(), "pages": self.pages})
+
+    def __contains__(self, url):
+        return url in self.pages
+
+    def urls(self):
+        return set(self.pages)
+
+    def get(self, url):
+        return self.pages.get(url, {})
+
+    def record(self, url, lastmod=None, headers=None, text=None):
+        """Store what a successful fetch returned"""
+        headers = {k.lower(): v for k, v in (headers or {}).items()}
+        self.pages[url] = {
+            "lastmod": lastmod,
+            "etag": headers.get("etag"),
+            "last_modified": headers.get("last-modified"),
+            "hash": content_hash(text),
+            "fetched_at": time.time(),
+        }
+
+    def touch(self, url, lastmod=None):
+        """Page confirmed unchanged (304 or same hash): refresh lastmod + time"""
+        entry = self.pages.setdefault(url, {})
+        if lastmod:
+            entry["lastmod"] = lastmod
+        entry["fetched_at"] = time.time()
+
+    def remove(self, url):
+        self.pages.pop(url, None)
+
+    def is_unchanged_in_sitemap(self, url, lastmod):
+        """True if the sitemap lastmod matches what we recorded last time"""
+        return bool(lastmod) and self.get(url).get("lastmod") == lastmod
+
+    def conditional_headers(self, url):
+        """If-None-Match / If-Modified-Since for a conditional GET"""
+        entry = self.get(url)
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+# ==================== SECTION 4: CHANGESET ====================
+def save_changeset(added, modified, removed, unchanged, path=CHANGESET_PATH):
+    """Changeset consumed by downstream stages (chunking, embedding)"""
+    changeset = {
+        "generated_at": time.time(),
+        "added": sorted(added),
+        "modified": sorted(modified),
+        "removed": sorted(removed),
+        "unchanged": unchanged,
+    }
+    write_json_atomic(path, changeset)
+    return changeset
+
+def load_changeset(path=CHANGESET_PATH):
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return None
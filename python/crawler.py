@@ -0,0 +1,185 @@
+"""
+CONCURRENT CRAWLER
+Thread-pool fetch engine used by uni_web_scrapper for full runs:
+pooled keep-alive session, per-host concurrency limits, retries with
+exponential backoff (capped at max_backoff, which also caps a server's
+Retry-After) and adaptive (AIMD) throttling on response times.
+"""
+
+# ==================== SECTION 1: IMPORTS ====================
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from llm_scheduler import parse_retry_after
+
+# ==================== SECTION 2: PER-HOST THROTTLE ====================
+class HostThrottle:
+    """
+    Adaptive concurrency limit for one host.
+    Additive increase while responses stay under target_latency,
+    multiplicative decrease when they get slow or fail.
+    """
+    def __init__(self, max_concurrency, target_latency):
+        self.max_concurrency = max_concurrency
+        self.target_latency = target_latency
+        self.limit = float(max(1, max_concurrency // 2))
+        self.in_flight = 0
+        self.avg_latency = None
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self, elapsed=None, ok=True):
+        with self._cond:
+            self.in_flight -= 1
+            if not ok:
+                self.limit = max(1.0, self.limit / 2)
+            elif elapsed is not None:
+                if self.avg_latency is None:
+                    self.avg_latency = elapsed
+                else:
+                    self.avg_latency = 0.8 * self.avg_latency + 0.2 * elapsed
+                if self.avg_latency > self.target_latency:
+                    self.limit = max(1.0, self.limit * 0.75)
+                else:
+                    # Roughly +1 slot per "window" of successful requests
+                    self.limit = min(float(self.max_concurrency), self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+# ==================== SECTION 3: CRAWLER ====================
+class Crawler:
+    """
+    Concurrent fetcher. Results are plain dicts:
+        {"url", "status", "text", "headers", "elapsed", "error"}
+    """
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+    def __init__(self, workers=16, per_host=8, retries=3, backoff=0.5,
+                 timeout=10, target_latency=2.0, headers=None, max_backoff=30.0):
+        self.workers = workers
+        self.per_host = per_host
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.target_latency = target_latency
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=per_host, pool_maxsize=workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        if headers:
+            self.session.headers.update(headers)
+
+        self._throttles = {}
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "retries": 0, "failures": 0, "bytes": 0}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.session.close()
+
+    # ---------- single fetch ----------
+    def _throttle_for(self, url):
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self._throttles:
+                self._throttles[host] = HostThrottle(self.per_host, self.target_latency)
+            return self._throttles[host]
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self.stats[key] += amount
+
+    def _backoff_delay(self, attempt, response):
+        """
+        Exponential backoff with jitter, honouring Retry-After (seconds or
+        HTTP-date) when given; either way at most max_backoff seconds
+        """
+        retry_after = None
+        if response is not None:
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+        if retry_after is None:
+            retry_after = self.backoff * (2 ** attempt) * (0.5 + random.random())
+        return min(retry_after, self.max_backoff)
+
+    def fetch(self, url, headers=None):
+        """GET one URL with throttling and retries"""
+        throttle = self._throttle_for(url)
+        response, error = None, None
+
+        for attempt in range(self.retries + 1):
+            throttle.acquire()
+            start = time.perf_counter()
+            try:
+                response = self.session.get(url, timeout=self.timeout, headers=headers)
+            except requests.RequestException as e:
+                throttle.release(ok=False)
+                response, error = None, str(e)
+            else:
+                elapsed = time.perf_counter() - start
+                retryable = response.status_code in self.RETRY_STATUSES
+                throttle.release(elapsed, ok=not retryable)
+                self._count("requests")
+                if not retryable:
+                    self._count("bytes", len(response.content))
+                    return {
+                        "url": url,
+                        "status": response.status_code,
+                        "text": response.text,
+                        "headers": dict(response.headers),
+                        "elapsed": elapsed,
+                        "error": None,
+                    }
+                error = f"HTTP {response.status_code}"
+
+            if attempt < self.retries:
+                self._count("retries")
+                time.sleep(self._backoff_delay(attempt, response))
+
+        self._count("failures")
+        return {
+            "url": url,
+            "status": response.status_code if response is not None else None,
+            "text": "",
+            "headers": {},
+            "elapsed": None,
+            "error": error,
+        }
+
+    # ---------- many fetches ----------
+    def fetch_many(self, urls, headers_for=None):
+        """
+        Fetch URLs concurrently, yielding results as they complete.
+        headers_for(url) can supply per-request headers (e.g. conditional GETs).
+        """
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="crawler") as pool:
+            futures = [
+                pool.submit(self.fetch, url, headers_for(url) if headers_for else None)
+                for url in urls
+            ]
+            for future in as_completed(futures):
+                yield future.result()
+
+    def host_limits(self):
+        """Current adaptive limit + average latency per host"""
+        with self._lock:
+            return {
+                host: {"limit": int(t.limit), "avg_latency": t.avg_latency}
+                for host, t in self._throttles.items()
+            }
@@ -0,0 +1,140 @@
+"""
+QUERY EMBEDDING CACHE
+Exact-match LRU cache of question embeddings, keyed by a normalized form of
+the question, so repeated questions skip model.encode() even when their
+answer can't be served from the semantic answer cache (expired, rebuilt
+index, error answers). Optionally saved to disk on shutdown and loaded on
+startup, so a restart or deploy doesn't begin cold.
+"""
+
+# ==================== SECTION 1: IMPORTS ====================
+import os
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+QUOTES_REGEX = re.compile(r"[\"'`“”‘’()\[\]{}]")
+SENTENCE_PUNCT_REGEX = re.compile(r"[?!.,;:]+(?=\s|$)")
+WHITESPACE_REGEX = re.compile(r"\s+")
+
+# ==================== SECTION 2: NORMALIZATION ====================
+def normalize_query(question):
+    """
+    The one question key used by the API, for this cache and for coalescing
+    concurrent questions (rag_query.SingleFlight): lowercase, quotes/brackets
+    dropped, sentence punctuation dropped, whitespace collapsed. Punctuation inside a token ("b.sc",
+    "c++", "3.5") is kept because it changes the meaning.
+    """
+    text = QUOTES_REGEX.sub("", question.lower())
+    text = SENTENCE_PUNCT_REGEX.sub(" ", text)
+    return WHITESPACE_REGEX.sub(" ", text).strip()
+
+# ==================== SECTION 3: CACHE ====================
+class QueryEmbeddingCache:
+    """
+    Size-bounded LRU of normalized question -> float32 embedding.
+
+    - get() / put() work on single questions, get_many() serves a batch and
+      reports which ones still need encoding
+    - `model` tags the cache file; a file written for a different encoder
+      (or dimension) is ignored on load
+    """
+    def __init__(self, max_entries=10000, path=None, model=None):
+        self.max_entries = max_entries
+        self.path = path
+        self.model = model
+
+        self._entries = OrderedDict()   # normalized question -> float32 vector
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.loaded = 0
+
+    # ---------- public API ----------
+    def get(self, question):
+        """Cached embedding (as a list) for an equivalent question, or None"""
+        key = normalize_query(question)
+        with self._lock:
+            vec = self._entries.get(key)
+            if vec is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return vec.tolist()
+
+    def get_many(self, questions):
+        """(embeddings with None for misses, indices of the misses)"""
+        embeddings = [self.get(question) for question in questions]
+        return embeddings, [i for i, e in enumerate(embeddings) if e is None]
+
+    def put(self, question, embedding):
+        key = normalize_query(question)
+        vec = np.asarray(embedding, dtype=np.float32)
+        with self._lock:
+            self._entries[key] = vec
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            "evictions": self.evictions,
+            "loaded": self.loaded,
+            "persistent": bool(self.path),
+        }
+
+    # ---------- persistence ----------
+    def load(self):
+        """Fill the cache from `path` (oldest first, so LRU order survives); returns entries loaded"""
+        if not self.path or not os.path.exists(self.path):
+            return 0
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                if str(data["model"]) != str(self.model):
+                    return 0
+                keys, vectors = data["keys"], data["vectors"]
+        except (OSError, KeyError, ValueError):
+            return 0   # unreadable or from an older format: start cold rather than fail startup
+        with self._lock:
+            for key, vec in zip(keys[-self.max_entries:], vectors[-self.max_entries:]):
+                self._entries[str(key)] = np.array(vec, dtype=np.float32)
+                self._entries.move_to_end(str(key))
+            self.loaded = len(self._entries)
+        return self.loaded
+
+    def save(self):
+        """Write the cache to `path` atomically; returns entries saved"""
+        if not self.path:
+            return 0
+        with self._lock:
+            keys = list(self._entries)
+            vectors = list(self._entries.values())
+        if not keys:
+            return 0
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        # Per process + thread: gunicorn workers shutting down together must not share a temp file
+        tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                np.savez(f, keys=np.array(keys), vectors=np.stack(vectors), model=np.array(str(self.model)))
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return len(keys)
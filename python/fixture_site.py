@@ -0,0 +1,141 @@
+"""
+LOCAL FIXTURE SITE
+Serves the HTML pages in a fixture directory plus generated sitemaps, so the
+crawler and scraper can be exercised offline:
+
+    python fixture_site.py fixtures/site 8765 --delay 0.05
+    python fixture_site.py fixtures/site 8765 --fail-first 2 --retry-after 1
+    SCRAPER_BASE_URL=http://127.0.0.1:8765 python uni_web_scrapper.py full
+
+--fail-first N answers every page N times with a 503 (plus Retry-After, if
+given) before serving it, to exercise the crawler's retries and backoff.
+
+start_fixture_site() does the same in-process (port 0 = pick a free port).
+"""
+
+# ==================== SECTION 1: IMPORTS ====================
+import hashlib
+import os
+import sys
+import threading
+import time
+from email.utils import formatdate
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# ==================== SECTION 2: REQUEST HANDLER ====================
+class FixtureHandler(BaseHTTPRequestHandler):
+    root = "fixtures/site"
+    delay = 0.0
+    fail_first = 0         # failed answers per page before it is served
+    fail_status = 503
+    retry_after = None     # Retry-After value sent with those failures
+    attempts = None        # shared page -> request count, set by start_fixture_site
+    lock = None
+
+    def log_message(self, format, *args):
+        pass  # keep crawler progress bars readable
+
+    def _base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _pages(self):
+        return sorted(f for f in os.listdir(self.root) if f.endswith(".html"))
+
+    def _lastmod(self, name):
+        mtime = os.path.getmtime(os.path.join(self.root, name))
+        return time.strftime("%Y-%m-%dT%H:%M:%S+00:00", time.gmtime(mtime))
+
+    def _attempt(self, path):
+        """How many times `path` has been requested, this request included"""
+        with self.lock:
+            self.attempts[path] = self.attempts.get(path, 0) + 1
+            return self.attempts[path]
+
+    def _send(self, status, body, content_type="text/html; charset=utf-8", headers=None):
+        data = body.encode("utf-8") if isinstance(body, str) else body
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.delay:
+            time.sleep(self.delay)
+
+        path = self.path.split("?")[0]
+        base = self._base_url()
+
+        if path == "/sitemap_index.xml":
+            body = (
+                '<?xml version="1.0" encoding="UTF-8"?>\n'
+                '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+                f"<sitemap><loc>{base}/page-sitemap.xml</loc></sitemap>\n"
+                "</sitemapindex>\n"
+            )
+            return self._send(200, body, "application/xml")
+
+        if path == "/page-sitemap.xml":
+            entries = "".join(
+                f"<url><loc>{base}/{name}</loc><lastmod>{self._lastmod(name)}</lastmod></url>\n"
+                for name in self._pages()
+            )
+            body = (
+                '<?xml version="1.0" encoding="UTF-8"?>\n'
+                '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+                f"{entries}</urlset>\n"
+            )
+            return self._send(200, body, "application/xml")
+
+        file_path = os.path.join(self.root, os.path.basename(path))
+        if path.endswith(".html") and os.path.isfile(file_path):
+            if self.fail_first and self._attempt(path) <= self.fail_first:
+                headers = {"Retry-After": self.retry_after} if self.retry_after else None
+                return self._send(self.fail_status, "<html><body>Try again later</body></html>", headers=headers)
+            with open(file_path, "rb") as f:
+                data = f.read()
+            validators = {
+                "ETag": '"%s"' % hashlib.md5(data).hexdigest(),
+                "Last-Modified": formatdate(os.path.getmtime(file_path), usegmt=True),
+            }
+            if self.headers.get("If-None-Match") == validators["ETag"]:
+                self.send_response(304)
+                for name, value in validators.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                return
+            return self._send(200, data, headers=validators)
+
+        self._send(404, "<html><body>Not found</body></html>")
+
+# ==================== SECTION 3: SERVER ====================
+def start_fixture_site(root="fixtures/site", port=0, delay=0.0, **behaviour):
+    """
+    Start the fixture server in a background thread, return (server, base_url).
+    behaviour overrides the handler attributes (fail_first, fail_status, retry_after).
+    """
+    handler = type("BoundFixtureHandler", (FixtureHandler,), {
+        **behaviour, "root": root, "delay": delay, "attempts": {}, "lock": threading.Lock()})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    host, bound_port = server.server_address[:2]
+    return server, f"http://{host}:{bound_port}"
+
+if __name__ == "__main__":
+    root = sys.argv[1] if len(sys.argv) > 1 else "fixtures/site"
+    port = int(sys.argv[2]) if len(sys.argv) > 2 else 8765
+    delay = float(sys.argv[sys.argv.index("--delay") + 1]) if "--delay" in sys.argv else 0.0
+    fail_first = int(sys.argv[sys.argv.index("--fail-first") + 1]) if "--fail-first" in sys.argv else 0
+    retry_after = sys.argv[sys.argv.index("--retry-after") + 1] if "--retry-after" in sys.argv else None
+
+    server, base_url = start_fixture_site(root, port, delay, fail_first=fail_first, retry_after=retry_after)
+    print(f"🌐 Serving {root} at {base_url} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,50 @@
+"""
+MULTI-WORKER SERVING (gunicorn + uvicorn workers)
+
+    gunicorn -c gunicorn_conf.py api:app
+    WEB_CONCURRENCY=8 RAG_VECTOR_BACKEND=mmap gunicorn -c gunicorn_conf.py api:app
+
+The master imports the app and calls runtime.preload() before forking, so
+the embedding model, BM25 index and (with RAG_VECTOR_BACKEND=mmap) the vector
+index are loaded once and shared copy-on-write; gc.freeze() keeps worker GC
+passes from dirtying those pages. Each worker then only opens what isn't
+fork-safe (Chroma's sqlite client, onnxruntime sessions) and warms up.
+
+Cost of each extra worker (bench_workers.py, PSS = shared pages split
+between the processes using them; 2k-chunk mmap index, 1 -> 3 workers):
+
+    torch encoder, preload (this file)           ~55 MB   (ready in 9.6s)
+    torch encoder, RAG_PRELOAD=0                ~495 MB   (ready in 31s)
+    onnx encoder, preload                        ~70 MB   (ready in 1.4s)
+    onnx encoder, uvicorn --workers (spawn)     ~105 MB
+
+With preload the model weights and torch's code stay shared and a worker
+mostly pays for its interpreter heap and activations. Without it (or with
+`uvicorn --workers`, which spawns instead of forking) every worker holds a
+private copy of the model. RAG_VECTOR_BACKEND=mmap shares the index through
+the page cache in every mode; the Chroma backend keeps a private HNSW index
+per worker. Re-measure on the target machine with `python bench_workers.py`.
+
+RAG_ENCODER_THREADS defaults to cores / workers so N workers don't each start
+a full-width intra-op thread pool.
+"""
+
+import multiprocessing
+import os
+
+bind = os.getenv("RAG_BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", str(min(4, multiprocessing.cpu_count()))))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = os.getenv("RAG_PRELOAD", "1") == "1"
+timeout = int(os.getenv("RAG_WORKER_TIMEOUT", "120"))   # first request may still be warming up
+graceful_timeout = 30
+
+# Read by RagConfig when the app is imported (after this file runs)
+os.environ.setdefault("RAG_ENCODER_THREADS", str(max(1, multiprocessing.cpu_count() // workers)))
+
+def on_starting(server):
+    """Master, after the app was imported (preload_app) and before any worker is forked"""
+    if preload_app:
+        from rag_query import runtime
+        runtime.preload()
+        server.log.info("Preloaded before fork: %s", ", ".join(runtime.preloaded))
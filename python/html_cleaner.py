@@ -0,0 +1,134 @@
+"""
+HTML CLEANING ENGINE
+Turns a scraped page into the plain text the pipeline stores. Works on the
+lxml tree directly instead of building a BeautifulSoup tree:
+
+- one pass over the elements marks unwanted tags and classes, then each
+  unwanted id is looked up with a compiled XPath, mirroring the order of the
+  original tag -> class -> id phases (only the first element per id is
+  dropped, as soup.find() did)
+- dropped elements are emptied in place but keep their tail text, so the
+  surrounding text nodes stay separate exactly like soup.get_text(" ")
+- text inside <template> / <rt> / <rp> is skipped, as BeautifulSoup's
+  get_text() does (those strings aren't plain NavigableStrings)
+- boilerplate phrases are removed with one compiled alternation
+
+extract_text_reference() is the original BeautifulSoup implementation. It is
+the fallback for documents lxml can't parse as a string and the baseline that
+bench_clean.py checks every page against (output must be identical).
+"""
+
+# ==================== SECTION 1: IMPORTS ====================
+import re
+
+from lxml import etree
+
+UNWANTED_TAGS = ["script", "style", "nav", "footer", "header",
+                 "noscript", "aside", "sidebar", "share", "pagination"]
+UNWANTED_CLASSES = ["share", "pagination", "navigation", "breadcrumb",
+                    "related-posts", "post-navigation", "widget",
+                    "comments", "social-share", "meta", "tags"]
+UNWANTED_IDS = ["comments", "sidebar", "related-posts", "navigation"]
+
+# Common footer/nav phrases, removed in this order
+BOILERPLATE_PATTERNS = [
+    "WhatsApp us",
+    "Share:",
+    "Previous post",
+    "Next post",
+    "You may also like",
+    "Read More",
+    "Home ",
+    "Archives - Muhammad Ali Jinnah University",
+    "- Muhammad Ali Jinnah University",
+]
+
+_UNWANTED_TAGS = frozenset(UNWANTED_TAGS)
+_UNWANTED_CLASSES = frozenset(UNWANTED_CLASSES)
+_HIDDEN_TEXT_TAGS = frozenset(["template", "rt", "rp"])
+_HTML_PARSER = etree.HTMLParser()
+_TEXT_NODES = etree.XPath("//text()", smart_strings=False)
+_BY_ID = etree.XPath("(//*[@id=$id])[1]")
+BOILERPLATE_REGEX = re.compile("|".join(re.escape(p) for p in BOILERPLATE_PATTERNS))
+
+# ==================== SECTION 2: BOILERPLATE ====================
+def strip_boilerplate(text):
+    """
+    Remove BOILERPLATE_PATTERNS in one regex pass. Sequential str.replace
+    can also delete a phrase that only appears once an earlier one is cut
+    out ("Next Share:post"); if anything is left over, redo it that way.
+    """
+    stripped = BOILERPLATE_REGEX.sub("", text)
+    if BOILERPLATE_REGEX.search(stripped) is None:
+        return stripped
+    for pattern in BOILERPLATE_PATTERNS:
+        text = text.replace(pattern, "")
+    return text
+
+# ==================== SECTION 3: ENGINE ====================
+def _drop(element):
+    """Empty an element (children, text, attributes) but keep the text that follows it"""
+    element.clear(keep_tail=True)
+
+def extract_text(html):
+    """Strip non-content elements from a page's HTML and return clean text"""
+    try:
+        root = etree.fromstring(html, _HTML_PARSER)
+    except (ValueError, etree.LxmlError):
+        root = None   # e.g. str input with an XML encoding declaration
+    if root is None:
+        return extract_text_reference(html)
+
+    # Tags and classes in one traversal (dropping an outer element discards its subtree anyway)
+    marked, hidden = [], []
+    for element in root.iter(tag=etree.Element):
+        if element.tag in _UNWANTED_TAGS:
+            marked.append(element)
+            continue
+        classes = element.get("class")
+        if classes and not _UNWANTED_CLASSES.isdisjoint(classes.split()):
+            marked.append(element)
+        elif element.tag in _HIDDEN_TEXT_TAGS:
+            hidden.append(element)
+    for element in marked:
+        _drop(element)
+
+    # First remaining element per id, in the original order
+    for element_id in UNWANTED_IDS:
+        found = _BY_ID(root, id=element_id)
+        if found:
+            _drop(found[0])
+
+    # Only after the id lookups: an unwanted id inside a <template> still counts
+    for element in hidden:
+        _drop(element)
+
+    text = " ".join(" ".join(_TEXT_NODES(root)).split())
+    return " ".join(strip_boilerplate(text).split())
+
+# ==================== SECTION 4: REFERENCE IMPLEMENTATION ====================
+def extract_text_reference(html):
+    """Original multi-pass BeautifulSoup cleaner (fallback + parity baseline)"""
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, "lxml")
+
+    for tag in UNWANTED_TAGS:
+        for element in soup.find_all(tag):
+            element.decompose()
+
+    for class_name in UNWANTED_CLASSES:
+        for element in soup.find_all(class_=class_name):
+            element.decompose()
+
+    for element_id in UNWANTED_IDS:
+        element = soup.find(id=element_id)
+        if element:
+            element.decompose()
+
+    text = soup.get_text(separator=" ")
+    text = " ".join(text.split())
+
+    for pattern in BOILERPLATE_PATTERNS:
+        text = text.replace(pattern, "")
+
+    return " ".join(text.split())
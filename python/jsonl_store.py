@@ -0,0 +1,220 @@
+"""
+JSONL RECORD FILES
+Pages and chunks are stored one JSON object per line (data/clean_pages.jsonl,
+data/chunks.jsonl) instead of one indented JSON array, so every stage can
+stream them:
+
+- JsonlWriter only ever appends lines, to `<path>.tmp`, and renames it over
+  `<path>` when the last record is written. A crash mid-write leaves the
+  previous file untouched; readers never see half a file.
+- iter_jsonl() is a generator: memory stays flat whatever the corpus size.
+- With index=True the writer also stores the byte offset of every record in
+  `<path>.idx` (uint64, little-endian), followed by the size of the data
+  file it describes, so JsonlReader can count records and fetch record i
+  with one seek instead of parsing the whole file. An index whose size
+  doesn't match the data file is ignored (the offsets are rescanned).
+
+Files from before the switch (data/chunks.json, data/clean_pages.json) are
+still read, as a fallback, when the .jsonl file doesn't exist yet.
+
+Usage:
+    python jsonl_store.py info data/chunks.jsonl
+    python jsonl_store.py convert data/chunks.json     # -> data/chunks.jsonl (+ .idx)
+"""
+
+# ==================== SECTION 1: IMPORTS ====================
+import json
+import os
+import sys
+from array import array
+
+# ==================== SECTION 2: WRITING ====================
+def index_path(path):
+    return f"{path}.idx"
+
+def legacy_path(path):
+    """data/chunks.jsonl -> data/chunks.json (the old single-array format)"""
+    return path[:-1] if path.endswith(".jsonl") else None
+
+class JsonlWriter:
+    """
+    Streams records to `<path>.tmp`; close() publishes the file (and its
+    offset index) with os.replace. Leaving the `with` block through an
+    exception discards the partial file.
+    """
+    def __init__(self, path, index=True):
+        self.path = path
+        self.index = index
+        self.count = 0
+        self.bytes = 0
+        self._offsets = array("Q")
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._tmp_path = f"{path}.tmp"
+        self._file = open(self._tmp_path, "wb")
+
+    def write(self, record):
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        if self.index:
+            self._offsets.append(self.bytes)
+        self._file.write(line)
+        self.bytes += len(line)
+        self.count += 1
+
+    def write_all(self, records):
+        for record in records:
+            self.write(record)
+        return self
+
+    def close(self):
+        if self._file is None:
+            return
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        self._file = None
+        # Old index out, data in, new index in: a crash at any point leaves
+        # either no index (readers rescan) or one that matches the data
+        if os.path.exists(index_path(self.path)):
+            os.remove(index_path(self.path))
+        os.replace(self._tmp_path, self.path)
+        if self.index:
+            self._offsets.append(self.bytes)   # trailer: size of the data file
+            if sys.byteorder != "little":
+                self._offsets.byteswap()
+            idx_tmp = f"{index_path(self.path)}.tmp"
+            with open(idx_tmp, "wb") as f:
+                self._offsets.tofile(f)
+            os.replace(idx_tmp, index_path(self.path))
+
+    def abort(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            os.remove(self._tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+def write_jsonl(path, records, index=True):
+    """Stream an iterable of records to `path` atomically; returns the record count"""
+    with JsonlWriter(path, index=index) as writer:
+        writer.write_all(records)
+    return writer.count
+
+# ==================== SECTION 3: READING ====================
+def has_records(path):
+    """True if `path` or its legacy .json exists"""
+    legacy = legacy_path(path)
+    return os.path.exists(path) or bool(legacy and os.path.exists(legacy))
+
+def iter_jsonl(path):
+    """Yield the records of `path` one at a time (nothing if neither it nor its legacy .json exists)"""
+    if not os.path.exists(path):
+        legacy = legacy_path(path)
+        if legacy and os.path.exists(legacy):
+            with open(legacy, "r", encoding="utf-8") as f:
+                yield from json.load(f)
+        return
+    with open(path, "rb") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+class JsonlReader:
+    """
+    Random access through the offset index: len(reader) and reader[i] without
+    reading the records before i. Falls back to one scan of the file for the
+    offsets when the index is missing, older than the data file or written
+    for a different file size. When only the legacy .json exists, its
+    records are loaded into memory instead.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._records = None
+        self._file = None
+        legacy = legacy_path(path)
+        if not os.path.exists(path) and legacy and os.path.exists(legacy):
+            with open(legacy, "r", encoding="utf-8") as f:
+                self._records = json.load(f)
+            return
+        self.offsets = self._load_offsets()
+        self._file = open(path, "rb")
+
+    def _load_offsets(self):
+        idx = index_path(self.path)
+        if os.path.exists(idx) and os.path.getmtime(idx) >= os.path.getmtime(self.path):
+            offsets = array("Q")
+            with open(idx, "rb") as f:
+                offsets.frombytes(f.read())
+            if sys.byteorder != "little":
+                offsets.byteswap()
+            # Trust it only if it was written for a data file of this size
+            if offsets and offsets[-1] == os.path.getsize(self.path):
+                offsets.pop()
+                return offsets
+        offsets, position = array("Q"), 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                if line.strip():
+                    offsets.append(position)
+                position += len(line)
+        return offsets
+
+    def __len__(self):
+        if self._records is not None:
+            return len(self._records)
+        return len(self.offsets)
+
+    def __getitem__(self, i):
+        if self._records is not None:
+            return self._records[i]
+        self._file.seek(self.offsets[i])
+        return json.loads(self._file.readline())
+
+    def sample(self, limit):
+        """Up to `limit` records spread evenly over the file"""
+        step = max(1, len(self) // max(1, limit))
+        return [self[i] for i in range(0, len(self), step)[:limit]]
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def count_records(path):
+    """Number of records, from the offset index when there is one"""
+    if os.path.exists(path):
+        with JsonlReader(path) as reader:
+            return len(reader)
+    return sum(1 for _ in iter_jsonl(path))
+
+# ==================== SECTION 4: MAIN EXECUTION ====================
+if __name__ == "__main__":
+    argv = sys.argv[1:]
+    command = argv[0] if argv else ""
+
+    if command == "info" and len(argv) > 1:
+        with JsonlReader(argv[1]) as reader:
+            print(json.dumps({
+                "records": len(reader),
+                "size_mb": round(os.path.getsize(argv[1]) / 1024 / 1024, 2),
+                "indexed": os.path.exists(index_path(argv[1])),
+            }, indent=2))
+    elif command == "convert" and len(argv) > 1:
+        target = argv[1] + "l" if argv[1].endswith(".json") else argv[1] + ".jsonl"
+        with open(argv[1], "r", encoding="utf-8") as f:
+            count = write_jsonl(target, json.load(f))
+        print(f"✅ Wrote {count} records to {target}")
+    else:
+        print("Usage: python jsonl_store.py info <file.jsonl> | convert <file.json>")
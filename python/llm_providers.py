@@ -0,0 +1,617 @@
+"""
+LLM PROVIDERS
+Chat-completion backends behind one interface, and a router that orders them
+by health, fails over when one errors and hedges slow calls:
+
+    router = LLMRouter([GroqProvider(...), OpenAICompatibleProvider(...)])
+    text = await router.complete(prompt)            # hedged + failover
+    async for delta in router.stream(prompt): ...   # time to first token hedged
+
+Every provider waits for admission on its own LLMScheduler and raises
+LLMUnavailableError subclasses on failure, never error strings.
+"""
+
+# ==================== SECTION 1: IMPORTS ====================
+import asyncio
+import json
+import math
+import threading
+import time
+from collections import deque
+
+from llm_scheduler import (
+    LLMOverloadedError, LLMProviderError, LLMRateLimitedError, LLMScheduler,
+    LLMUnavailableError, estimate_tokens, parse_retry_after,
+)
+from metrics import observe_llm_call, observe_llm_hedge, record_llm_usage, span
+
+# ==================== SECTION 2: PROVIDER HEALTH ====================
+class ProviderHealth:
+    """
+    Rolling latency windows (for p50 / p95), an EWMA error rate and a circuit
+    breaker: `failure_threshold` consecutive failures open the circuit for
+    `cooldown` seconds, after which a single probe call is let through
+    (half-open). A successful probe closes it again.
+    """
+    def __init__(self, window=200, failure_threshold=5, cooldown=30.0):
+        self.latencies = {"complete": deque(maxlen=window), "first_token": deque(maxlen=window)}
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.error_rate = 0.0
+        self.successes = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.state = "closed"
+        self.opened_at = 0.0
+        self.probing = False
+        self._lock = threading.Lock()
+
+    def percentile(self, kind, pct):
+        """Nearest-rank percentile of recent latencies in seconds (None without samples)"""
+        ordered = sorted(self.latencies[kind])
+        if not ordered:
+            return None
+        return ordered[min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))]
+
+    def score(self, kind):
+        """
+        Lower is better: typical latency inflated by the recent error rate.
+        No samples yet scores 0, so a new provider gets tried.
+        """
+        p50 = self.percentile(kind, 50) or 0.0
+        return p50 * (1 + 4 * self.error_rate) + self.error_rate
+
+    def ready(self):
+        """Would a call be let through right now? (no side effects, for ranking)"""
+        with self._lock:
+            if self.state == "open":
+                return time.monotonic() - self.opened_at >= self.cooldown
+            return not (self.state == "half_open" and self.probing)
+
+    def available(self):
+        """
+        Check and claim in one step: True if the caller may call now. Past the
+        cooldown an open circuit goes half-open and only the caller that gets
+        True owns the single probe; everyone else gets False until it finishes.
+        """
+        with self._lock:
+            if self.state == "open":
+                if time.monotonic() - self.opened_at < self.cooldown:
+                    return False
+                self.state = "half_open"
+            if self.state == "half_open":
+                if self.probing:
+                    return False
+                self.probing = True
+            return True
+
+    def retry_in(self):
+        with self._lock:
+            if self.state != "open":
+                return 0.0
+            return max(0.0, self.cooldown - (time.monotonic() - self.opened_at))
+
+    def record_success(self, kind, seconds):
+        with self._lock:
+            self.latencies[kind].append(seconds)
+            self.successes += 1
+            self.consecutive_failures = 0
+            self.error_rate *= 0.9
+            self.state = "closed"
+            self.probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.consecutive_failures += 1
+            self.error_rate = self.error_rate * 0.9 + 0.1
+            if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+                self.state = "open"
+                self.opened_at = time.monotonic()
+            self.probing = False
+
+    def record_abandoned(self, kind=None, seconds=None):
+        """
+        Call cancelled: no success/failure verdict. A hedge loser passes how long
+        it had run, a lower bound on its latency, so slow tails still show in p95.
+        """
+        with self._lock:
+            if kind is not None:
+                self.latencies[kind].append(seconds)
+            self.probing = False
+
+    def snapshot(self):
+        def ms(value):
+            return round(value * 1000, 1) if value is not None else None
+        return {
+            "state": self.state,
+            "successes": self.successes,
+            "failures": self.failures,
+            "error_rate": round(self.error_rate, 4),
+            "p50_ms": ms(self.percentile("complete", 50)),
+            "p95_ms": ms(self.percentile("complete", 95)),
+            "first_token_p95_ms": ms(self.percentile("first_token", 95)),
+        }
+
+# ==================== SECTION 3: PROVIDERS ====================
+def _status_of(error):
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status
+
+class LLMProvider:
+    """
+    Base class. Subclasses implement _complete / _stream / _complete_sync,
+    returning usage as (prompt_tokens, completion_tokens) or None; this class
+    handles admission, usage accounting and error mapping.
+    """
+    def __init__(self, name, model, system_prompt="", temperature=0.3, max_tokens=1000,
+                 scheduler=None, health=None):
+        self.name = name
+        self.model = model
+        self.system_prompt = system_prompt
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.scheduler = scheduler or LLMScheduler(name)
+        self.health = health or ProviderHealth()
+
+    def messages(self, prompt):
+        return [
+            {"role": "system", "content": self.system_prompt},
+            {"role": "user", "content": prompt}
+        ]
+
+    def _reservation(self, prompt):
+        """Tokens to reserve: estimated prompt + the completion budget"""
+        return estimate_tokens(self.system_prompt + prompt) + self.max_tokens
+
+    def _settle(self, reserved, usage):
+        if usage is None:
+            return
+        prompt_tokens, completion_tokens = usage
+        record_llm_usage(self.name, prompt_tokens, completion_tokens)
+        if prompt_tokens is not None and completion_tokens is not None:
+            self.scheduler.settle(reserved, prompt_tokens + completion_tokens)
+
+    def _refund(self, reserved):
+        """Call failed or was cancelled (e.g. lost a hedge race): give its tokens back"""
+        self.scheduler.settle(reserved, 0)
+
+    def unavailable(self, error):
+        """Map a client exception to LLMUnavailableError (a 429 also pauses the scheduler)"""
+        if isinstance(error, LLMUnavailableError):
+            return error
+        response = getattr(error, "response", None)
+        headers = getattr(response, "headers", None)
+        retry_after = parse_retry_after(headers.get("retry-after")) if headers is not None else None
+        if _status_of(error) == 429:
+            retry_after = retry_after or 5.0
+            self.scheduler.penalize(retry_after)
+            return LLMRateLimitedError(f"{self.name} rate limit: {error}", retry_after)
+        return LLMProviderError(f"{self.name} error: {error}", retry_after or 1.0)
+
+    async def _admit(self, prompt):
+        with span("llm_queue", provider=self.name):
+            return await self.scheduler.acquire(self._reservation(prompt))
+
+    async def complete(self, prompt):
+        reserved = await self._admit(prompt)
+        try:
+            text, usage = await self._complete(prompt)
+        except asyncio.CancelledError:
+            self._refund(reserved)
+            raise
+        except Exception as e:
+            self._refund(reserved)
+            raise self.unavailable(e) from e
+        self._settle(reserved, usage)
+        return text
+
+    async def stream(self, prompt):
+        reserved = await self._admit(prompt)
+        settled = False
+        try:
+            async for delta, usage in self._stream(prompt):
+                if usage is not None:
+                    self._settle(reserved, usage)
+                    settled = True
+                if delta:
+                    yield delta
+            settled = True   # finished without reporting usage: keep the estimate
+        except Exception as e:
+            raise self.unavailable(e) from e
+        finally:
+            # Failed, cancelled or closed early (lost a hedge race) before usage came in
+            if not settled:
+                self._refund(reserved)
+
+    def complete_sync(self, prompt):
+        reserved = self.scheduler.acquire_blocking(self._reservation(prompt))
+        try:
+            text, usage = self._complete_sync(prompt)
+        except Exception as e:
+            self._refund(reserved)
+            raise self.unavailable(e) from e
+        self._settle(reserved, usage)
+        return text
+
+    async def _complete(self, prompt):
+        raise NotImplementedError
+
+    async def _stream(self, prompt):
+        raise NotImplementedError
+        yield
+
+    def _complete_sync(self, prompt):
+        raise NotImplementedError
+
+    async def aclose(self):
+        pass
+
+class GroqProvider(LLMProvider):
+    """Groq cloud API through the official SDK, with a pooled keep-alive transport"""
+    def __init__(self, api_key, model, max_connections=50, keepalive_connections=20,
+                 keepalive_expiry=60.0, timeout=30.0, name="groq", **kwargs):
+        super().__init__(name, model, **kwargs)
+        self.api_key = api_key
+        self.max_connections = max_connections
+        self.keepalive_connections = keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.timeout = timeout
+        self._client = None
+        self._async_client = None
+        self._lock = threading.Lock()
+
+    def client(self):
+        """Shared synchronous Groq client"""
+        with self._lock:
+            if self._client is None:
+                from groq import Groq
+                self._client = Groq(api_key=self.api_key)
+            return self._client
+
+    def async_client(self):
+        """Shared async Groq client with a pooled keep-alive HTTP transport"""
+        with self._lock:
+            if self._async_client is None:
+                import httpx
+                from groq import AsyncGroq
+                http_client = httpx.AsyncClient(
+                    limits=httpx.Limits(
+                        max_connections=self.max_connections,
+                        max_keepalive_connections=self.keepalive_connections,
+                        keepalive_expiry=self.keepalive_expiry,
+                    ),
+                    timeout=self.timeout,
+                )
+                self._async_client = AsyncGroq(api_key=self.api_key, http_client=http_client)
+            return self._async_client
+
+    @staticmethod
+    def _usage(usage):
+        if usage is None:
+            return None
+        return getattr(usage, "prompt_tokens", None), getattr(usage, "completion_tokens", None)
+
+    def _request(self, prompt, **extra):
+        return dict(
+            model=self.model,
+            messages=self.messages(prompt),
+            temperature=self.temperature,
+            max_tokens=self.max_tokens,
+            **extra
+        )
+
+    async def _complete(self, prompt):
+        response = await self.async_client().chat.completions.create(**self._request(prompt))
+        return response.choices[0].message.content, self._usage(getattr(response, "usage", None))
+
+    async def _stream(self, prompt):
+        stream = await self.async_client().chat.completions.create(**self._request(prompt, stream=True))
+        async for chunk in stream:
+            # Groq reports usage on the final chunk under x_groq
+            x_groq = getattr(chunk, "x_groq", None)
+            usage = self._usage(getattr(x_groq, "usage", None)) if x_groq is not None else None
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            yield delta, usage
+
+    def _complete_sync(self, prompt):
+        response = self.client().chat.completions.create(**self._request(prompt))
+        return response.choices[0].message.content, self._usage(getattr(response, "usage", None))
+
+    async def aclose(self):
+        if self._async_client is not None:
+            await self._async_client.close()
+            self._async_client = None
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+class OpenAICompatibleProvider(LLMProvider):
+    """
+    Any server speaking the OpenAI chat-completions API (llama.cpp server,
+    vLLM, Ollama, LM Studio, ...). base_url includes the /v1 prefix.
+    """
+    def __init__(self, base_url, model, api_key=None, max_connections=20, timeout=30.0,
+                 name="local", **kwargs):
+        super().__init__(name, model, **kwargs)
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self._client = None
+        self._async_client = None
+        self._lock = threading.Lock()
+
+    def _client_kwargs(self):
+        import httpx
+        headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+        return dict(
+            base_url=self.base_url,
+            headers=headers,
+            timeout=self.timeout,
+            limits=httpx.Limits(max_connections=self.max_connections),
+        )
+
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                import httpx
+                self._client = httpx.Client(**self._client_kwargs())
+            return self._client
+
+    def async_client(self):
+        with self._lock:
+            if self._async_client is None:
+                import httpx
+                self._async_client = httpx.AsyncClient(**self._client_kwargs())
+            return self._async_client
+
+    def _payload(self, prompt, stream=False):
+        return {
+            "model": self.model,
+            "messages": self.messages(prompt),
+            "temperature": self.temperature,
+            "max_tokens": self.max_tokens,
+            "stream": stream,
+        }
+
+    @staticmethod
+    def _usage(usage):
+        if not usage:
+            return None
+        return usage.get("prompt_tokens"), usage.get("completion_tokens")
+
+    def _parse(self, data):
+        return data["choices"][0]["message"]["content"], self._usage(data.get("usage"))
+
+    async def _complete(self, prompt):
+        response = await self.async_client().post("/chat/completions", json=self._payload(prompt))
+        response.raise_for_status()
+        return self._parse(response.json())
+
+    async def _stream(self, prompt):
+        async with self.async_client().stream(
+            "POST", "/chat/completions", json=self._payload(prompt, stream=True)
+        ) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                chunk = json.loads(data)
+                choices = chunk.get("choices") or []
+                delta = (choices[0].get("delta") or {}).get("content") if choices else None
+                yield delta, self._usage(chunk.get("usage"))
+
+    def _complete_sync(self, prompt):
+        response = self.client().post("/chat/completions", json=self._payload(prompt))
+        response.raise_for_status()
+        return self._parse(response.json())
+
+    async def aclose(self):
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+# ==================== SECTION 4: ROUTER ====================
+async def _first_delta(stream):
+    """(True, first piece) or (False, None) for an empty stream"""
+    try:
+        return True, await stream.__anext__()
+    except StopAsyncIteration:
+        return False, None
+
+class LLMRouter:
+    """
+    Picks providers by health score (lower p50 x error penalty first), skipping
+    open circuits. If the first call hasn't finished after the hedge delay
+    (that provider's recent p95, or hedge_delay until min_samples exist) the
+    same request is also sent to the next provider and the first answer wins.
+    A failed call fails over to the next provider immediately. Every
+    explore_every-th call the runner-up goes first, so a provider that had a
+    bad spell can earn its place back.
+    """
+    def __init__(self, providers, hedge=True, hedge_delay=2.0, hedge_min_delay=0.25,
+                 hedge_quantile=95, min_samples=20, explore_every=20):
+        self.providers = list(providers)
+        self.hedge = hedge and len(self.providers) > 1
+        self.hedge_delay = hedge_delay
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_quantile = hedge_quantile
+        self.min_samples = min_samples
+        self.explore_every = explore_every
+        self.calls = 0
+        self.hedges = 0
+
+    def ranked(self, kind):
+        order = {provider.name: i for i, provider in enumerate(self.providers)}
+        ranked = sorted(
+            (provider for provider in self.providers if provider.health.ready()),
+            # Providers paused by a 429 go last: they would only sit in their queue
+            key=lambda provider: (provider.scheduler.paused_for() > 0,
+                                  provider.health.score(kind), order[provider.name])
+        )
+        self.calls += 1
+        if len(ranked) > 1 and self.explore_every and self.calls % self.explore_every == 0:
+            ranked[0], ranked[1] = ranked[1], ranked[0]
+        return ranked
+
+    def _hedge_after(self, provider, kind):
+        if len(provider.health.latencies[kind]) < self.min_samples:
+            return self.hedge_delay
+        return max(self.hedge_min_delay, provider.health.percentile(kind, self.hedge_quantile))
+
+    def _no_provider_error(self):
+        retry_after = min((provider.health.retry_in() for provider in self.providers), default=1.0)
+        return LLMOverloadedError("No LLM provider available (all circuits open)", retry_after)
+
+    @staticmethod
+    def _combined_error(errors):
+        retry_after = min(error.retry_after for error in errors)
+        detail = "; ".join(str(error) for error in errors)
+        if all(isinstance(error, LLMRateLimitedError) for error in errors):
+            return LLMRateLimitedError(detail, retry_after)
+        return LLMProviderError(f"All LLM providers failed: {detail}", retry_after)
+
+    @staticmethod
+    def _record_error(provider, error):
+        # Only real provider failures count against health; our own queue / rate
+        # limits (and provider 429s, which pause the scheduler) don't open the circuit
+        if isinstance(error, LLMProviderError):
+            provider.health.record_failure()
+            observe_llm_call(provider.name, "error")
+        else:
+            provider.health.record_abandoned()
+            observe_llm_call(provider.name, "rejected")
+
+    async def _race(self, kind, start):
+        """
+        Run start(provider) -> (handle, awaitable) on the best provider, hedging
+        onto the next one after the hedge delay (at most two in flight) and
+        failing over on errors. Returns (provider, handle, result) of the winner.
+        """
+        queue = self.ranked(kind)
+        running = {}
+        errors = []
+
+        def launch(hedged=False):
+            """Start the next provider that lets the call through (None if none is left)"""
+            while queue:
+                provider = queue.pop(0)
+                # Another request may have claimed this provider's half-open probe since ranking
+                if not provider.health.available():
+                    continue
+                handle, awaitable = start(provider)
+                running[asyncio.ensure_future(awaitable)] = (provider, handle, time.perf_counter())
+                if hedged:
+                    self.hedges += 1
+                    observe_llm_hedge(provider.name)
+                return provider
+            return None
+
+        first = launch()
+        if first is None:
+            raise self._no_provider_error()
+        hedge_after = self._hedge_after(first, kind) if self.hedge else None
+        won = False
+        try:
+            while running:
+                can_hedge = hedge_after is not None and queue and len(running) < 2
+                done, _ = await asyncio.wait(
+                    running, timeout=hedge_after if can_hedge else None,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    launch(hedged=True)
+                    continue
+                for task in done:
+                    provider, handle, started = running.pop(task)
+                    error = task.exception()
+                    if error is None:
+                        provider.health.record_success(kind, time.perf_counter() - started)
+                        observe_llm_call(provider.name, "ok")
+                        won = True
+                        return provider, handle, task.result()
+                    error = provider.unavailable(error)
+                    self._record_error(provider, error)
+                    errors.append(error)
+                if not running and queue:
+                    launch()
+            raise self._combined_error(errors)
+        finally:
+            for task, (provider, handle, started) in running.items():
+                task.cancel()
+                if won:
+                    provider.health.record_abandoned(kind, time.perf_counter() - started)
+                else:
+                    provider.health.record_abandoned()
+                observe_llm_call(provider.name, "cancelled")
+            for task, (provider, handle, _) in running.items():
+                await asyncio.gather(task, return_exceptions=True)
+                if handle is not None:
+                    await handle.aclose()
+
+    async def complete(self, prompt):
+        provider, _, text = await self._race("complete", lambda p: (None, p.complete(prompt)))
+        return text
+
+    async def stream(self, prompt):
+        def start(provider):
+            stream = provider.stream(prompt)
+            return stream, _first_delta(stream)
+
+        provider, stream, (has_first, first) = await self._race("first_token", start)
+        if not has_first:
+            return
+        try:
+            yield first
+            async for delta in stream:
+                yield delta
+        except LLMProviderError:
+            # Too late to fail over once text has been sent
+            provider.health.record_failure()
+            raise
+        finally:
+            await stream.aclose()
+
+    def complete_sync(self, prompt):
+        """Blocking path (CLI): providers in ranked order, failover only, no hedging"""
+        errors = []
+        for provider in self.ranked("complete"):
+            if not provider.health.available():
+                continue
+            started = time.perf_counter()
+            try:
+                text = provider.complete_sync(prompt)
+            except LLMUnavailableError as e:
+                self._record_error(provider, e)
+                errors.append(e)
+                continue
+            provider.health.record_success("complete", time.perf_counter() - started)
+            observe_llm_call(provider.name, "ok")
+            return text
+        raise self._combined_error(errors) if errors else self._no_provider_error()
+
+    async def aclose(self):
+        for provider in self.providers:
+            await provider.aclose()
+
+    def stats(self):
+        return {
+            "hedges": self.hedges,
+            "providers": {
+                provider.name: {
+                    **provider.health.snapshot(),
+                    "score": round(provider.health.score("complete"), 4),
+                    "scheduler": provider.scheduler.stats(),
+                }
+                for provider in self.providers
+            },
+        }
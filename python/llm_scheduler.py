@@ -0,0 +1,197 @@
+"""
+LLM ADMISSION CONTROL
+Token buckets (requests/min and tokens/min) in front of the LLM provider plus
+a bounded wait queue. Every call reserves capacity first; when a bucket is
+empty the caller waits for its turn (reservations are committed up front, so
+waiters are served in arrival order) up to a deadline, instead of every
+request hitting the provider at once and failing together.
+
+    tokens = await scheduler.acquire(estimate_tokens(prompt) + max_tokens)
+    ...call the provider...
+    scheduler.settle(tokens, usage.total_tokens)
+"""
+
+# ==================== SECTION 1: IMPORTS ====================
+import asyncio
+import math
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+from metrics import observe_admission
+
+# ==================== SECTION 2: ERRORS ====================
+class LLMUnavailableError(Exception):
+    """The LLM can't serve this request right now; retry_after is a hint in seconds"""
+    status_code = 503
+
+    def __init__(self, message, retry_after=1.0):
+        super().__init__(message)
+        self.retry_after = max(0.0, retry_after)
+
+    @property
+    def retry_after_header(self):
+        return str(max(1, math.ceil(self.retry_after)))
+
+class LLMRateLimitedError(LLMUnavailableError):
+    """Our token bucket (or the provider) says not before retry_after"""
+    status_code = 429
+
+class LLMOverloadedError(LLMUnavailableError):
+    """Too many requests already waiting for LLM capacity"""
+
+class LLMProviderError(LLMUnavailableError):
+    """The provider call itself failed (connection error, 5xx, ...)"""
+
+def parse_retry_after(value, default=None):
+    """Retry-After in seconds, from either form: delta-seconds or an HTTP-date"""
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError, IndexError):
+        return default
+
+def estimate_tokens(text):
+    """Rough prompt size (~4 characters per token) for reserving tokens/min"""
+    return len(text) // 4 + 1
+
+# ==================== SECTION 3: TOKEN BUCKET ====================
+class TokenBucket:
+    """Refills at per_minute / 60 per second up to one minute's worth; may go negative (debt)"""
+    def __init__(self, per_minute):
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def delay_for(self, amount, now):
+        """Seconds until `amount` is available"""
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+        # Anything larger than the bucket is treated as a full bucket so it can still run
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount):
+        self.level -= min(amount, self.capacity)
+
+    def give(self, amount):
+        self.level = min(self.capacity, self.level + amount)
+
+# ==================== SECTION 4: SCHEDULER ====================
+class LLMScheduler:
+    """
+    Admission control for one provider. A limit <= 0 disables that bucket.
+    max_queue bounds how many callers may be waiting at once; max_wait is the
+    default deadline: a caller that would wait longer is rejected immediately
+    with the wait as Retry-After.
+    """
+    def __init__(self, name, requests_per_min=0, tokens_per_min=0, max_queue=100, max_wait=10.0):
+        self.name = name
+        self.requests = TokenBucket(requests_per_min) if requests_per_min > 0 else None
+        self.tokens = TokenBucket(tokens_per_min) if tokens_per_min > 0 else None
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.waiting = 0
+        self.blocked_until = 0.0
+        self.counts = {"admitted": 0, "queued": 0, "rate_limited": 0, "overloaded": 0}
+        self._lock = threading.Lock()
+
+    def _count(self, outcome):
+        self.counts[outcome] += 1
+        observe_admission(self.name, outcome)
+
+    def _reserve(self, tokens, max_wait):
+        """Commit capacity for one call and return how long to wait before making it"""
+        with self._lock:
+            now = time.monotonic()
+            delay = max(0.0, self.blocked_until - now)
+            if self.requests is not None:
+                delay = max(delay, self.requests.delay_for(1, now))
+            if self.tokens is not None:
+                delay = max(delay, self.tokens.delay_for(tokens, now))
+
+            if delay > max_wait:
+                self._count("rate_limited")
+                raise LLMRateLimitedError(f"{self.name} rate limit reached, retry in {delay:.1f}s", delay)
+            if delay > 0 and self.waiting >= self.max_queue:
+                self._count("overloaded")
+                raise LLMOverloadedError(f"{self.name} wait queue is full ({self.waiting} waiting)", delay)
+
+            if self.requests is not None:
+                self.requests.take(1)
+            if self.tokens is not None:
+                self.tokens.take(tokens)
+            if delay > 0:
+                self.waiting += 1
+                self._count("queued")
+            self._count("admitted")
+            return delay
+
+    def _stop_waiting(self):
+        with self._lock:
+            self.waiting -= 1
+
+    def release(self, tokens):
+        """Give back a reservation that was never used (caller cancelled while waiting)"""
+        with self._lock:
+            if self.requests is not None:
+                self.requests.give(1)
+            if self.tokens is not None:
+                self.tokens.give(tokens)
+
+    async def acquire(self, tokens, max_wait=None):
+        """Wait (without blocking the loop) until the call may start; returns the reserved tokens"""
+        delay = self._reserve(tokens, self.max_wait if max_wait is None else max_wait)
+        if delay > 0:
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                self.release(tokens)
+                raise
+            finally:
+                self._stop_waiting()
+        return tokens
+
+    def acquire_blocking(self, tokens, max_wait=None):
+        """acquire() for synchronous callers (CLI path)"""
+        delay = self._reserve(tokens, self.max_wait if max_wait is None else max_wait)
+        if delay > 0:
+            try:
+                time.sleep(delay)
+            finally:
+                self._stop_waiting()
+        return tokens
+
+    def settle(self, reserved, actual):
+        """Correct the tokens/min bucket once the real usage is known (never above capacity)"""
+        if self.tokens is None or actual is None:
+            return
+        with self._lock:
+            self.tokens.give(reserved - actual)
+
+    def penalize(self, retry_after):
+        """Provider answered 429: hold every new call until retry_after has passed"""
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+
+    def paused_for(self):
+        """Seconds left on a provider-requested pause (0 when not paused)"""
+        with self._lock:
+            return max(0.0, self.blocked_until - time.monotonic())
+
+    def stats(self):
+        with self._lock:
+            now = time.monotonic()
+            for bucket in (self.requests, self.tokens):
+                if bucket is not None:
+                    bucket.delay_for(0, now)  # refill to now
+            return {
+                "waiting": self.waiting,
+                "requests_available": round(self.requests.level, 2) if self.requests else None,
+                "tokens_available": round(self.tokens.level) if self.tokens else None,
+                **self.counts,
+            }
@@ -0,0 +1,149 @@
+"""
+LOCAL LLM STUB SERVER
+A tiny OpenAI-compatible chat-completions server with controllable latency,
+tail latency and failures, so provider routing, hedging and circuit breaking
+can be exercised offline:
+
+    python llm_stub_server.py 8081 --latency 0.2 --slow-rate 0.1 --slow-latency 3
+    python llm_stub_server.py 8082 --latency 0.4 --fail-rate 0.2
+    RAG_LLM_PROVIDERS=local RAG_LOCAL_LLM_URL=http://127.0.0.1:8081/v1,http://127.0.0.1:8082/v1 \
+        uvicorn api:app
+
+start_llm_stub() does the same in-process (port 0 = pick a free port).
+"""
+
+# ==================== SECTION 1: IMPORTS ====================
+import json
+import random
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# ==================== SECTION 2: REQUEST HANDLER ====================
+class StubLLMHandler(BaseHTTPRequestHandler):
+    latency = 0.0          # seconds before the first byte
+    slow_rate = 0.0        # fraction of requests that take slow_latency instead
+    slow_latency = 0.0
+    fail_rate = 0.0        # fraction of requests answered with fail_status
+    fail_status = 500
+    token_delay = 0.01     # seconds between streamed pieces
+    reply = "This is a stub answer from the local test server."
+    stats = None           # shared dict of counters, set by start_llm_stub
+
+    def log_message(self, format, *args):
+        pass
+
+    def _count(self, key):
+        if self.stats is not None:
+            with self.stats["lock"]:
+                self.stats[key] += 1
+
+    def _send_json(self, status, payload, headers=None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _usage(self, request):
+        prompt_chars = sum(len(m.get("content", "")) for m in request.get("messages", []))
+        completion_tokens = len(self.reply.split())
+        return {
+            "prompt_tokens": prompt_chars // 4 + 1,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_chars // 4 + 1 + completion_tokens,
+        }
+
+    def do_POST(self):
+        try:
+            self._handle()
+        except (BrokenPipeError, ConnectionResetError):
+            self._count("disconnects")  # client cancelled (e.g. lost a hedge race)
+
+    def _handle(self):
+        if self.path.split("?")[0].rstrip("/") not in ("/v1/chat/completions", "/chat/completions"):
+            return self._send_json(404, {"error": {"message": "not found"}})
+
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        self._count("requests")
+
+        slow = random.random() < self.slow_rate
+        time.sleep(self.slow_latency if slow else self.latency)
+
+        if random.random() < self.fail_rate:
+            self._count("failures")
+            headers = {"Retry-After": "1"} if self.fail_status == 429 else None
+            return self._send_json(self.fail_status, {"error": {"message": "stub failure"}}, headers)
+
+        model = request.get("model", "stub")
+        if not request.get("stream"):
+            return self._send_json(200, {
+                "id": "stub",
+                "object": "chat.completion",
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": self.reply},
+                             "finish_reason": "stop"}],
+                "usage": self._usage(request),
+            })
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        words = self.reply.split(" ")
+        for i, word in enumerate(words):
+            piece = word if i == 0 else " " + word
+            chunk = {"id": "stub", "object": "chat.completion.chunk", "model": model,
+                     "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+            if self.token_delay:
+                time.sleep(self.token_delay)
+        final = {"id": "stub", "object": "chat.completion.chunk", "model": model,
+                 "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+                 "usage": self._usage(request)}
+        self.wfile.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode("utf-8"))
+        self.wfile.flush()
+
+# ==================== SECTION 3: SERVER ====================
+def start_llm_stub(port=0, **behaviour):
+    """
+    Start a stub in a background thread; behaviour overrides the handler
+    attributes (latency, slow_rate, slow_latency, fail_rate, fail_status,
+    token_delay, reply). Returns (server, base_url, stats); base_url ends in /v1.
+    """
+    stats = {"lock": threading.Lock(), "requests": 0, "failures": 0, "disconnects": 0}
+    handler = type("BoundStubLLMHandler", (StubLLMHandler,), {**behaviour, "stats": stats})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    host, bound_port = server.server_address[:2]
+    return server, f"http://{host}:{bound_port}/v1", stats
+
+if __name__ == "__main__":
+    argv = sys.argv[1:]
+
+    def option(name, default):
+        return argv[argv.index(name) + 1] if name in argv else default
+
+    port = int(argv[0]) if argv and not argv[0].startswith("--") else 8081
+    server, base_url, _ = start_llm_stub(
+        port,
+        latency=float(option("--latency", 0.2)),
+        slow_rate=float(option("--slow-rate", 0)),
+        slow_latency=float(option("--slow-latency", 0)),
+        fail_rate=float(option("--fail-rate", 0)),
+        fail_status=int(option("--fail-status", 500)),
+    )
+    print(f"🤖 Stub LLM serving at {base_url} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
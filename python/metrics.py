@@ -0,0 +1,291 @@
+"""
+METRICS + TRACING
+Minimal Prometheus text-format metrics (no extra dependency) and per-request
+traces with timing spans, written as JSON lines to a local file.
+
+Trace records are queued and appended by one background writer thread, so
+finishing a trace never does file I/O on the event loop.
+
+    with span("retrieve"):          # records rag_stage_seconds{stage="retrieve"}
+        ...                         # and, inside a request, a span on its trace
+"""
+
+# ==================== SECTION 1: IMPORTS ====================
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+TRACE_FILE = os.getenv("RAG_TRACE_FILE", "logs/traces.jsonl")
+TRACE_QUEUE_SIZE = int(os.getenv("RAG_TRACE_QUEUE_SIZE", "10000"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+SCORE_BUCKETS = (0.01, 0.02, 0.03, 0.05, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0)
+
+# ==================== SECTION 2: METRIC TYPES ====================
+def _label_str(labelnames, values):
+    if not labelnames:
+        return ""
+    pairs = ",".join(f'{name}="{value}"' for name, value in zip(labelnames, values))
+    return "{" + pairs + "}"
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_str(self.labelnames, key)} {value}")
+        return lines
+
+class Histogram:
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}   # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            series = self._series.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        names = self.labelnames + ("le",)
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    lines.append(f"{self.name}_bucket{_label_str(names, key + (bound,))} {count}")
+                lines.append(f"{self.name}_bucket{_label_str(names, key + ('+Inf',))} {series[-1]}")
+                lines.append(f"{self.name}_sum{_label_str(self.labelnames, key)} {series[-2]}")
+                lines.append(f"{self.name}_count{_label_str(self.labelnames, key)} {series[-1]}")
+        return lines
+
+class GaugeCallback:
+    """Gauge whose samples come from a function at scrape time: {labels tuple: value}"""
+    def __init__(self, name, help, labelnames, func):
+        self.name, self.help, self.labelnames, self.func = name, help, tuple(labelnames), func
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        for key, value in sorted(self.func().items()):
+            lines.append(f"{self.name}{_label_str(self.labelnames, key)} {value}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+# ==================== SECTION 3: RAG METRICS ====================
+REQUESTS = REGISTRY.register(Counter(
+    "rag_requests_total", "Answered requests by endpoint and outcome", ["endpoint", "outcome"]))
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "rag_request_seconds", "End-to-end request latency", ["endpoint"]))
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "rag_stage_seconds", "Pipeline stage latency", ["stage"]))
+RETRIEVAL_SCORES = REGISTRY.register(Histogram(
+    "rag_retrieval_score", "Scores of retrieved chunks (rank 1 vs all)", ["method", "rank"],
+    buckets=SCORE_BUCKETS))
+LLM_TOKENS = REGISTRY.register(Counter(
+    "rag_llm_tokens_total", "LLM tokens by provider and kind", ["provider", "kind"]))
+BATCH_SIZE = REGISTRY.register(Histogram(
+    "rag_batch_size", "Questions handled per batched call", ["stage"], buckets=BATCH_BUCKETS))
+
+COALESCED = REGISTRY.register(Counter(
+    "rag_single_flight_total", "Questions that started (leader) or joined (follower) a pipeline run", ["role"]))
+
+LLM_ADMISSION = REGISTRY.register(Counter(
+    "rag_llm_admission_total", "LLM scheduler decisions by provider", ["provider", "outcome"]))
+LLM_CALLS = REGISTRY.register(Counter(
+    "rag_llm_calls_total", "LLM provider calls by outcome (ok, error, rejected, cancelled)", ["provider", "outcome"]))
+LLM_HEDGES = REGISTRY.register(Counter(
+    "rag_llm_hedges_total", "Hedged duplicate requests sent, by the provider they went to", ["provider"]))
+
+def observe_batch(stage, size):
+    BATCH_SIZE.observe(size, stage=stage)
+
+def observe_coalesced(role):
+    COALESCED.inc(role=role)
+
+def observe_admission(provider, outcome):
+    LLM_ADMISSION.inc(provider=provider, outcome=outcome)
+
+def observe_llm_call(provider, outcome):
+    LLM_CALLS.inc(provider=provider, outcome=outcome)
+
+def observe_llm_hedge(provider):
+    LLM_HEDGES.inc(provider=provider)
+
+def observe_retrieval(scores, method):
+    for score in scores:
+        RETRIEVAL_SCORES.observe(score, method=method, rank="all")
+    if scores:
+        RETRIEVAL_SCORES.observe(scores[0], method=method, rank="1")
+    trace = current_trace.get()
+    if trace is not None:
+        trace.attrs["retrieval_scores"] = [round(s, 4) for s in scores]
+
+def record_llm_usage(provider, prompt_tokens=None, completion_tokens=None):
+    if prompt_tokens:
+        LLM_TOKENS.inc(prompt_tokens, provider=provider, kind="prompt")
+    if completion_tokens:
+        LLM_TOKENS.inc(completion_tokens, provider=provider, kind="completion")
+    trace = current_trace.get()
+    if trace is not None:
+        trace.attrs["prompt_tokens"] = prompt_tokens
+        trace.attrs["completion_tokens"] = completion_tokens
+
+# ==================== SECTION 4: TRACING ====================
+current_trace = ContextVar("current_trace", default=None)
+
+class TraceWriter:
+    """
+    Appends trace records to `path` from a daemon thread. write() only puts
+    the record on a bounded queue (dropping it, and counting the drop, when
+    the writer can't keep up). The thread is started per process on first
+    use, so forked workers each get their own; the directory is created once,
+    when it starts.
+    """
+    _STOP = object()
+
+    def __init__(self, path, maxsize=TRACE_QUEUE_SIZE):
+        self.path = path
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize)
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._queue = queue.Queue(self._queue.maxsize)   # a forked copy may hold the parent's items
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="trace-writer", daemon=True)
+            self._thread.start()
+
+    def write(self, record):
+        self.start()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        with open(self.path, "a", encoding="utf-8") as f:
+            while True:
+                record = self._queue.get()
+                if record is self._STOP:
+                    break
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                if self._queue.empty():
+                    f.flush()
+
+    def close(self, timeout=5.0):
+        """Write out what is queued and stop the thread"""
+        if self._thread is None or self._pid != os.getpid():
+            return
+        self._queue.put(self._STOP)
+        self._thread.join(timeout)
+        self._thread = None
+
+trace_writer = TraceWriter(TRACE_FILE) if TRACE_FILE else None
+if trace_writer is not None:
+    atexit.register(trace_writer.close)
+
+class Trace:
+    """One request: id, endpoint, timing spans and a few attributes"""
+    def __init__(self, endpoint, request_id=None):
+        self.request_id = request_id or uuid.uuid4().hex
+        self.endpoint = endpoint
+        self.started_at = time.time()
+        self._t0 = time.perf_counter()
+        self.spans = []
+        self.attrs = {}
+
+    def add_span(self, name, start, duration, **attrs):
+        self.spans.append({
+            "name": name,
+            "start_ms": round((start - self._t0) * 1000, 3),
+            "duration_ms": round(duration * 1000, 3),
+            **attrs,
+        })
+
+    def finish(self, outcome="ok"):
+        duration = time.perf_counter() - self._t0
+        REQUESTS.inc(endpoint=self.endpoint, outcome=outcome)
+        REQUEST_SECONDS.observe(duration, endpoint=self.endpoint)
+        write_trace({
+            "request_id": self.request_id,
+            "endpoint": self.endpoint,
+            "started_at": self.started_at,
+            "duration_ms": round(duration * 1000, 3),
+            "outcome": outcome,
+            "spans": self.spans,
+            **self.attrs,
+        })
+
+def start_trace(endpoint, request_id=None):
+    """Create a trace and make it current for this task / thread"""
+    trace = Trace(endpoint, request_id)
+    current_trace.set(trace)
+    return trace
+
+def write_trace(record):
+    """Queue a finished trace for the writer thread (no I/O on the caller's thread)"""
+    if trace_writer is not None:
+        trace_writer.write(record)
+
+def record_stage(name, start, **attrs):
+    """Record a stage that began at perf_counter() value `start` and ends now"""
+    duration = time.perf_counter() - start
+    STAGE_SECONDS.observe(duration, stage=name)
+    trace = current_trace.get()
+    if trace is not None:
+        trace.add_span(name, start, duration, **attrs)
+
+@contextmanager
+def span(name, **attrs):
+    """Time a pipeline stage: always feeds rag_stage_seconds, plus the current trace"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, start, **attrs)
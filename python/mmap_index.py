@@ -0,0 +1,289 @@
+"""
+MEMORY-MAPPED VECTOR INDEX
+A flat, exact alternative to the Chroma collection for small/medium corpora
+(thousands to ~100k chunks). Embeddings are exported once to an int8 or
+float16 matrix and searched with blocked NumPy matrix products. Every file is
+opened with mmap, so several uvicorn workers read the same physical pages
+from the OS page cache instead of each holding its own copy.
+
+int8 (default) is a quarter of float32 and the fastest to scan; float16 keeps
+more precision but NumPy's half -> float conversion is not vectorized, which
+makes a full scan about 4x slower (~115 vs ~28 ms at 100k x 384, one core).
+
+Layout of chroma_db/mmap_index/ (rows sorted by chunk id):
+    manifest.json      count, dim, dtype, model, build time
+    vectors.npy        (n, dim) int8 with per-row scales.npy, or float16
+    sq_norms.npy       squared L2 norm of each stored row (float32)
+    ids.npy            fixed-width chunk ids, sorted (binary search for get())
+    texts.bin          all chunk texts, utf-8, back to back
+    text_offsets.npy   text of row i is texts.bin[offsets[i]:offsets[i+1]]
+    sources.json       distinct source URLs; source_idx.npy maps row -> source
+
+MmapVectorIndex answers the subset of the Chroma collection API the query
+path uses (query / get / count), so it drops in for `rt.collection`.
+
+Usage:
+    python mmap_index.py export                  # int8, from the Chroma collection
+    python mmap_index.py export --dtype float16
+    python mmap_index.py info
+"""
+
+# ==================== SECTION 1: IMPORTS ====================
+import json
+import mmap
+import os
+import shutil
+import sys
+import threading
+import time
+
+import numpy as np
+
+INDEX_DIR = "chroma_db/mmap_index"
+BLOCK_ROWS = 4096       # rows scored per matrix product (float32 scratch stays cache-sized)
+EXPORT_PAGE = 5000      # rows fetched per collection.get page when exporting
+
+# ==================== SECTION 2: BUILD ====================
+def quantize_int8(vectors):
+    """Symmetric per-row int8: row ~= q * scale"""
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    q = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return q, scales.astype(np.float32)
+
+def write_index(path, ids, embeddings, texts, sources, dtype="int8", model=None):
+    """
+    Write a complete index directory. Built next to the target and swapped in
+    with a rename, so readers never see a half-written index.
+    """
+    if dtype not in ("float16", "int8"):
+        raise ValueError(f"dtype must be float16 or int8, not {dtype!r}")
+    order = np.argsort(np.array(ids, dtype=object), kind="stable")
+    vectors = np.asarray(embeddings, dtype=np.float32)[order]
+
+    tmp = path + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    if dtype == "int8":
+        stored, scales = quantize_int8(vectors)
+        np.save(os.path.join(tmp, "scales.npy"), scales)
+        dequantized = stored.astype(np.float32) * scales[:, None]
+    else:
+        stored = vectors.astype(np.float16)
+        dequantized = stored.astype(np.float32)
+    np.save(os.path.join(tmp, "vectors.npy"), stored)
+    np.save(os.path.join(tmp, "sq_norms.npy"), np.einsum("ij,ij->i", dequantized, dequantized))
+
+    sorted_ids = [ids[i] for i in order]
+    width = max((len(i) for i in sorted_ids), default=1)
+    np.save(os.path.join(tmp, "ids.npy"), np.array(sorted_ids, dtype=f"S{width}"))
+
+    offsets = np.zeros(len(sorted_ids) + 1, dtype=np.int64)
+    with open(os.path.join(tmp, "texts.bin"), "wb") as f:
+        for row, i in enumerate(order):
+            data = texts[i].encode("utf-8")
+            f.write(data)
+            offsets[row + 1] = offsets[row] + len(data)
+    np.save(os.path.join(tmp, "text_offsets.npy"), offsets)
+
+    distinct = sorted(set(sources))
+    lookup = {source: n for n, source in enumerate(distinct)}
+    np.save(os.path.join(tmp, "source_idx.npy"), np.array([lookup[sources[i]] for i in order], dtype=np.int32))
+    with open(os.path.join(tmp, "sources.json"), "w", encoding="utf-8") as f:
+        json.dump(distinct, f, ensure_ascii=False)
+
+    with open(os.path.join(tmp, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "count": len(sorted_ids),
+            "dim": int(vectors.shape[1]) if len(vectors) else 0,
+            "dtype": dtype,
+            "model": model,
+            "built_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }, f, indent=2)
+
+    old = path + ".old"
+    shutil.rmtree(old, ignore_errors=True)
+    if os.path.exists(path):
+        os.rename(path, old)
+    os.rename(tmp, path)
+    shutil.rmtree(old, ignore_errors=True)
+
+def export_collection(collection, path=INDEX_DIR, dtype="int8", model=None):
+    """Page every embedding, text and source out of a Chroma collection into an index"""
+    ids, embeddings, texts, sources = [], [], [], []
+    offset = 0
+    while True:
+        page = collection.get(include=["embeddings", "documents", "metadatas"],
+                              limit=EXPORT_PAGE, offset=offset)
+        ids.extend(page["ids"])
+        embeddings.extend(page["embeddings"])
+        texts.extend(page["documents"])
+        sources.extend((meta or {}).get("source", "") for meta in page["metadatas"])
+        if len(page["ids"]) < EXPORT_PAGE:
+            break
+        offset += EXPORT_PAGE
+    write_index(path, ids, embeddings, texts, sources, dtype=dtype, model=model)
+    return len(ids)
+
+# ==================== SECTION 3: INDEX ====================
+class MmapVectorIndex:
+    """Read-only exact index over the files written by write_index()"""
+    def __init__(self, path=INDEX_DIR):
+        self.path = path
+        with open(os.path.join(path, "manifest.json"), "r", encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        with open(os.path.join(path, "sources.json"), "r", encoding="utf-8") as f:
+            self.sources = json.load(f)
+
+        def load(name):
+            return np.load(os.path.join(path, name), mmap_mode="r")
+
+        self.vectors = load("vectors.npy")
+        self.scales = load("scales.npy") if self.manifest["dtype"] == "int8" else None
+        self.sq_norms = load("sq_norms.npy")
+        self.ids = load("ids.npy")
+        self.text_offsets = load("text_offsets.npy")
+        self.source_idx = load("source_idx.npy")
+
+        self._scratch = threading.local()  # per-thread float32 block buffer
+        self._texts_file = open(os.path.join(path, "texts.bin"), "rb")
+        size = os.fstat(self._texts_file.fileno()).st_size
+        self._texts = mmap.mmap(self._texts_file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    @classmethod
+    def exists(cls, path=INDEX_DIR):
+        return os.path.exists(os.path.join(path, "manifest.json"))
+
+    def count(self):
+        return len(self.ids)
+
+    def close(self):
+        """Release the text mapping and file; the arrays' mappings go once nothing references them"""
+        if isinstance(self._texts, mmap.mmap):
+            self._texts.close()
+        self._texts_file.close()
+        self.vectors = self.scales = self.sq_norms = None
+        self.ids = self.text_offsets = self.source_idx = None
+
+    # ---------- rows ----------
+    def _block(self, start, stop):
+        """Stored rows as float32 (int8 rows still unscaled), in a reused buffer"""
+        buffer = getattr(self._scratch, "buffer", None)
+        if buffer is None:
+            buffer = self._scratch.buffer = np.empty((BLOCK_ROWS, self.vectors.shape[1]), dtype=np.float32)
+        block = buffer[:stop - start]
+        np.copyto(block, self.vectors[start:stop], casting="unsafe")
+        return block
+
+    def _text(self, row):
+        return self._texts[self.text_offsets[row]:self.text_offsets[row + 1]].decode("utf-8")
+
+    def _id(self, row):
+        return self.ids[row].decode("ascii")
+
+    def _metadata(self, row):
+        return {"source": self.sources[self.source_idx[row]], "chunk_id": self._id(row)}
+
+    def _rows_for(self, ids):
+        """Row numbers of the given ids (missing ids are skipped)"""
+        if not len(self.ids):
+            return []
+        wanted = np.array(ids, dtype=self.ids.dtype)
+        rows = np.searchsorted(self.ids, wanted)
+        rows = np.minimum(rows, len(self.ids) - 1)
+        return [int(row) for row, want in zip(rows, wanted) if self.ids[row] == want]
+
+    # ---------- search ----------
+    def search(self, query_embeddings, top_k):
+        """
+        Exact nearest neighbours by squared L2 distance (Chroma's default space).
+        Returns (rows, distances), each shaped (n_queries, k), best first.
+        """
+        queries = np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32))
+        n = self.count()
+        k = min(top_k, n)
+        if k == 0:
+            return np.zeros((len(queries), 0), dtype=np.int64), np.zeros((len(queries), 0), dtype=np.float32)
+
+        q_norms = np.einsum("ij,ij->i", queries, queries)[:, None]
+        best_rows, best_dist = None, None
+        for start in range(0, n, BLOCK_ROWS):
+            stop = min(start + BLOCK_ROWS, n)
+            # |q - x|^2 = |q|^2 + |x|^2 - 2 q.x, one matrix product per block
+            dots = queries @ self._block(start, stop).T
+            if self.scales is not None:
+                dots *= self.scales[start:stop][None, :]
+            dist = q_norms + self.sq_norms[start:stop][None, :] - 2.0 * dots
+            kb = min(k, stop - start)
+            part = np.argpartition(dist, kb - 1, axis=1)[:, :kb]
+            rows = part + start
+            dist = np.take_along_axis(dist, part, axis=1)
+            if best_rows is None:
+                best_rows, best_dist = rows, dist
+            else:
+                best_rows = np.concatenate([best_rows, rows], axis=1)
+                best_dist = np.concatenate([best_dist, dist], axis=1)
+                keep = np.argpartition(best_dist, k - 1, axis=1)[:, :k]
+                best_rows = np.take_along_axis(best_rows, keep, axis=1)
+                best_dist = np.take_along_axis(best_dist, keep, axis=1)
+
+        order = np.argsort(best_dist, axis=1, kind="stable")
+        return np.take_along_axis(best_rows, order, axis=1), np.take_along_axis(best_dist, order, axis=1)
+
+    # ---------- Chroma-compatible surface ----------
+    def query(self, query_embeddings, n_results=10, include=("documents", "metadatas", "distances")):
+        rows, distances = self.search(query_embeddings, n_results)
+        result = {"ids": [[self._id(r) for r in per_query] for per_query in rows]}
+        result["documents"] = [[self._text(r) for r in per_query] for per_query in rows] \
+            if "documents" in include else None
+        result["metadatas"] = [[self._metadata(r) for r in per_query] for per_query in rows] \
+            if "metadatas" in include else None
+        result["distances"] = [[float(d) for d in per_query] for per_query in distances] \
+            if "distances" in include else None
+        return result
+
+    def get(self, ids=None, include=("documents", "metadatas"), limit=None, offset=0):
+        if ids is None:
+            stop = self.count() if limit is None else min(self.count(), offset + limit)
+            rows = list(range(offset, stop))
+        else:
+            rows = self._rows_for(ids)
+        return {
+            "ids": [self._id(r) for r in rows],
+            "documents": [self._text(r) for r in rows] if "documents" in include else None,
+            "metadatas": [self._metadata(r) for r in rows] if "metadatas" in include else None,
+        }
+
+# ==================== SECTION 4: CLI ====================
+def check_recall(collection, index, samples=50, k=10):
+    """Share of the collection's top-k also returned by the index, using stored vectors as queries"""
+    page = collection.get(include=["embeddings"], limit=samples)
+    if not page["ids"]:
+        return None
+    queries = page["embeddings"]
+    expected = collection.query(query_embeddings=queries, n_results=k, include=[])["ids"]
+    got = index.query(queries, n_results=k, include=())["ids"]
+    hits = sum(len(set(e) & set(g)) for e, g in zip(expected, got))
+    return hits / sum(len(e) for e in expected)
+
+if __name__ == "__main__":
+    argv = sys.argv[1:]
+    command = argv[0] if argv else "info"
+
+    if command == "export":
+        from build_chromadb import COLLECTION_NAME, MODEL_NAME, open_client
+        dtype = argv[argv.index("--dtype") + 1] if "--dtype" in argv else "int8"
+        collection = open_client().get_collection(name=COLLECTION_NAME)
+        t0 = time.perf_counter()
+        count = export_collection(collection, INDEX_DIR, dtype=dtype, model=MODEL_NAME)
+        print(f"✅ Exported {count} vectors ({dtype}) to {INDEX_DIR} in {time.perf_counter() - t0:.1f}s")
+        recall = check_recall(collection, MmapVectorIndex(INDEX_DIR))
+        if recall is not None:
+            print(f"   top-10 agreement with Chroma: {recall:.3f}")
+    elif command == "info":
+        index = MmapVectorIndex(INDEX_DIR)
+        size = sum(os.path.getsize(os.path.join(INDEX_DIR, f)) for f in os.listdir(INDEX_DIR))
+        print(json.dumps({**index.manifest, "size_mb": round(size / 1024 / 1024, 2)}, indent=2))
+    else:
+        print("Usage: python mmap_index.py export [--dtype int8|float16] | info")
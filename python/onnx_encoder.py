@@ -0,0 +1,298 @@
+"""
+ONNX QUERY ENCODER
+all-MiniLM-L6-v2 exported to ONNX and dynamically quantized to int8, run with
+onnxruntime and a `tokenizers` fast tokenizer. No torch at query time, so the
+process starts faster and stays smaller, and a single query encodes in a
+fraction of the PyTorch time on CPU.
+
+OnnxEncoder.encode() mirrors SentenceTransformer.encode() for the calls this
+repo makes (str -> 1-D array, list -> 2-D array), with the same mean pooling
+and L2 normalization, so rag_query.py (RAG_ENCODER_BACKEND=onnx) and
+build_chromadb.py (--encoder onnx) can use either backend.
+
+Exporting needs torch + sentence-transformers once; serving only needs
+onnxruntime, tokenizers and numpy.
+
+Layout of models/minilm-onnx/:
+    model.onnx         float32 export (kept for reference / re-quantizing)
+    model_int8.onnx    dynamically quantized weights (what OnnxEncoder loads)
+    tokenizer.json     fast tokenizer of the source model
+    encoder.json       source model, max_seq_length, pooling, normalize, dim
+
+Usage:
+    python onnx_encoder.py export        # export + quantize + parity check
+    python onnx_encoder.py check         # cosine vs SentenceTransformer (must be >= 0.99)
+    python onnx_encoder.py bench         # per-query latency + RSS of both backends
+"""
+
+# ==================== SECTION 1: IMPORTS ====================
+import inspect
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from jsonl_store import JsonlReader
+
+MODEL_NAME = "all-MiniLM-L6-v2"
+ENCODER_DIR = "models/minilm-onnx"
+ONNX_FILE = "model.onnx"
+QUANTIZED_FILE = "model_int8.onnx"
+PARITY_THRESHOLD = 0.99
+
+PARITY_SENTENCES = [
+    "What is the admission fee?",
+    "How can I apply for a scholarship?",
+    "What programs does the university offer?",
+    "Who is the head of the computer science department?",
+    "When does the fall semester start?",
+    "Is there hostel accommodation for female students?",
+    "What documents are required for admission?",
+    "fee structure BS computer science per semester",
+    "The university offers undergraduate and graduate programs in engineering, "
+    "business administration and social sciences, with evening classes available.",
+    "Admissions open in July. Candidates must pass the entry test and submit "
+    "attested copies of their matriculation and intermediate certificates.",
+]
+
+# ==================== SECTION 2: EXPORT ====================
+def export_encoder(path=ENCODER_DIR, model_name=MODEL_NAME, quantize=True):
+    """Export the SentenceTransformer's transformer to ONNX and quantize it (needs torch)"""
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(model_name, device="cpu")
+    transformer = model[0].auto_model.eval()
+    pooling = model[1]
+    if not getattr(pooling, "pooling_mode_mean_tokens", True):
+        raise ValueError(f"{model_name} does not use mean pooling, which OnnxEncoder implements")
+    normalize = any(type(module).__name__ == "Normalize" for module in model)
+
+    os.makedirs(path, exist_ok=True)
+    model.tokenizer.save_pretrained(path)   # writes tokenizer.json for fast tokenizers
+
+    sample = model.tokenizer(["export sample"], return_tensors="pt")
+    inputs = ("input_ids", "attention_mask", "token_type_ids")
+    dynamic = {name: {0: "batch", 1: "sequence"} for name in inputs}
+    dynamic["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+    class HiddenStates(torch.nn.Module):
+        def __init__(self, inner):
+            super().__init__()
+            self.inner = inner
+
+        def forward(self, input_ids, attention_mask, token_type_ids):
+            return self.inner(input_ids=input_ids, attention_mask=attention_mask,
+                              token_type_ids=token_type_ids).last_hidden_state
+
+    onnx_path = os.path.join(path, ONNX_FILE)
+    # Newer torch defaults to the dynamo exporter (needs onnxscript); the TorchScript one is enough here
+    legacy = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+    with torch.no_grad():
+        torch.onnx.export(
+            HiddenStates(transformer),
+            tuple(sample[name] for name in inputs),
+            onnx_path,
+            input_names=list(inputs),
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic,
+            opset_version=14,
+            **legacy,
+        )
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(onnx_path, os.path.join(path, QUANTIZED_FILE), weight_type=QuantType.QInt8)
+
+    with open(os.path.join(path, "encoder.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "model": model_name,
+            "max_seq_length": model.max_seq_length,
+            "pooling": "mean",
+            "normalize": normalize,
+            "dim": model.get_sentence_embedding_dimension(),
+            "quantized": quantize,
+            "exported_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }, f, indent=2)
+    return model
+
+# ==================== SECTION 3: ENCODER ====================
+class OnnxEncoder:
+    """Drop-in for SentenceTransformer.encode() backed by onnxruntime"""
+    def __init__(self, path=ENCODER_DIR, quantized=True, threads=None):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        with open(os.path.join(path, "encoder.json"), "r", encoding="utf-8") as f:
+            self.config = json.load(f)
+        self.max_seq_length = self.config["max_seq_length"]
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(path, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=self.max_seq_length)
+        self.tokenizer.no_padding()   # padded per batch in encode()
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        model_file = QUANTIZED_FILE if quantized and self.config.get("quantized") else ONNX_FILE
+        self.session = onnxruntime.InferenceSession(
+            os.path.join(path, model_file), options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    @staticmethod
+    def exists(path=ENCODER_DIR):
+        return os.path.exists(os.path.join(path, "encoder.json"))
+
+    def get_sentence_embedding_dimension(self):
+        return self.config["dim"]
+
+    def _encode_batch(self, encodings):
+        length = max(len(e.ids) for e in encodings)
+        input_ids = np.zeros((len(encodings), length), dtype=np.int64)
+        attention_mask = np.zeros((len(encodings), length), dtype=np.int64)
+        token_type_ids = np.zeros((len(encodings), length), dtype=np.int64)
+        for row, encoding in enumerate(encodings):
+            n = len(encoding.ids)
+            input_ids[row, :n] = encoding.ids
+            attention_mask[row, :n] = encoding.attention_mask
+            token_type_ids[row, :n] = encoding.type_ids
+
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask, "token_type_ids": token_type_ids}
+        hidden = self.session.run(None, {k: v for k, v in feeds.items() if k in self.input_names})[0]
+
+        # Mean pooling over real tokens, then L2 normalize (same as the Pooling + Normalize modules)
+        mask = attention_mask[:, :, None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+        if self.config.get("normalize"):
+            pooled /= np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+        return pooled
+
+    def encode(self, sentences, batch_size=32, show_progress_bar=False, **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return np.zeros((0, self.config["dim"]), dtype=np.float32)
+
+        encodings = self.tokenizer.encode_batch(texts)
+        # Batch similar lengths together so short questions aren't padded to the longest chunk
+        order = sorted(range(len(texts)), key=lambda i: len(encodings[i].ids))
+        output = np.empty((len(texts), self.config["dim"]), dtype=np.float32)
+        for start in range(0, len(order), batch_size):
+            rows = order[start:start + batch_size]
+            output[rows] = self._encode_batch([encodings[i] for i in rows])
+        return output[0] if single else output
+
+# ==================== SECTION 4: PARITY CHECK ====================
+def cosine_rows(a, b):
+    a = np.asarray(a, dtype=np.float32)
+    b = np.asarray(b, dtype=np.float32)
+    norms = np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1)
+    return (a * b).sum(axis=1) / np.maximum(norms, 1e-12)
+
+def parity_sentences(limit=200):
+    """Fixed questions plus a sample of real chunks when data/chunks.jsonl exists"""
+    sentences = list(PARITY_SENTENCES)
+    if os.path.exists("data/chunks.jsonl"):
+        with JsonlReader("data/chunks.jsonl") as chunks:
+            sentences += [chunk["text"] for chunk in chunks.sample(limit)]
+    return sentences
+
+def check_parity(reference, encoder, sentences=None):
+    """Per-sentence cosine between SentenceTransformer and ONNX embeddings"""
+    sentences = sentences or parity_sentences()
+    expected = reference.encode(sentences, batch_size=32, show_progress_bar=False)
+    got = encoder.encode(sentences, batch_size=32)
+    cosines = cosine_rows(expected, got)
+    return {
+        "sentences": len(sentences),
+        "min_cosine": round(float(cosines.min()), 5),
+        "mean_cosine": round(float(cosines.mean()), 5),
+        "passed": bool(cosines.min() >= PARITY_THRESHOLD),
+    }
+
+# ==================== SECTION 5: BENCHMARK ====================
+def rss_mb():
+    """Current resident set size (Linux /proc; falls back to peak RSS elsewhere)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def probe(backend, path=ENCODER_DIR, rounds=200):
+    """Load one backend in this (fresh) process and time single-question encodes"""
+    t0 = time.perf_counter()
+    if backend == "onnx":
+        model = OnnxEncoder(path)
+    else:
+        from sentence_transformers import SentenceTransformer
+        model = SentenceTransformer(MODEL_NAME, device="cpu")
+    load_s = time.perf_counter() - t0
+
+    questions = PARITY_SENTENCES[:8]
+    for question in questions:      # warm-up
+        model.encode(question)
+    samples = []
+    for i in range(rounds):
+        start = time.perf_counter()
+        model.encode(questions[i % len(questions)])
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "backend": backend,
+        "load_ms": round(load_s * 1000, 1),
+        "p50_ms": round(samples[len(samples) // 2], 3),
+        "p95_ms": round(samples[int(len(samples) * 0.95)], 3),
+        "rss_mb": round(rss_mb(), 1),
+    }
+
+def run_benchmark(path=ENCODER_DIR, rounds=200):
+    """Each backend in its own interpreter so imports and RSS don't leak between them"""
+    results = []
+    for backend in ("torch", "onnx"):
+        t0 = time.perf_counter()
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "_probe", backend, path, str(rounds)],
+            capture_output=True, text=True, check=True,
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        result["process_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+        results.append(result)
+    return results
+
+# ==================== SECTION 6: CLI ====================
+if __name__ == "__main__":
+    argv = sys.argv[1:]
+    command = argv[0] if argv else "check"
+
+    if command == "_probe":
+        print(json.dumps(probe(argv[1], argv[2], int(argv[3]))))
+    elif command in ("export", "check"):
+        if command == "export":
+            print(f"📦 Exporting {MODEL_NAME} to ONNX (int8) in {ENCODER_DIR}...")
+            reference = export_encoder(ENCODER_DIR)
+        else:
+            from sentence_transformers import SentenceTransformer
+            reference = SentenceTransformer(MODEL_NAME, device="cpu")
+        result = check_parity(reference, OnnxEncoder(ENCODER_DIR))
+        print(json.dumps(result, indent=2))
+        if result["passed"]:
+            print(f"✅ ONNX encoder matches SentenceTransformer (min cosine {result['min_cosine']})")
+        else:
+            print(f"❌ Min cosine {result['min_cosine']} is below {PARITY_THRESHOLD}, don't use this export")
+            sys.exit(1)
+    elif command == "bench":
+        rounds = int(argv[argv.index("--rounds") + 1]) if "--rounds" in argv else 200
+        print(f"⏱️ Encoding single questions, {rounds} rounds per backend...")
+        results = run_benchmark(ENCODER_DIR, rounds)
+        print(f"\n  {'backend':<8}{'load ms':>10}{'p50 ms':>9}{'p95 ms':>9}{'RSS MB':>9}{'process ms':>12}")
+        for r in results:
+            print(f"  {r['backend']:<8}{r['load_ms']:>10.1f}{r['p50_ms']:>9.2f}{r['p95_ms']:>9.2f}"
+                  f"{r['rss_mb']:>9.1f}{r['process_ms']:>12.1f}")
+    else:
+        print("Usage: python onnx_encoder.py export | check | bench [--rounds N]")
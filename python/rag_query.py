@@ -1,24 +1,110 @@
 """
 RAG QUERY SYSTEM FOR UNIVERSITY Q&A
+
+Importing this module is cheap and side-effect free: chromadb,
+sentence_transformers / onnxruntime and the LLM SDKs are imported when the
+runtime or a provider is first used, and nothing is printed or written
+until then. Cold start is measured by bench_startup.py.
 """
 
 # ==================== SECTION 1: IMPORTS ====================
-import chromadb
-from sentence_transformers import SentenceTransformer
-import json
+import asyncio
+import gc
 import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from answer_cache import SemanticAnswerCache
+from embedding_cache import QueryEmbeddingCache, normalize_query
+from metrics import current_trace, observe_batch, observe_coalesced, observe_retrieval, record_stage, span
+from llm_scheduler import LLMScheduler, LLMUnavailableError
+from llm_providers import GroqProvider, LLMRouter, OpenAICompatibleProvider, ProviderHealth
+from mmap_index import INDEX_DIR as MMAP_INDEX_DIR, MmapVectorIndex
+from onnx_encoder import ENCODER_DIR as ONNX_ENCODER_DIR, OnnxEncoder
+from bm25_index import BM25Index, INDEX_PATH as LEXICAL_INDEX_PATH, reciprocal_rank_fusion
 
 # Load environment variables (for API keys)
 load_dotenv()
 
-# ==================== SECTION 2: INITIALIZE CHROMADB ====================
-print("="*60)
-print("INITIALIZING RAG QUERY SYSTEM")
-print("="*60)
+# ==================== SECTION 1b: CONFIGURATION ====================
+class RagConfig:
+    TOP_K = 3
+    GROQ_MODEL = "llama-3.3-70b-versatile"
+    TEMPERATURE = 0.3
+    MAX_TOKENS = 1000
+    SYSTEM_PROMPT = "You are a helpful university assistant. Provide answers without citations or source references."
+    
+    # Async execution path (all overridable from .env)
+    EXECUTOR_WORKERS = int(os.getenv("RAG_EXECUTOR_WORKERS", "4"))
+    EMBED_TIMEOUT = float(os.getenv("RAG_EMBED_TIMEOUT", "5"))
+    RETRIEVE_TIMEOUT = float(os.getenv("RAG_RETRIEVE_TIMEOUT", "5"))
+    LLM_TIMEOUT = float(os.getenv("RAG_LLM_TIMEOUT", "30"))
+    LLM_MAX_CONNECTIONS = int(os.getenv("RAG_LLM_MAX_CONNECTIONS", "50"))
+    LLM_KEEPALIVE_CONNECTIONS = int(os.getenv("RAG_LLM_KEEPALIVE_CONNECTIONS", "20"))
+    LLM_KEEPALIVE_EXPIRY = float(os.getenv("RAG_LLM_KEEPALIVE_EXPIRY", "60"))
+    
+    # LLM admission control (defaults match Groq's free tier for GROQ_MODEL; 0 = unlimited)
+    LLM_REQUESTS_PER_MIN = int(os.getenv("RAG_LLM_RPM", "30"))
+    LLM_TOKENS_PER_MIN = int(os.getenv("RAG_LLM_TPM", "12000"))
+    LLM_QUEUE_SIZE = int(os.getenv("RAG_LLM_QUEUE_SIZE", "100"))
+    LLM_QUEUE_TIMEOUT = float(os.getenv("RAG_LLM_QUEUE_TIMEOUT", "10"))
+    
+    # LLM providers: routing order, OpenAI-compatible local servers, hedging, circuit breaker
+    LLM_PROVIDERS = [p.strip() for p in os.getenv("RAG_LLM_PROVIDERS", "groq,local").split(",") if p.strip()]
+    LOCAL_LLM_URLS = [u.strip() for u in os.getenv("RAG_LOCAL_LLM_URL", "").split(",") if u.strip()]
+    LOCAL_LLM_MODEL = os.getenv("RAG_LOCAL_LLM_MODEL", "local-model")
+    LOCAL_LLM_REQUESTS_PER_MIN = int(os.getenv("RAG_LOCAL_LLM_RPM", "0"))
+    LLM_HEDGE_ENABLED = os.getenv("RAG_LLM_HEDGE", "1") == "1"
+    LLM_HEDGE_DELAY = float(os.getenv("RAG_LLM_HEDGE_DELAY", "2"))  # until p95 is known
+    LLM_HEDGE_QUANTILE = float(os.getenv("RAG_LLM_HEDGE_QUANTILE", "95"))
+    LLM_BREAKER_FAILURES = int(os.getenv("RAG_LLM_BREAKER_FAILURES", "5"))
+    LLM_BREAKER_COOLDOWN = float(os.getenv("RAG_LLM_BREAKER_COOLDOWN", "30"))
+    
+    # Semantic answer cache
+    ANSWER_CACHE_ENABLED = os.getenv("RAG_ANSWER_CACHE", "1") == "1"
+    ANSWER_CACHE_THRESHOLD = float(os.getenv("RAG_ANSWER_CACHE_THRESHOLD", "0.92"))
+    ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("RAG_ANSWER_CACHE_MAX_ENTRIES", "1000"))
+    ANSWER_CACHE_TTL = float(os.getenv("RAG_ANSWER_CACHE_TTL", "3600"))
+    
+    # Query embedding cache (exact match on the normalized question; "" path = memory only)
+    EMBED_CACHE_ENABLED = os.getenv("RAG_EMBED_CACHE", "1") == "1"
+    EMBED_CACHE_MAX_ENTRIES = int(os.getenv("RAG_EMBED_CACHE_MAX_ENTRIES", "10000"))
+    EMBED_CACHE_PATH = os.getenv("RAG_EMBED_CACHE_PATH", "./chroma_db/query_embeddings.npz")
+    
+    # Vector store: "chroma" (collection) or "mmap" (exported int8/float16 matrix, shared page cache)
+    VECTOR_BACKEND = os.getenv("RAG_VECTOR_BACKEND", "chroma").lower()
+    
+    # Query encoder: "torch" (SentenceTransformer) or "onnx" (int8 export from onnx_encoder.py, no torch import)
+    ENCODER_BACKEND = os.getenv("RAG_ENCODER_BACKEND", "torch").lower()
+    # Intra-op threads for the encoder (0 = library default: all cores, which oversubscribes with several workers)
+    ENCODER_THREADS = int(os.getenv("RAG_ENCODER_THREADS", "0"))
+    
+    # build_chromadb rewrites this last; when it changes the runtime reloads its
+    # indexes and the answer cache drops its entries (checked at most every N seconds)
+    INDEX_MARKER = "./chroma_db/metadata.json"
+    INDEX_CHECK_INTERVAL = float(os.getenv("RAG_INDEX_CHECK_INTERVAL", "5"))
+    INDEX_RETIRE_DELAY = float(os.getenv("RAG_INDEX_RETIRE_DELAY", "60"))  # then the replaced mmap index is closed
+    
+    # Hybrid retrieval (BM25 + vectors fused with reciprocal rank fusion)
+    HYBRID_ENABLED = os.getenv("RAG_HYBRID", "1") == "1"
+    HYBRID_CANDIDATES = int(os.getenv("RAG_HYBRID_CANDIDATES", "20"))
+    RRF_K = 60
+    
+    # Batching: /ask/batch limits, and micro-batching of concurrent single questions
+    BATCH_MAX_QUESTIONS = int(os.getenv("RAG_BATCH_MAX_QUESTIONS", "64"))
+    BATCH_LLM_CONCURRENCY = int(os.getenv("RAG_BATCH_LLM_CONCURRENCY", "4"))
+    MICROBATCH_WINDOW_MS = float(os.getenv("RAG_MICROBATCH_WINDOW_MS", "3"))  # 0 disables
+    MICROBATCH_MAX_SIZE = int(os.getenv("RAG_MICROBATCH_MAX_SIZE", "32"))
+    
+    # Identical questions asked concurrently share one pipeline run
+    SINGLE_FLIGHT_ENABLED = os.getenv("RAG_SINGLE_FLIGHT", "1") == "1"
 
+# ==================== SECTION 2: INITIALIZE CHROMADB ====================
 def init_chromadb():
     """Initialize ChromaDB connection"""
+    import chromadb
     print("📂 Loading ChromaDB vector database...")
     
     try:
@@ -39,39 +125,349 @@ def init_chromadb():
     
     return collection
 
+def init_mmap_index():
+    """Open the memory-mapped index exported by build_chromadb.py / mmap_index.py"""
+    print("📂 Loading memory-mapped vector index...")
+    if not MmapVectorIndex.exists(MMAP_INDEX_DIR):
+        raise FileNotFoundError(f"No mmap index at {MMAP_INDEX_DIR} (run: python mmap_index.py export)")
+    index = MmapVectorIndex(MMAP_INDEX_DIR)
+    print(f"✅ Loaded mmap index: {index.count()} vectors ({index.manifest['dtype']})")
+    return index
+
+def init_vector_store():
+    """Collection-like vector store selected by RAG_VECTOR_BACKEND"""
+    if RagConfig.VECTOR_BACKEND == "mmap":
+        return init_mmap_index()
+    return init_chromadb()
+
 # ==================== SECTION 3: LOAD EMBEDDING MODEL ====================
 def init_embedding_model():
-    """Initialize the embedding model"""
+    """Initialize the embedding model (PyTorch or ONNX, see RAG_ENCODER_BACKEND)"""
     print("\n🤖 Loading embedding model...")
+    if RagConfig.ENCODER_BACKEND == "onnx":
+        if not OnnxEncoder.exists(ONNX_ENCODER_DIR):
+            raise FileNotFoundError(f"No ONNX encoder at {ONNX_ENCODER_DIR} (run: python onnx_encoder.py export)")
+        model = OnnxEncoder(ONNX_ENCODER_DIR, threads=RagConfig.ENCODER_THREADS or None)
+        print(f"✅ Model loaded: {model.config['model']} (ONNX int8)")
+        return model
+    from sentence_transformers import SentenceTransformer
+    if RagConfig.ENCODER_THREADS:
+        import torch
+        torch.set_num_threads(RagConfig.ENCODER_THREADS)
     model = SentenceTransformer('all-MiniLM-L6-v2')
     print("✅ Model loaded: all-MiniLM-L6-v2")
     return model
 
+def init_lexical_index():
+    """Load the BM25 index built by build_chromadb.py (None if missing or disabled)"""
+    if not RagConfig.HYBRID_ENABLED:
+        return None
+    if not os.path.exists(LEXICAL_INDEX_PATH):
+        print("⚠️ No BM25 index found, using vector search only (run build_chromadb.py)")
+        return None
+    index = BM25Index.load(LEXICAL_INDEX_PATH)
+    print(f"✅ BM25 index loaded: {index.n_docs} chunks, {len(index.vocab)} terms")
+    return index
+
+def index_fingerprint():
+    """(mtime, size) of the index marker, None if there is no build yet"""
+    try:
+        st = os.stat(RagConfig.INDEX_MARKER)
+        return (st.st_mtime_ns, st.st_size)
+    except OSError:
+        return None
+
+# ==================== SECTION 3b: RETRIEVAL RUNTIME ====================
+class RetrievalRuntime:
+    """
+    Keeps the ChromaDB collection and embedding model loaded for the whole
+    life of the process. Built once (API startup or first use), warmed with
+    a dummy encode + query, then shared by every request.
+
+    Under gunicorn, preload() runs in the master before workers are forked
+    so the fork-safe parts are shared copy-on-write (see gunicorn_conf.py);
+    each worker's start() then only loads what is left and warms up.
+
+    After build_chromadb.py rebuilds the indexes, reload_indexes() swaps in
+    a fresh mmap index and BM25 index (requests already running keep the
+    objects they started with; the old mmap index is closed after
+    INDEX_RETIRE_DELAY), so the API doesn't need a restart. Hot reload needs
+    RAG_VECTOR_BACKEND=mmap: chromadb keeps one client per path, with the
+    HNSW segment it already loaded, so a "new" collection would still serve
+    the old vectors. With the chroma backend a rebuild is reported as
+    index_stale until the process restarts.
+    """
+    def __init__(self):
+        self.collection = None
+        self.model = None
+        self.lexical_index = None
+        self.preloaded = []
+        self.ready = False
+        self.error = None
+        self.document_count = 0
+        self.started_at = None
+        self.warmup_seconds = None
+        self.index_fingerprint = None
+        self.index_reloads = 0
+        self.index_stale = False
+        self._index_checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Load collection + model and warm them up (safe to call repeatedly)"""
+        with self._lock:
+            if self.ready:
+                return self
+            try:
+                print("="*60)
+                print("INITIALIZING RAG QUERY SYSTEM")
+                print("="*60)
+                t0 = time.perf_counter()
+                if self.index_fingerprint is None:
+                    self.index_fingerprint = index_fingerprint()
+                if self.collection is None:
+                    self.collection = init_vector_store()
+                if self.model is None:
+                    self.model = init_embedding_model()
+                if "lexical_index" not in self.preloaded:
+                    self.lexical_index = init_lexical_index()
+                if embedding_cache is not None and embedding_cache.load():
+                    print(f"✅ Query embedding cache restored: {embedding_cache.loaded} questions")
+                self.document_count = self.collection.count()
+                self.warm()
+                self.warmup_seconds = time.perf_counter() - t0
+                self.started_at = time.time()
+                self.ready = True
+                self.error = None
+                print(f"✅ Retrieval runtime ready in {self.warmup_seconds:.2f}s")
+            except Exception as e:
+                self.error = str(e)
+                print(f"❌ Retrieval runtime failed to start: {e}")
+                raise
+        return self
+
+    def preload(self):
+        """
+        Load the parts that are safe to share across fork(), without running
+        them: the PyTorch model (inference before fork can leave the child's
+        OpenMP pool hung), the mmap index and the BM25 index. Chroma's sqlite
+        client and onnxruntime sessions own threads/handles that don't
+        survive fork, so workers open those themselves in start().
+        """
+        with self._lock:
+            print("📦 Preloading retrieval components before fork...")
+            self.index_fingerprint = index_fingerprint()
+            if RagConfig.VECTOR_BACKEND == "mmap":
+                self.collection = init_vector_store()
+                self.preloaded.append("vector_store")
+            if RagConfig.ENCODER_BACKEND == "torch":
+                self.model = init_embedding_model()
+                self.preloaded.append("model")
+            self.lexical_index = init_lexical_index()
+            self.preloaded.append("lexical_index")
+            # Move everything loaded so far out of the collector's reach, so GC passes
+            # in the workers don't write to (and un-share) these pages
+            gc.freeze()
+        return self
+
+    def index_changed(self):
+        """True if the index marker changed since the indexes were loaded (a stat every INDEX_CHECK_INTERVAL)"""
+        now = time.monotonic()
+        if not self.ready or now - self._index_checked_at < RagConfig.INDEX_CHECK_INTERVAL:
+            return False
+        self._index_checked_at = now
+        return index_fingerprint() != self.index_fingerprint
+
+    def reload_indexes(self):
+        """Load the rebuilt mmap index + BM25 index and swap them in (mmap backend only)"""
+        with self._lock:
+            # Read before loading: a build finishing mid-reload is caught by the next check
+            fingerprint = index_fingerprint()
+            if fingerprint == self.index_fingerprint:
+                return self
+            if RagConfig.VECTOR_BACKEND != "mmap":
+                # BM25 alone would no longer match the vectors, so keep both as they are
+                print("⚠️ Index rebuilt: restart the API to serve it (hot reload needs RAG_VECTOR_BACKEND=mmap)")
+                self.index_fingerprint = fingerprint
+                self.index_stale = True
+                return self
+            print("🔄 Index rebuilt, reloading mmap index and BM25 index...")
+            try:
+                collection = init_mmap_index()
+                lexical_index = init_lexical_index()
+            except Exception as e:
+                # Keep serving from the indexes already loaded; retried on the next check
+                print(f"❌ Index reload failed, keeping the previous indexes: {e}")
+                return self
+            retired = self.collection
+            self.collection, self.lexical_index = collection, lexical_index
+            self.document_count = collection.count()
+            self.index_fingerprint = fingerprint
+            self.index_reloads += 1
+        # Requests that picked up the old index may still be searching it
+        timer = threading.Timer(RagConfig.INDEX_RETIRE_DELAY, retired.close)
+        timer.daemon = True
+        timer.start()
+        return self
+
+    def refresh(self):
+        """Reload the indexes if a rebuild happened since the last check"""
+        if self.index_changed():
+            self.reload_indexes()
+        return self
+
+    def warm(self):
+        """Dummy encode + query so the first real question doesn't pay for lazy init"""
+        print("🔥 Warming up encoder and collection...")
+        embedding = embed_question("warmup", self.model, use_cache=False)
+        hybrid_search("warmup", embedding, self.collection, top_k=1, lexical_index=self.lexical_index)
+
+    def status(self):
+        """Readiness info for health checks"""
+        return {
+            "ready": self.ready,
+            "backend": RagConfig.VECTOR_BACKEND,
+            "encoder": RagConfig.ENCODER_BACKEND,
+            "preloaded": self.preloaded,
+            "pid": os.getpid(),
+            "documents": self.document_count,
+            "hybrid": self.lexical_index is not None,
+            "warmup_seconds": self.warmup_seconds,
+            "index_reloads": self.index_reloads,
+            "index_stale": self.index_stale,
+            "started_at": self.started_at,
+            "error": self.error,
+        }
+
+# One runtime per process
+runtime = RetrievalRuntime()
+
+def get_runtime():
+    """Return the shared runtime, starting it on first use"""
+    if not runtime.ready:
+        runtime.start()
+    return runtime.refresh()
+
 # ==================== SECTION 4: SEARCH FUNCTION ====================
-def search_chromadb(question, collection, model, top_k=5):
+def search_chromadb(question, collection, model, top_k=5, lexical_index=None):
     """
-    Search ChromaDB for relevant chunks
+    Search ChromaDB for relevant chunks (fused with BM25 when an index is given)
     Returns: chunks, sources, and similarity scores
     """
-    # Convert question to embedding
-    question_embedding = model.encode(question).tolist()
-    
-    # Search ChromaDB
+    question_embedding = embed_question(question, model)
+    return hybrid_search(question, question_embedding, collection, top_k, lexical_index)
+
+def embed_question(question, model, use_cache=True):
+    """Convert question to embedding (CPU-bound unless the question was seen before)"""
+    if use_cache and embedding_cache is not None:
+        cached = embedding_cache.get(question)
+        if cached is not None:
+            return cached
+    embedding = model.encode(question).tolist()
+    if use_cache and embedding_cache is not None:
+        embedding_cache.put(question, embedding)
+    return embedding
+
+def encode_questions(questions, model):
+    """One batched model.encode call; results are added to the embedding cache (no lookup)"""
+    questions = list(questions)
+    embeddings = model.encode(questions, batch_size=64, show_progress_bar=False).tolist()
+    if embedding_cache is not None:
+        for question, embedding in zip(questions, embeddings):
+            embedding_cache.put(question, embedding)
+    return embeddings
+
+def embed_questions(questions, model):
+    """Embeddings for several questions: cache hits plus one batched encode of the rest"""
+    questions = list(questions)
+    if embedding_cache is None:
+        return encode_questions(questions, model)
+    embeddings, missing = embedding_cache.get_many(questions)
+    if missing:
+        encoded = encode_questions([questions[i] for i in missing], model)
+        for i, embedding in zip(missing, encoded):
+            embeddings[i] = embedding
+    return embeddings
+
+def query_collection(question_embedding, collection, top_k=5):
+    """Nearest-neighbour search for an already-encoded question"""
+    return query_collection_batch([question_embedding], collection, top_k)[0]
+
+def query_collection_batch(question_embeddings, collection, top_k=5):
+    """One collection.query for several embeddings; returns [(chunks, sources, scores)]"""
+    if not question_embeddings:
+        return []
     results = collection.query(
-        query_embeddings=[question_embedding],
+        query_embeddings=list(question_embeddings),
         n_results=top_k,
         include=["documents", "metadatas", "distances"]
     )
     
-    # Extract results
-    chunks = results['documents'][0] if results['documents'] else []
-    sources = results['metadatas'][0] if results['metadatas'] else []
-    distances = results['distances'][0] if results['distances'] else []
+    per_question = []
+    for i in range(len(question_embeddings)):
+        # Extract results
+        chunks = results['documents'][i] if results['documents'] else []
+        sources = results['metadatas'][i] if results['metadatas'] else []
+        distances = results['distances'][i] if results['distances'] else []
+        
+        # Convert distances to similarity scores (higher = more similar)
+        similarity_scores = [(1 - dist) for dist in distances] if distances else []
+        per_question.append((chunks, sources, similarity_scores))
     
-    # Convert distances to similarity scores (higher = more similar)
-    similarity_scores = [(1 - dist) for dist in distances] if distances else []
+    return per_question
+
+def hybrid_search(question, question_embedding, collection, top_k=5, lexical_index=None):
+    """
+    Vector + BM25 retrieval fused with reciprocal rank fusion.
+    Catches exact tokens (course codes, fee figures, emails) that dense search misses.
+    Scores are RRF scores; falls back to plain vector search without an index.
+    """
+    return hybrid_search_batch([question], [question_embedding], collection, top_k, lexical_index)[0]
+
+def hybrid_search_batch(questions, question_embeddings, collection, top_k=5, lexical_index=None):
+    """
+    hybrid_search for several questions: one multi-embedding collection.query
+    and one collection.get for all lexical-only hits. Returns [(chunks, sources, scores)].
+    """
+    if lexical_index is None:
+        return query_collection_batch(question_embeddings, collection, top_k)
+    if not questions:
+        return []
+    
+    n_candidates = max(top_k, RagConfig.HYBRID_CANDIDATES)
+    results = collection.query(
+        query_embeddings=list(question_embeddings),
+        n_results=n_candidates,
+        include=["documents", "metadatas"]
+    )
+    found = {}
+    fused_per_question = []
+    for i, question in enumerate(questions):
+        for doc_id, doc, meta in zip(results['ids'][i], results['documents'][i], results['metadatas'][i]):
+            found[doc_id] = (doc, meta)
+        vector_ranking = results['ids'][i]
+        lexical_ranking = [doc_id for doc_id, _ in lexical_index.search(question, n_candidates)]
+        fused_per_question.append(
+            reciprocal_rank_fusion([vector_ranking, lexical_ranking], k=RagConfig.RRF_K)[:top_k]
+        )
+    
+    # Lexical-only hits still need their text + metadata
+    missing = sorted({doc_id for fused in fused_per_question for doc_id, _ in fused if doc_id not in found})
+    if missing:
+        extra = collection.get(ids=missing, include=["documents", "metadatas"])
+        for doc_id, doc, meta in zip(extra['ids'], extra['documents'], extra['metadatas']):
+            found[doc_id] = (doc, meta)
     
-    return chunks, sources, similarity_scores
+    per_question = []
+    for fused in fused_per_question:
+        # Skip ids the collection no longer has (index built from an older collection)
+        fused = [(doc_id, score) for doc_id, score in fused if doc_id in found]
+        chunks = [found[doc_id][0] for doc_id, _ in fused]
+        sources = [found[doc_id][1] for doc_id, _ in fused]
+        scores = [score for _, score in fused]
+        per_question.append((chunks, sources, scores))
+    
+    return per_question
 
 # ==================== SECTION 5: CREATE PROMPT ====================
 def create_rag_prompt(question, relevant_chunks, sources):
@@ -110,58 +506,197 @@ ANSWER:"""
     return prompt, sources
 
 # ==================== SECTION 6: LLM INTEGRATION ====================
-def get_llm_response(prompt, provider="groq"):
+# Providers (and their pooled clients) are built once per process on first use
+_llm_routers = None
+_llm_lock = threading.Lock()
+
+def build_llm_providers():
+    """Configured providers in RAG_LLM_PROVIDERS order (unconfigured ones are skipped)"""
+    common = dict(
+        system_prompt=RagConfig.SYSTEM_PROMPT,
+        temperature=RagConfig.TEMPERATURE,
+        max_tokens=RagConfig.MAX_TOKENS,
+    )
+    
+    def health():
+        return ProviderHealth(
+            failure_threshold=RagConfig.LLM_BREAKER_FAILURES,
+            cooldown=RagConfig.LLM_BREAKER_COOLDOWN,
+        )
+    
+    providers = []
+    for name in RagConfig.LLM_PROVIDERS:
+        if name == "groq" and os.getenv("GROQ_API_KEY"):
+            providers.append(GroqProvider(
+                api_key=os.getenv("GROQ_API_KEY"),
+                model=RagConfig.GROQ_MODEL,
+                max_connections=RagConfig.LLM_MAX_CONNECTIONS,
+                keepalive_connections=RagConfig.LLM_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=RagConfig.LLM_KEEPALIVE_EXPIRY,
+                timeout=RagConfig.LLM_TIMEOUT,
+                scheduler=LLMScheduler(
+                    "groq",
+                    requests_per_min=RagConfig.LLM_REQUESTS_PER_MIN,
+                    tokens_per_min=RagConfig.LLM_TOKENS_PER_MIN,
+                    max_queue=RagConfig.LLM_QUEUE_SIZE,
+                    max_wait=RagConfig.LLM_QUEUE_TIMEOUT,
+                ),
+                health=health(),
+                **common
+            ))
+        elif name == "local":
+            # Several OpenAI-compatible servers: local, local_2, local_3, ...
+            for i, url in enumerate(RagConfig.LOCAL_LLM_URLS):
+                local_name = "local" if i == 0 else f"local_{i + 1}"
+                providers.append(OpenAICompatibleProvider(
+                    base_url=url,
+                    model=RagConfig.LOCAL_LLM_MODEL,
+                    api_key=os.getenv("RAG_LOCAL_LLM_API_KEY"),
+                    timeout=RagConfig.LLM_TIMEOUT,
+                    name=local_name,
+                    scheduler=LLMScheduler(
+                        local_name,
+                        requests_per_min=RagConfig.LOCAL_LLM_REQUESTS_PER_MIN,
+                        max_queue=RagConfig.LLM_QUEUE_SIZE,
+                        max_wait=RagConfig.LLM_QUEUE_TIMEOUT,
+                    ),
+                    health=health(),
+                    **common
+                ))
+    return providers
+
+def get_llm_router(provider="auto"):
     """
-    Get response from LLM (Groq)
+    "auto" routes across every configured provider (health-ordered, hedged,
+    with failover); a provider name pins that one provider. None if unknown.
     """
-    if provider.lower() == "groq":
-        return get_groq_response(prompt)
-    else:
-        return "[LLM NOT CONFIGURED - Install Groq]"
+    global _llm_routers
+    with _llm_lock:
+        if _llm_routers is None:
+            providers = build_llm_providers()
+            _llm_routers = {
+                "auto": LLMRouter(
+                    providers,
+                    hedge=RagConfig.LLM_HEDGE_ENABLED,
+                    hedge_delay=RagConfig.LLM_HEDGE_DELAY,
+                    hedge_quantile=RagConfig.LLM_HEDGE_QUANTILE,
+                ),
+                **{p.name: LLMRouter([p], hedge=False) for p in providers},
+            }
+        return _llm_routers.get(provider.lower())
+
+async def close_llm_clients():
+    """Close pooled LLM connections (called on API shutdown)"""
+    global _llm_routers
+    if _llm_routers is not None:
+        await _llm_routers["auto"].aclose()
+        _llm_routers = None
+
+def _no_llm_answer(provider):
+    if provider.lower() == "auto":
+        return "❌ No LLM provider configured (set GROQ_API_KEY or RAG_LOCAL_LLM_URL in .env)"
+    return f"[LLM NOT CONFIGURED - {provider}]"
 
-def get_groq_response(prompt):
-    """Get response from Groq - UPDATED MODEL"""
+def get_llm_response(prompt, provider="auto"):
+    """
+    Get response from the LLM (blocking, used by the CLI; fails over but doesn't hedge)
+    """
+    router = get_llm_router(provider)
+    if router is None or not router.providers:
+        return _no_llm_answer(provider)
     try:
-        from groq import Groq
-        
-        api_key = os.getenv("GROQ_API_KEY")
-        if not api_key:
-            return "❌ GROQ_API_KEY not found in .env file"
-        
-        client = Groq(api_key=api_key)
-        
-        response = client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
-            messages=[
-                {"role": "system", "content": "You are a helpful university assistant. Provide answers without citations or source references."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.3,
-            max_tokens=1000
-        )
-        
-        return response.choices[0].message.content
-        
-    except ImportError:
-        return "❌ Install Groq: pip install groq"
-    except Exception as e:
-        return f"❌ Groq Error: {str(e)}"
+        return router.complete_sync(prompt)
+    except LLMUnavailableError as e:
+        return f"❌ {e}"
+
+async def get_llm_response_async(prompt, provider="auto"):
+    """
+    Async version of get_llm_response (does not block the event loop).
+    Hedged across providers; raises LLMUnavailableError when none can answer,
+    so the API can respond 429/503 with Retry-After.
+    """
+    router = get_llm_router(provider)
+    if router is None or not router.providers:
+        return _no_llm_answer(provider)
+    return await router.complete(prompt)
+
+async def stream_llm_response_async(prompt, provider="auto"):
+    """
+    Yield LLM output pieces as they are generated (time to first token is hedged)
+    """
+    router = get_llm_router(provider)
+    if router is None or not router.providers:
+        yield _no_llm_answer(provider)
+        return
+    async for delta in router.stream(prompt):
+        yield delta
+
+# ==================== SECTION 6b: ANSWER CACHE ====================
+answer_cache = SemanticAnswerCache(
+    threshold=RagConfig.ANSWER_CACHE_THRESHOLD,
+    max_entries=RagConfig.ANSWER_CACHE_MAX_ENTRIES,
+    ttl_seconds=RagConfig.ANSWER_CACHE_TTL,
+    index_marker=RagConfig.INDEX_MARKER,
+) if RagConfig.ANSWER_CACHE_ENABLED else None
+
+embedding_cache = QueryEmbeddingCache(
+    max_entries=RagConfig.EMBED_CACHE_MAX_ENTRIES,
+    path=RagConfig.EMBED_CACHE_PATH or None,
+    model=f"{RagConfig.ENCODER_BACKEND}:all-MiniLM-L6-v2",
+) if RagConfig.EMBED_CACHE_ENABLED else None
+
+def save_embedding_cache():
+    """Persist the query embedding cache (called on API shutdown)"""
+    if embedding_cache is not None:
+        try:
+            saved = embedding_cache.save()
+        except Exception as e:
+            # Losing the warm cache must not break shutdown
+            print(f"⚠️ Could not save query embedding cache: {e}")
+            return
+        if saved:
+            print(f"💾 Query embedding cache saved: {saved} questions")
+
+def _is_cacheable(answer):
+    """Never cache error strings or empty answers"""
+    return bool(answer) and not answer.startswith(("❌", "[LLM NOT CONFIGURED"))
+
+def _retrieval_method(rt):
+    return "hybrid" if rt.lexical_index is not None else "vector"
+
+def cache_lookup(embedding):
+    return answer_cache.get(embedding) if answer_cache else None
+
+def cache_store(embedding, answer):
+    if answer_cache and _is_cacheable(answer):
+        answer_cache.put(embedding, answer)
 
 # ==================== SECTION 7: MAIN RAG FUNCTION ====================
-def ask_university_rag(question, provider="groq"):
+def ask_university_rag(question, provider="auto", rt=None):
     """
     Main RAG pipeline: Question → Search → LLM → Answer
+    Uses the shared warm runtime instead of reloading Chroma + model per call
     """
     print(f"\n🔍 QUESTION: {question}")
     print("-"*60)
     
-    # Initialize components
-    collection = init_chromadb()
-    model = init_embedding_model()
+    # Shared components (loaded once per process)
+    rt = rt or get_runtime()
+    
+    # Step 0: Serve from the semantic cache if a similar question was answered
+    with span("embed"):
+        embedding = embed_question(question, rt.model)
+    with span("cache"):
+        cached = cache_lookup(embedding)
+    if cached is not None:
+        print("⚡ Answer served from semantic cache")
+        return cached
     
     # Step 1: Search for relevant chunks
     print(f"\n📚 Searching database for relevant information...")
-    chunks, sources, scores = search_chromadb(question, collection, model, top_k=3)
+    with span("retrieve"):
+        chunks, sources, scores = hybrid_search(question, embedding, rt.collection, RagConfig.TOP_K, rt.lexical_index)
+    observe_retrieval(scores, _retrieval_method(rt))
     
     if not chunks:
         return "❌ No relevant information found in database."
@@ -170,37 +705,449 @@ def ask_university_rag(question, provider="groq"):
     print(f"✅ Found {len(chunks)} relevant chunks (not shown to user)")
     
     # Step 2: Create prompt
-    prompt, source_list = create_rag_prompt(question, chunks, sources)
+    with span("prompt"):
+        prompt, source_list = create_rag_prompt(question, chunks, sources)
     
     # Step 3: Get LLM response
     print(f"\n💭 Generating answer using {provider.upper()}...")
-    answer = get_llm_response(prompt, provider)
+    with span("llm", provider=provider):
+        answer = get_llm_response(prompt, provider)
     
     # Step 4: Clean the answer (remove any remaining citations)
     print(f"\n📝 FINALIZING CLEAN ANSWER...")
     
-    # Remove any citation patterns that might have slipped through
-    import re
+    # Return clean answer without sources
+    with span("postprocess"):
+        answer = clean_answer(answer)
+    cache_store(embedding, answer)
+    return answer
+
+# Citation patterns that might slip through the prompt instructions
+CITATION_REGEX = re.compile(r'\[\d+\]')
+SOURCES_SECTION_REGEX = re.compile(r'(?i)(sources?:.*?)(?=\n\n|\Z)', flags=re.DOTALL)
+TRAILING_SOURCES_REGEX = re.compile(r'(?i)\n\n(?:📎\s*)?(?:source|references?):.*', flags=re.DOTALL)
+
+def clean_answer(answer):
+    """Remove any citation patterns that might have slipped through"""
     # Remove [1], [2], etc.
-    answer = re.sub(r'\[\d+\]', '', answer)
+    answer = CITATION_REGEX.sub('', answer)
     # Remove "Source:" or "Sources:" sections
-    answer = re.sub(r'(?i)(sources?:.*?)(?=\n\n|\Z)', '', answer, flags=re.DOTALL)
+    answer = SOURCES_SECTION_REGEX.sub('', answer)
     # Remove any trailing source lists
-    answer = re.sub(r'(?i)\n\n(?:📎\s*)?(?:source|references?):.*', '', answer, flags=re.DOTALL)
+    answer = TRAILING_SOURCES_REGEX.sub('', answer)
+    return answer
+
+class StreamingAnswerCleaner:
+    """
+    Incremental version of clean_answer for streamed tokens.
+    Emits text as soon as it can no longer become part of a citation,
+    holding back only a short tail that might still turn into "[12]",
+    "Sources:" or a trailing "References:" block.
+    """
+    SOURCES_START = re.compile(r'(?i)sources?:')
+    TRAILING_START = re.compile(r'(?i)\n\n(?:📎\s*)?references?:')
+    PARTIAL_TRAILING = re.compile(r'\n(?:\n(?:📎\s*)?([a-z:]*))?')
+    MAX_HOLDBACK = 24
+
+    def __init__(self):
+        self._buf = ""
+        self._skipping = False   # inside a "Sources: ..." paragraph
+        self._done = False       # hit a trailing reference list, drop the rest
+
+    def feed(self, delta):
+        """Add streamed text, return the part that is safe to send now"""
+        if self._done:
+            return ""
+        self._buf += delta
+        return self._drain(final=False)
+
+    def finish(self):
+        """Flush whatever is still held back at the end of the stream"""
+        if self._done:
+            return ""
+        return self._drain(final=True)
+
+    def _drain(self, final):
+        out = []
+        while not self._done:
+            if self._skipping:
+                idx = self._buf.find("\n\n")
+                if idx == -1:
+                    # Keep a lone trailing newline, the paragraph break may be split across tokens
+                    self._buf = "\n" if self._buf.endswith("\n") and not final else ""
+                    break
+                self._skipping = False
+                self._buf = self._buf[idx:]
+                continue
+            
+            sources = self.SOURCES_START.search(self._buf)
+            trailing = self.TRAILING_START.search(self._buf)
+            if trailing and (not sources or trailing.start() < sources.start()):
+                out.append(self._buf[:trailing.start()])
+                self._buf = ""
+                self._done = True
+                break
+            if sources:
+                out.append(self._buf[:sources.start()])
+                self._buf = self._buf[sources.end():]
+                self._skipping = True
+                continue
+            
+            cut = len(self._buf) if final else self._safe_cut()
+            out.append(self._buf[:cut])
+            self._buf = self._buf[cut:]
+            break
+        return CITATION_REGEX.sub('', "".join(out))
+
+    def _safe_cut(self):
+        """Index where a possible partial citation/heading starts (or len(buf))"""
+        buf = self._buf
+        for k in range(max(0, len(buf) - self.MAX_HOLDBACK), len(buf)):
+            if self._is_partial_marker(buf[k:]):
+                return k
+        return len(buf)
+
+    def _is_partial_marker(self, tail):
+        low = tail.lower()
+        if re.fullmatch(r'\[\d*', tail):
+            return True
+        if "sources:".startswith(low):
+            return True
+        m = self.PARTIAL_TRAILING.fullmatch(low)
+        return bool(m) and "references:".startswith(m.group(1) or "")
+
+# ==================== SECTION 7b: ASYNC RAG PIPELINE ====================
+# Bounded pool for CPU-bound work (encode + vector search) so the event loop stays free
+_executor = ThreadPoolExecutor(
+    max_workers=RagConfig.EXECUTOR_WORKERS,
+    thread_name_prefix="rag-cpu"
+)
+
+class StageTimeoutError(Exception):
+    """A pipeline stage exceeded its configured timeout"""
+    def __init__(self, stage, timeout):
+        super().__init__(f"{stage} stage timed out after {timeout}s")
+        self.stage = stage
+        self.timeout = timeout
+
+async def _run_stage(stage, timeout, func, *args):
+    """Run a blocking function on the executor with a per-stage timeout"""
+    loop = asyncio.get_running_loop()
+    try:
+        return await asyncio.wait_for(loop.run_in_executor(_executor, func, *args), timeout)
+    except asyncio.TimeoutError:
+        raise StageTimeoutError(stage, timeout)
+
+async def _ensure_runtime_async(rt=None):
+    """Shared runtime, started on the executor if startup hasn't loaded it yet"""
+    rt = rt or runtime
+    if not rt.ready:
+        await asyncio.get_running_loop().run_in_executor(_executor, rt.start)
+    elif rt.index_changed():
+        await asyncio.get_running_loop().run_in_executor(_executor, rt.reload_indexes)
+    return rt
+
+class MicroBatcher:
+    """
+    Coalesces calls that arrive within `window` seconds of each other into one
+    batched call on the executor. batch_func takes a list of items and returns
+    a list of results in the same order.
+    """
+    def __init__(self, stage, batch_func, window, max_size):
+        self.stage = stage
+        self.batch_func = batch_func
+        self.window = window
+        self.max_size = max_size
+        self._pending = []
+        self._timer = None
     
-    # Return clean answer without sources
+    async def submit(self, item):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+    
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            asyncio.ensure_future(self._run(batch))
+    
+    async def _run(self, batch):
+        observe_batch(self.stage, len(batch))
+        loop = asyncio.get_running_loop()
+        try:
+            results = await loop.run_in_executor(_executor, self.batch_func, [item for item, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():  # caller may have timed out and cancelled
+                future.set_result(result)
+
+# One pair of batchers per runtime, created on first use
+_microbatchers = {}
+
+def _get_microbatchers(rt):
+    if rt not in _microbatchers:
+        window = RagConfig.MICROBATCH_WINDOW_MS / 1000
+        _microbatchers[rt] = (
+            MicroBatcher("embed", lambda questions: encode_questions(questions, rt.model),
+                         window, RagConfig.MICROBATCH_MAX_SIZE),
+            MicroBatcher("retrieve", lambda items: hybrid_search_batch(
+                [q for q, _ in items], [e for _, e in items],
+                rt.collection, RagConfig.TOP_K, rt.lexical_index),
+                window, RagConfig.MICROBATCH_MAX_SIZE),
+        )
+    return _microbatchers[rt]
+
+async def _embed_async(question, rt):
+    # Known questions skip the executor and the micro-batch window entirely
+    if embedding_cache is not None:
+        cached = embedding_cache.get(question)
+        if cached is not None:
+            return cached
+    if RagConfig.MICROBATCH_WINDOW_MS <= 0:
+        embeddings = await _run_stage("embed", RagConfig.EMBED_TIMEOUT, encode_questions, [question], rt.model)
+        return embeddings[0]
+    embed_batcher, _ = _get_microbatchers(rt)
+    try:
+        return await asyncio.wait_for(embed_batcher.submit(question), RagConfig.EMBED_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise StageTimeoutError("embed", RagConfig.EMBED_TIMEOUT)
+
+async def _search_async(question, embedding, rt):
+    if RagConfig.MICROBATCH_WINDOW_MS <= 0:
+        return await _run_stage(
+            "retrieve", RagConfig.RETRIEVE_TIMEOUT, hybrid_search,
+            question, embedding, rt.collection, RagConfig.TOP_K, rt.lexical_index
+        )
+    _, search_batcher = _get_microbatchers(rt)
+    try:
+        return await asyncio.wait_for(search_batcher.submit((question, embedding)), RagConfig.RETRIEVE_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise StageTimeoutError("retrieve", RagConfig.RETRIEVE_TIMEOUT)
+
+class SingleFlight:
+    """
+    Concurrent calls with the same key share one execution. The first caller
+    (leader) starts it as a task; callers arriving while it runs (followers)
+    await the same task. The task is shielded, so one caller disconnecting or
+    timing out doesn't cancel the answer for the others.
+    """
+    def __init__(self):
+        self._inflight = {}
+        self.leaders = 0
+        self.followers = 0
+    
+    async def do(self, key, factory):
+        task = self._inflight.get(key)
+        if task is None:
+            self.leaders += 1
+            observe_coalesced("leader")
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.followers += 1
+            observe_coalesced("follower")
+            trace = current_trace.get()
+            if trace is not None:
+                trace.attrs["coalesced"] = True
+        return await asyncio.shield(task)
+    
+    def stats(self):
+        total = self.leaders + self.followers
+        return {
+            "in_flight": len(self._inflight),
+            "leaders": self.leaders,
+            "followers": self.followers,
+            "coalesced_ratio": round(self.followers / total, 4) if total else 0.0,
+        }
+
+single_flight = SingleFlight()
+
+async def ask_university_rag_async(question, provider="auto", rt=None):
+    """
+    Non-blocking RAG pipeline for the API:
+    encode + search run on the bounded executor, LLM call uses the pooled async client.
+    Concurrent identical questions are coalesced into one pipeline run.
+    """
+    if not RagConfig.SINGLE_FLIGHT_ENABLED:
+        return await _answer_question_async(question, provider, rt)
+    # Same normalization as the embedding cache key: coalesced == same embedding
+    key = (provider.lower(), normalize_query(question))
+    return await single_flight.do(key, lambda: _answer_question_async(question, provider, rt))
+
+async def _answer_question_async(question, provider="auto", rt=None):
+    rt = await _ensure_runtime_async(rt)
+    
+    # Step 0: Encode (CPU-bound, off the event loop) and check the semantic cache
+    with span("embed"):
+        embedding = await _embed_async(question, rt)
+    with span("cache"):
+        cached = cache_lookup(embedding)
+    if cached is not None:
+        return cached
+    
+    # Step 1: Vector (+ BM25) search
+    with span("retrieve"):
+        chunks, sources, scores = await _search_async(question, embedding, rt)
+    observe_retrieval(scores, _retrieval_method(rt))
+    
+    if not chunks:
+        return "❌ No relevant information found in database."
+    
+    # Step 2: Create prompt
+    with span("prompt"):
+        prompt, source_list = create_rag_prompt(question, chunks, sources)
+    
+    # Step 3: Get LLM response
+    try:
+        with span("llm", provider=provider):
+            answer = await asyncio.wait_for(get_llm_response_async(prompt, provider), RagConfig.LLM_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise StageTimeoutError("llm", RagConfig.LLM_TIMEOUT)
+    
+    # Step 4: Clean the answer
+    with span("postprocess"):
+        answer = clean_answer(answer)
+    cache_store(embedding, answer)
     return answer
 
+async def ask_university_rag_batch(questions, provider="auto", rt=None):
+    """
+    Answer several questions at once: one batched encode, one multi-embedding
+    collection query, then LLM calls with bounded concurrency.
+    Returns answers in the same order as the questions; a question whose LLM
+    call failed comes back as the exception (StageTimeoutError or
+    LLMUnavailableError) so one failure doesn't sink the whole batch.
+    """
+    rt = await _ensure_runtime_async(rt)
+    questions = list(questions)
+    if not questions:
+        return []
+    observe_batch("ask_batch", len(questions))
+    
+    # Step 0: Encode everything in one call and serve what the semantic cache already knows
+    with span("embed", batch=len(questions)):
+        embeddings = await _run_stage("embed", RagConfig.EMBED_TIMEOUT, embed_questions, questions, rt.model)
+    answers = [None] * len(questions)
+    with span("cache", batch=len(questions)):
+        for i, embedding in enumerate(embeddings):
+            answers[i] = cache_lookup(embedding)
+    pending = [i for i, answer in enumerate(answers) if answer is None]
+    if not pending:
+        return answers
+    
+    # Step 1: One retrieval call for all cache misses
+    with span("retrieve", batch=len(pending)):
+        retrieved = await _run_stage(
+            "retrieve", RagConfig.RETRIEVE_TIMEOUT, hybrid_search_batch,
+            [questions[i] for i in pending], [embeddings[i] for i in pending],
+            rt.collection, RagConfig.TOP_K, rt.lexical_index
+        )
+    
+    # Steps 2-4 per question; at most BATCH_LLM_CONCURRENCY LLM calls in flight
+    llm_slots = asyncio.Semaphore(RagConfig.BATCH_LLM_CONCURRENCY)
+    
+    async def answer_one(i, chunks, sources, scores):
+        observe_retrieval(scores, _retrieval_method(rt))
+        if not chunks:
+            return "❌ No relevant information found in database."
+        prompt, source_list = create_rag_prompt(questions[i], chunks, sources)
+        async with llm_slots:
+            try:
+                with span("llm", provider=provider):
+                    answer = await asyncio.wait_for(get_llm_response_async(prompt, provider), RagConfig.LLM_TIMEOUT)
+            except asyncio.TimeoutError:
+                return StageTimeoutError("llm", RagConfig.LLM_TIMEOUT)
+            except LLMUnavailableError as e:
+                return e
+        answer = clean_answer(answer)
+        cache_store(embeddings[i], answer)
+        return answer
+    
+    results = await asyncio.gather(*(
+        answer_one(i, *result) for i, result in zip(pending, retrieved)
+    ))
+    for i, answer in zip(pending, results):
+        answers[i] = answer
+    return answers
+
+async def ask_university_rag_stream(question, provider="auto", rt=None):
+    """
+    Streaming RAG pipeline: yields cleaned answer text as the LLM generates it.
+    Citation stripping is applied incrementally so nothing waits for the full completion.
+    """
+    rt = await _ensure_runtime_async(rt)
+    with span("embed"):
+        embedding = await _embed_async(question, rt)
+    with span("cache"):
+        cached = cache_lookup(embedding)
+    if cached is not None:
+        yield cached
+        return
+    
+    with span("retrieve"):
+        chunks, sources, scores = await _search_async(question, embedding, rt)
+    observe_retrieval(scores, _retrieval_method(rt))
+    
+    if not chunks:
+        yield "❌ No relevant information found in database."
+        return
+    
+    with span("prompt"):
+        prompt, source_list = create_rag_prompt(question, chunks, sources)
+    
+    cleaner = StreamingAnswerCleaner()
+    streamed = []
+    llm_start = time.perf_counter()
+    first_token = True
+    tokens = stream_llm_response_async(prompt, provider).__aiter__()
+    while True:
+        try:
+            # LLM_TIMEOUT bounds the wait for each token, not the whole answer
+            delta = await asyncio.wait_for(tokens.__anext__(), RagConfig.LLM_TIMEOUT)
+        except StopAsyncIteration:
+            break
+        except asyncio.TimeoutError:
+            raise StageTimeoutError("llm", RagConfig.LLM_TIMEOUT)
+        if first_token:
+            first_token = False
+            record_stage("llm_first_token", llm_start)
+        text = cleaner.feed(delta)
+        if text:
+            streamed.append(text)
+            yield text
+    record_stage("llm", llm_start)
+    
+    tail = cleaner.finish()
+    if tail:
+        streamed.append(tail)
+        yield tail
+    cache_store(embedding, "".join(streamed))
+
 # ==================== SECTION 8: BATCH TESTING ====================
-def test_sample_questions():
+SAMPLE_QUESTIONS = [
+    "What is the fee structure for BS Computer Science?",
+    "How can I contact the admissions office?",
+    "What scholarships are available?",
+    "Tell me about the Computer Science faculty",
+    "What are the admission requirements?"
+]
+
+def test_sample_questions(pause=True):
     """Test the RAG system with sample student questions"""
-    test_questions = [
-        "What is the fee structure for BS Computer Science?",
-        "How can I contact the admissions office?",
-        "What scholarships are available?",
-        "Tell me about the Computer Science faculty",
-        "What are the admission requirements?"
-    ]
+    test_questions = SAMPLE_QUESTIONS
     
     print("="*60)
     print("🧪 RUNNING SAMPLE TESTS")
@@ -208,10 +1155,10 @@ def test_sample_questions():
     
     for i, question in enumerate(test_questions, 1):
         print(f"\n🧪 TEST {i}: {question}")
-        answer = ask_university_rag(question, provider="groq")
+        answer = ask_university_rag(question, provider="auto")
         print(f"\n📢 ANSWER:\n{answer}")
         print("="*60)
-        if i < len(test_questions):
+        if pause and i < len(test_questions):
             input("Press Enter for next test...")
 
 # ==================== SECTION 9: INTERACTIVE MODE ====================
@@ -226,8 +1173,7 @@ def interactive_mode():
     
     # Initialize once for the session
     print("\n🔄 Initializing system...")
-    collection = init_chromadb()
-    model = init_embedding_model()
+    get_runtime()
     print("✅ System ready!")
     
     while True:
@@ -246,34 +1192,28 @@ def interactive_mode():
             continue
         
         # Run RAG pipeline
-        answer = ask_university_rag(question, provider="groq")
+        answer = ask_university_rag(question, provider="auto")
         print(f"\n📢 ANSWER:\n{answer}")
 
 # ==================== SECTION 10: MAIN EXECUTION ====================
 if __name__ == "__main__":
     import sys
     
-    # Create .env file template if it doesn't exist
-    if not os.path.exists(".env"):
-        with open(".env", "w") as f:
-            f.write("# API Keys for RAG System\n")
-            f.write("# Get your API key from console.groq.com\n")
-            f.write("GROQ_API_KEY=your_groq_api_key_here\n\n")
-            f.write("# OR use OpenAI (optional)\n")
-            f.write("# OPENAI_API_KEY=your_openai_api_key_here\n")
-        print("📝 Created .env template file. Please add your API keys!")
+    if not os.getenv("GROQ_API_KEY") and not RagConfig.LOCAL_LLM_URLS:
+        print("⚠️ GROQ_API_KEY is not set. Add it to .env (get a key at console.groq.com)")
     
     if len(sys.argv) > 1:
         if sys.argv[1] == "test":
-            test_sample_questions()
+            test_sample_questions(pause="--no-pause" not in sys.argv)
         elif sys.argv[1] == "ask" and len(sys.argv) > 2:
             question = " ".join(sys.argv[2:])
-            answer = ask_university_rag(question, provider="groq")
+            answer = ask_university_rag(question, provider="auto")
             print(f"\n📢 FINAL ANSWER:\n{answer}")
         else:
             print("Usage:")
             print("  python rag_query.py                     # Interactive mode")
             print("  python rag_query.py test                # Run sample tests")
+            print("  python rag_query.py test --no-pause     # Run sample tests without prompts")
             print("  python rag_query.py ask 'your question' # Ask single question")
     else:
         interactive_mode()
\ No newline at end of file
@@ -0,0 +1,199 @@
+"""
+RAW PAGE STORE
+Keeps the HTML of every fetched page on disk so the clean and chunk stages
+can be re-run offline (`uni_web_scrapper.py replay`) after the cleaner or
+chunker changes, without fetching jinnah.edu again.
+
+Pages are content-addressed: the object name is the sha256 of the HTML, so a
+page that didn't change (or the same HTML under two URLs) is stored once and
+a refetch of an unchanged page writes nothing. Objects are compressed with
+zstd when the zstandard package is installed, gzip otherwise; reading
+handles both, so a store written with one codec stays readable.
+
+Layout of data/raw_store/:
+    index.json                  url -> hash, codec, status, headers, fetched_at, sizes
+    objects/ab/abcdef....zst    compressed HTML (utf-8), or .gz
+
+Usage:
+    python raw_store.py info
+    python raw_store.py prune          # delete objects no URL points to
+"""
+
+# ==================== SECTION 1: IMPORTS ====================
+import gzip
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+
+from crawl_state import write_json_atomic
+
+try:
+    import zstandard
+except ImportError:   # optional: gzip is used instead
+    zstandard = None
+
+STORE_DIR = "data/raw_store"
+ZSTD_LEVEL = 3
+GZIP_LEVEL = 6
+SUFFIXES = {"zstd": ".zst", "gzip": ".gz"}
+
+# ==================== SECTION 2: CODECS ====================
+def default_codec():
+    return "zstd" if zstandard is not None else "gzip"
+
+def compress(data, codec):
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+def decompress(data, codec):
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstd-compressed raw page but the zstandard package is not installed")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+def read_object(path):
+    """HTML stored at `path` (codec from the suffix); module-level so pool workers can call it"""
+    codec = "zstd" if path.endswith(SUFFIXES["zstd"]) else "gzip"
+    with open(path, "rb") as f:
+        return decompress(f.read(), codec).decode("utf-8")
+
+# ==================== SECTION 3: STORE ====================
+class RawPageStore:
+    """
+    url -> {"hash", "codec", "status", "headers", "fetched_at", "bytes", "stored_bytes"}
+    plus the compressed objects those entries point to. put() may be called
+    from the crawler's result thread; save() writes the index atomically.
+    """
+    def __init__(self, root=STORE_DIR, codec=None):
+        self.root = root
+        self.codec = codec or default_codec()
+        self.pages = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, root=STORE_DIR, codec=None):
+        store = cls(root, codec)
+        index_path = os.path.join(root, "index.json")
+        if os.path.exists(index_path):
+            with open(index_path, "r", encoding="utf-8") as f:
+                store.pages = json.load(f).get("pages", {})
+        return store
+
+    def save(self):
+        with self._lock:
+            pages = dict(sorted(self.pages.items()))
+        write_json_atomic(os.path.join(self.root, "index.json"),
+                          {"updated_at": time.time(), "pages": pages}, indent=None)
+
+    def __contains__(self, url):
+        return url in self.pages
+
+    def __len__(self):
+        return len(self.pages)
+
+    def urls(self):
+        return sorted(self.pages)
+
+    def object_path(self, digest, codec):
+        return os.path.join(self.root, "objects", digest[:2], digest + SUFFIXES[codec])
+
+    def path_of(self, url):
+        entry = self.pages.get(url)
+        return self.object_path(entry["hash"], entry["codec"]) if entry else None
+
+    def _find_object(self, digest):
+        """(codec, size) of an existing object with this hash, in any codec"""
+        for codec in (self.codec, *[c for c in SUFFIXES if c != self.codec]):
+            path = self.object_path(digest, codec)
+            if os.path.exists(path):
+                return codec, os.path.getsize(path)
+        return None, 0
+
+    def put(self, url, html, headers=None, status=200, fetched_at=None):
+        """Store a fetched page; writes an object only if this exact HTML isn't stored yet"""
+        data = html.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        codec, stored_bytes = self._find_object(digest)
+        if codec is None:
+            codec = self.codec
+            blob = compress(data, codec)
+            path = self.object_path(digest, codec)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(blob)
+            os.replace(tmp_path, path)
+            stored_bytes = len(blob)
+        with self._lock:
+            self.pages[url] = {
+                "hash": digest,
+                "codec": codec,
+                "status": status,
+                "headers": dict(headers or {}),
+                "fetched_at": fetched_at or time.time(),
+                "bytes": len(data),
+                "stored_bytes": stored_bytes,
+            }
+        return digest
+
+    def get(self, url):
+        """Stored HTML for `url`, or None"""
+        path = self.path_of(url)
+        return read_object(path) if path else None
+
+    def iter_pages(self, urls=None):
+        """(url, html) for `urls` (default: every stored URL, sorted), skipping ones not stored"""
+        for url in (self.urls() if urls is None else urls):
+            path = self.path_of(url)
+            if path:
+                yield url, read_object(path)
+
+    def remove(self, url):
+        with self._lock:
+            self.pages.pop(url, None)
+
+    def prune(self):
+        """Delete objects no URL points to; returns how many were removed"""
+        referenced = {self.path_of(url) for url in self.pages}
+        removed = 0
+        objects_dir = os.path.join(self.root, "objects")
+        if not os.path.isdir(objects_dir):
+            return 0
+        for prefix in os.listdir(objects_dir):
+            for name in os.listdir(os.path.join(objects_dir, prefix)):
+                path = os.path.join(objects_dir, prefix, name)
+                if path not in referenced:
+                    os.remove(path)
+                    removed += 1
+        return removed
+
+    def stats(self):
+        objects = {(e["hash"], e["codec"]): e for e in self.pages.values()}
+        raw = sum(e["bytes"] for e in objects.values())
+        stored = sum(e["stored_bytes"] for e in objects.values())
+        return {
+            "pages": len(self.pages),
+            "objects": len(objects),
+            "raw_mb": round(raw / 1024 / 1024, 2),
+            "stored_mb": round(stored / 1024 / 1024, 2),
+            "compression_ratio": round(raw / stored, 2) if stored else None,
+            "codec": self.codec,
+        }
+
+# ==================== SECTION 4: MAIN EXECUTION ====================
+if __name__ == "__main__":
+    argv = sys.argv[1:]
+    command = argv[0] if argv else "info"
+    store = RawPageStore.load()
+
+    if command == "info":
+        print(json.dumps(store.stats(), indent=2))
+    elif command == "prune":
+        print(f"🧹 Removed {store.prune()} unreferenced objects")
+    else:
+        print("Usage: python raw_store.py info | prune")
@@ -1,23 +1,23 @@
-import json
 import random
 from sentence_transformers import SentenceTransformer
+from jsonl_store import JsonlReader, iter_jsonl
 
 print("="*60)
 print("STEP 1: TESTING EMBEDDINGS WITH QUALITY CHECKS")
 print("="*60)
 
-print("\n📦 Loading your data...")
-with open("data/chunks.json", "r", encoding="utf-8") as f:
-    chunks = json.load(f)
+print("\n📦 Opening your data...")
+# Random access through the offset index; the size check streams the file
+chunks = JsonlReader("data/chunks.jsonl")
 
-print(f"✅ Loaded {len(chunks)} chunks")
+print(f"✅ Found {len(chunks)} chunks")
 
 # ==================== QUALITY CHECK 1: RANDOM SAMPLES ====================
 print("\n🔍 QUALITY CHECK 1: Testing RANDOM chunks (not just first one)")
 print("-"*60)
 
 for i in range(3):  # Test 3 random chunks
-    random_chunk = random.choice(chunks)
+    random_chunk = chunks[random.randrange(len(chunks))]
     print(f"\nRandom Chunk {i+1}:")
     print(f"  Length: {len(random_chunk['text'])} chars")
     print(f"  Source: {random_chunk['source']}")
@@ -35,7 +35,9 @@ size_ranges = {
     "Too Large (>2000 chars)": 0
 }
 
-for chunk in chunks:
+over_token_limit = 0
+for chunk in iter_jsonl("data/chunks.jsonl"):
+    over_token_limit += chunk.get('tokens', 0) > 256  # all-MiniLM-L6-v2 truncates after 256 tokens
     length = len(chunk['text'])
     if length < 100:
         size_ranges["Too Small (<100 chars)"] += 1
@@ -51,6 +53,7 @@ for chunk in chunks:
 for category, count in size_ranges.items():
     percentage = (count / len(chunks)) * 100
     print(f"  {category}: {count} chunks ({percentage:.1f}%)")
+print(f"  Over the 256-token model limit: {over_token_limit} chunks")
 
 # ==================== EMBEDDING TEST ====================
 print("\n🤖 TEST: Creating Embeddings")
@@ -60,11 +63,11 @@ model = SentenceTransformer('all-MiniLM-L6-v2')
 print("✅ Embedding model loaded: all-MiniLM-L6-v2")
 
 # Test on 3 random chunks
-test_chunks = random.sample(chunks, 3)
+test_chunks = [chunks[i] for i in random.sample(range(len(chunks)), 3)]
 
 for i, chunk in enumerate(test_chunks):
     print(f"\nTest {i+1}:")
-    print(f"  Text length: {len(chunk['text'])} chars")
+    print(f"  Text length: {len(chunk['text'])} chars, {chunk.get('tokens', '?')} tokens")
     
     # Size warning
     if len(chunk['text']) > 2000:
@@ -0,0 +1,140 @@
+"""Crawler against the local fixture site: revalidation, retries/backoff, sitemap discovery"""
+import os
+import shutil
+import time
+from email.utils import formatdate
+
+import pytest
+
+import crawler as crawler_module
+from crawl_state import CrawlState
+from crawler import Crawler
+from fixture_site import start_fixture_site
+
+FIXTURES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "fixtures", "site")
+PAGES = sorted(name for name in os.listdir(FIXTURES) if name.endswith(".html"))
+
+@pytest.fixture
+def site_root(tmp_path):
+    root = tmp_path / "site"
+    shutil.copytree(FIXTURES, root)
+    return str(root)
+
+@pytest.fixture
+def site(site_root):
+    server, base_url = start_fixture_site(site_root)
+    yield base_url
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Backoff delays the crawler asked for, without actually waiting"""
+    delays = []
+    monkeypatch.setattr(crawler_module.time, "sleep", delays.append)
+    return delays
+
+# ==================== 304 REVALIDATION ====================
+def test_unchanged_pages_revalidate_with_304(site):
+    urls = [f"{site}/{name}" for name in PAGES]
+    state = CrawlState(path=os.devnull)
+    with Crawler(workers=4) as crawler:
+        for res in crawler.fetch_many(urls):
+            assert res["status"] == 200 and res["headers"].get("ETag")
+            state.record(res["url"], None, res["headers"], res["text"])
+
+        results = list(crawler.fetch_many(urls, headers_for=state.conditional_headers))
+
+    assert sorted(res["url"] for res in results) == urls
+    assert all(res["status"] == 304 and not res["text"] for res in results)
+
+def test_changed_page_is_refetched(site, site_root):
+    url = f"{site}/{PAGES[0]}"
+    state = CrawlState(path=os.devnull)
+    with Crawler() as crawler:
+        first = crawler.fetch(url)
+        state.record(url, None, first["headers"], first["text"])
+        with open(os.path.join(site_root, PAGES[0]), "a", encoding="utf-8") as f:
+            f.write("<p>Updated fee schedule.</p>")
+        second = crawler.fetch(url, state.conditional_headers(url))
+
+    assert second["status"] == 200
+    assert "Updated fee schedule." in second["text"]
+    assert second["headers"]["ETag"] != first["headers"]["ETag"]
+
+# ==================== RETRY-AFTER / BACKOFF ====================
+def flaky_site(site_root, **behaviour):
+    server, base_url = start_fixture_site(site_root, **behaviour)
+    return server, f"{base_url}/{PAGES[0]}"
+
+def test_retries_until_the_page_is_served(site_root, sleeps):
+    server, url = flaky_site(site_root, fail_first=2)
+    try:
+        with Crawler(retries=3, backoff=0.5, max_backoff=30) as crawler:
+            res = crawler.fetch(url)
+    finally:
+        server.shutdown()
+
+    assert res["status"] == 200 and res["error"] is None
+    assert crawler.stats["retries"] == 2 and crawler.stats["failures"] == 0
+    # Exponential backoff with +-50% jitter: 0.5 * 2**attempt * [0.5, 1.5)
+    assert 0.25 <= sleeps[0] < 0.75 and 0.5 <= sleeps[1] < 1.5
+
+def test_retry_after_seconds_is_honoured(site_root, sleeps):
+    server, url = flaky_site(site_root, fail_first=1, retry_after="3")
+    try:
+        with Crawler(retries=2) as crawler:
+            assert crawler.fetch(url)["status"] == 200
+    finally:
+        server.shutdown()
+    assert sleeps == [3.0]
+
+def test_retry_after_is_capped_by_max_backoff(site_root, sleeps):
+    server, url = flaky_site(site_root, fail_first=2, retry_after="86400")
+    try:
+        with Crawler(retries=2, max_backoff=5) as crawler:
+            assert crawler.fetch(url)["status"] == 200
+    finally:
+        server.shutdown()
+    assert sleeps == [5, 5]
+
+def test_retry_after_http_date(site_root, sleeps):
+    server, url = flaky_site(site_root, fail_first=1, retry_after=formatdate(time.time() + 20, usegmt=True))
+    try:
+        with Crawler(retries=1, max_backoff=60) as crawler:
+            assert crawler.fetch(url)["status"] == 200
+    finally:
+        server.shutdown()
+    assert len(sleeps) == 1 and 15 <= sleeps[0] <= 20
+
+def test_gives_up_after_the_last_retry(site_root, sleeps):
+    server, url = flaky_site(site_root, fail_first=10)
+    try:
+        with Crawler(retries=2) as crawler:
+            res = crawler.fetch(url)
+    finally:
+        server.shutdown()
+
+    assert res["status"] == 503 and res["error"] == "HTTP 503"
+    assert len(sleeps) == 2
+    assert crawler.stats["requests"] == 3
+    assert crawler.stats["retries"] == 2 and crawler.stats["failures"] == 1
+
+# ==================== SITEMAP DISCOVERY ====================
+def test_sitemap_entries_come_from_every_sub_sitemap(site, monkeypatch):
+    import uni_web_scrapper
+    monkeypatch.setattr(uni_web_scrapper.Config, "SITEMAP_INDEX", f"{site}/sitemap_index.xml")
+    monkeypatch.setattr(uni_web_scrapper.Config, "ALLOWED_DOMAIN", "127.0.0.1")
+
+    entries = uni_web_scrapper.get_sitemap_entries()
+
+    assert sorted(entries) == [f"{site}/{name}" for name in PAGES]
+    assert all(lastmod and lastmod.endswith("+00:00") for lastmod in entries.values())
+    assert uni_web_scrapper.get_all_urls() == sorted(entries)
+
+def test_sitemap_filter_drops_other_hosts(site, monkeypatch):
+    import uni_web_scrapper
+    monkeypatch.setattr(uni_web_scrapper.Config, "SITEMAP_INDEX", f"{site}/sitemap_index.xml")
+    monkeypatch.setattr(uni_web_scrapper.Config, "ALLOWED_DOMAIN", "jinnah.edu")
+
+    assert uni_web_scrapper.get_sitemap_entries() == {}
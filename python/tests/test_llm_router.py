@@ -0,0 +1,207 @@
+"""LLMRouter against local stub LLM servers: failover, hedging, circuit breaker, token accounting"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from llm_providers import LLMRouter, OpenAICompatibleProvider, ProviderHealth
+from llm_scheduler import LLMOverloadedError, LLMProviderError, LLMScheduler
+from llm_stub_server import StubLLMHandler, start_llm_stub
+
+REPLY = StubLLMHandler.reply
+
+@pytest.fixture
+def stubs():
+    """start(**behaviour) -> (server, provider, stats); servers are shut down afterwards"""
+    servers = []
+
+    def start(name, health=None, **behaviour):
+        server, base_url, stats = start_llm_stub(token_delay=0, **behaviour)
+        servers.append(server)
+        provider = OpenAICompatibleProvider(base_url, "stub", name=name, timeout=10,
+                                            health=health or ProviderHealth())
+        return server, provider, stats
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+def run(router, coro):
+    async def main():
+        try:
+            return await coro
+        finally:
+            await router.aclose()
+    return asyncio.run(main())
+
+async def collect(stream):
+    return "".join([delta async for delta in stream])
+
+# ==================== FAILOVER ====================
+def test_fails_over_when_a_provider_errors(stubs):
+    _, broken, broken_stats = stubs("broken", fail_rate=1.0)
+    _, healthy, healthy_stats = stubs("healthy")
+    router = LLMRouter([broken, healthy], hedge=False, explore_every=0)
+
+    assert run(router, router.complete("What is the fee?")) == REPLY
+    assert broken_stats["failures"] == 1 and healthy_stats["requests"] == 1
+    assert broken.health.failures == 1 and healthy.health.successes == 1
+
+def test_stream_fails_over_before_the_first_token(stubs):
+    _, broken, _ = stubs("broken", fail_rate=1.0)
+    _, healthy, _ = stubs("healthy")
+    router = LLMRouter([broken, healthy], hedge=False, explore_every=0)
+
+    assert run(router, collect(router.stream("What is the fee?"))) == REPLY
+    assert broken.health.failures == 1
+
+def test_error_when_every_provider_fails(stubs):
+    _, first, _ = stubs("first", fail_rate=1.0)
+    _, second, _ = stubs("second", fail_rate=1.0)
+    router = LLMRouter([first, second], hedge=False, explore_every=0)
+
+    with pytest.raises(LLMProviderError, match="All LLM providers failed"):
+        run(router, router.complete("What is the fee?"))
+
+# ==================== HEDGING ====================
+def test_slow_provider_is_hedged(stubs):
+    _, slow, slow_stats = stubs("slow", latency=2.0)
+    _, fast, fast_stats = stubs("fast", latency=0.05)
+    router = LLMRouter([slow, fast], hedge=True, hedge_delay=0.2, explore_every=0)
+
+    started = time.perf_counter()
+    assert run(router, router.complete("What is the fee?")) == REPLY
+    elapsed = time.perf_counter() - started
+
+    assert elapsed < 1.5                       # didn't wait for the slow stub
+    assert router.hedges == 1
+    assert slow_stats["requests"] == 1 and fast_stats["requests"] == 1
+    assert fast.health.successes == 1 and slow.health.successes == 0
+    assert slow.health.failures == 0           # losing a race isn't an error
+    assert slow.health.latencies["complete"][-1] >= 0.2
+
+def test_no_hedge_when_the_first_answer_is_fast(stubs):
+    _, fast, _ = stubs("fast", latency=0.05)
+    _, spare, spare_stats = stubs("spare", latency=0.05)
+    router = LLMRouter([fast, spare], hedge=True, hedge_delay=1.0, explore_every=0)
+
+    assert run(router, router.complete("What is the fee?")) == REPLY
+    assert router.hedges == 0 and spare_stats["requests"] == 0
+
+# ==================== CIRCUIT BREAKER ====================
+def test_circuit_opens_and_recovers(stubs):
+    server, provider, stats = stubs("flaky", fail_rate=1.0,
+                                    health=ProviderHealth(failure_threshold=2, cooldown=0.3))
+    router = LLMRouter([provider], explore_every=0)
+
+    async def scenario():
+        for _ in range(2):
+            with pytest.raises(LLMProviderError):
+                await router.complete("What is the fee?")
+        assert provider.health.state == "open"
+
+        # Open: rejected without calling the provider
+        with pytest.raises(LLMOverloadedError):
+            await router.complete("What is the fee?")
+        assert stats["requests"] == 2
+
+        # After the cooldown one probe goes through; its success closes the circuit
+        server.RequestHandlerClass.fail_rate = 0.0
+        await asyncio.sleep(0.35)
+        assert await router.complete("What is the fee?") == REPLY
+        assert provider.health.state == "closed"
+        assert await router.complete("What is the fee?") == REPLY
+        assert stats["requests"] == 4
+
+    run(router, scenario())
+
+def test_failed_probe_reopens_the_circuit(stubs):
+    _, provider, stats = stubs("down", fail_rate=1.0,
+                               health=ProviderHealth(failure_threshold=1, cooldown=0.2))
+    router = LLMRouter([provider], explore_every=0)
+
+    async def scenario():
+        with pytest.raises(LLMProviderError):
+            await router.complete("What is the fee?")
+        await asyncio.sleep(0.25)
+        with pytest.raises(LLMProviderError):   # the probe
+            await router.complete("What is the fee?")
+        assert provider.health.state == "open"
+        with pytest.raises(LLMOverloadedError):
+            await router.complete("What is the fee?")
+        assert stats["requests"] == 2
+
+    run(router, scenario())
+
+def test_open_circuit_is_skipped_for_a_healthy_provider(stubs):
+    _, broken, broken_stats = stubs("broken", fail_rate=1.0,
+                                    health=ProviderHealth(failure_threshold=1, cooldown=60))
+    _, healthy, _ = stubs("healthy")
+    router = LLMRouter([broken, healthy], hedge=False, explore_every=0)
+
+    async def scenario():
+        for _ in range(3):
+            assert await router.complete("What is the fee?") == REPLY
+
+    run(router, scenario())
+    assert broken.health.state == "open"
+    assert broken_stats["requests"] == 1
+
+def test_only_one_caller_wins_the_half_open_probe():
+    health = ProviderHealth(failure_threshold=1, cooldown=0.0)
+    health.record_failure()
+    start = threading.Barrier(16)
+
+    def claim():
+        start.wait()
+        return health.available()
+
+    with ThreadPoolExecutor(16) as pool:
+        claims = list(pool.map(lambda _: claim(), range(16)))
+    assert claims.count(True) == 1 and health.state == "half_open"
+
+def test_concurrent_requests_send_a_single_probe(stubs):
+    server, provider, stats = stubs("flaky", fail_rate=1.0, latency=0.3,
+                                    health=ProviderHealth(failure_threshold=1, cooldown=0.2))
+    router = LLMRouter([provider], explore_every=0)
+
+    async def scenario():
+        with pytest.raises(LLMProviderError):
+            await router.complete("What is the fee?")
+        server.RequestHandlerClass.fail_rate = 0.0
+        await asyncio.sleep(0.25)
+        return await asyncio.gather(*(router.complete("What is the fee?") for _ in range(5)),
+                                    return_exceptions=True)
+
+    results = run(router, scenario())
+    assert results.count(REPLY) == 1
+    assert all(isinstance(result, LLMOverloadedError) for result in results if result != REPLY)
+    assert stats["requests"] == 2 and provider.health.state == "closed"
+
+# ==================== TOKEN ACCOUNTING ====================
+def test_settle_never_fills_the_bucket_past_capacity():
+    scheduler = LLMScheduler("test", tokens_per_min=1000)
+    scheduler.settle(reserved=800, actual=100)
+    assert scheduler.tokens.level == scheduler.tokens.capacity
+
+def test_failed_and_hedged_calls_give_their_tokens_back(stubs):
+    _, broken, _ = stubs("broken", fail_rate=1.0)
+    _, slow, _ = stubs("slow", latency=2.0)
+    _, fast, _ = stubs("fast", latency=0.05)
+    for provider in (broken, slow, fast):
+        provider.scheduler = LLMScheduler(provider.name, tokens_per_min=100_000)
+
+    async def scenario():
+        # broken fails over to slow, which gets hedged by fast
+        router = LLMRouter([broken, slow, fast], hedge=True, hedge_delay=0.2, explore_every=0)
+        assert await router.complete("What is the fee?") == REPLY
+        await router.aclose()
+
+    asyncio.run(scenario())
+    capacity = broken.scheduler.tokens.capacity
+    assert broken.scheduler.tokens.level == pytest.approx(capacity, abs=10)
+    assert slow.scheduler.tokens.level == pytest.approx(capacity, abs=10)
+    assert fast.scheduler.tokens.level < capacity           # the winner is charged its real usage
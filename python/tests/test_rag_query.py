@@ -0,0 +1,114 @@
+"""rag_query helpers: single-flight coalescing and streamed answer cleaning"""
+import asyncio
+import random
+
+import pytest
+
+from rag_query import SingleFlight, StreamingAnswerCleaner, clean_answer
+
+# ==================== SINGLE FLIGHT ====================
+def test_concurrent_identical_calls_share_one_execution():
+    flight = SingleFlight()
+    calls = []
+
+    async def answer():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "The fee is Rs. 120,000."
+
+    async def scenario():
+        return await asyncio.gather(*(flight.do(("groq", "fee"), answer) for _ in range(5)))
+
+    assert asyncio.run(scenario()) == ["The fee is Rs. 120,000."] * 5
+    assert len(calls) == 1
+    assert flight.stats() == {"in_flight": 0, "leaders": 1, "followers": 4, "coalesced_ratio": 0.8}
+
+def test_different_keys_run_separately():
+    flight = SingleFlight()
+
+    async def scenario():
+        return await asyncio.gather(flight.do("a", lambda: asyncio.sleep(0.01, "A")),
+                                    flight.do("b", lambda: asyncio.sleep(0.01, "B")))
+
+    assert asyncio.run(scenario()) == ["A", "B"]
+    assert flight.leaders == 2 and flight.followers == 0
+
+def test_exception_reaches_every_waiter_and_key_is_released():
+    flight = SingleFlight()
+    calls = []
+
+    async def broken():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        raise RuntimeError("LLM down")
+
+    async def healthy():
+        calls.append(1)
+        return "recovered"
+
+    async def scenario():
+        results = await asyncio.gather(*(flight.do("fee", broken) for _ in range(3)),
+                                       return_exceptions=True)
+        assert flight.stats()["in_flight"] == 0
+        # The failed execution isn't reused: the next caller starts a fresh one
+        return results, await flight.do("fee", healthy)
+
+    results, retry = asyncio.run(scenario())
+    assert all(isinstance(result, RuntimeError) and str(result) == "LLM down" for result in results)
+    assert retry == "recovered"
+    assert len(calls) == 2
+
+def test_cancelled_follower_does_not_cancel_the_leader():
+    flight = SingleFlight()
+
+    async def answer():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def scenario():
+        leader = asyncio.ensure_future(flight.do("fee", answer))
+        follower = asyncio.ensure_future(flight.do("fee", answer))
+        await asyncio.sleep(0.01)
+        follower.cancel()
+        return await leader
+
+    assert asyncio.run(scenario()) == "done"
+
+# ==================== STREAMED ANSWER CLEANING ====================
+ANSWERS = [
+    "<think>The user asks about fees [1]. Check the context.</think>\n\nThe fee is Rs. 120,000 [2] per semester.",
+    "<think>\nSources: context chunk 3\n</think>\n\nAdmissions open in June [3].\n\nSources: [1], [3]\n\nApply online.",
+    "<think>plan</think>The deadline is 30 June [12].\n\n📎 References: [12] admissions page",
+    "No tags here, just a citation [4] and a trailing list.\n\nReferences:\n[4] fee page",
+    "<think>Is [5] relevant?\n\nReferences: none</think>\n\nHostel seats are limited.",
+    "<think></think>Contact the registrar's office [7][8].\n\nSource: registrar page",
+]
+
+def stream_clean(chunks):
+    cleaner = StreamingAnswerCleaner()
+    return "".join(cleaner.feed(chunk) for chunk in chunks) + cleaner.finish()
+
+def split_every(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+@pytest.mark.parametrize("answer", ANSWERS)
+@pytest.mark.parametrize("size", [1, 2, 3, 5, 7, 16])
+def test_streamed_cleaning_matches_clean_answer(answer, size):
+    # Small fixed sizes split "<think>", "</think>", "[12]" and "Sources:" at every offset
+    assert stream_clean(split_every(answer, size)) == clean_answer(answer)
+
+@pytest.mark.parametrize("answer", ANSWERS)
+def test_streamed_cleaning_matches_on_random_token_boundaries(answer):
+    rng = random.Random(7)
+    for _ in range(50):
+        cuts = sorted(rng.sample(range(1, len(answer)), rng.randint(1, 12)))
+        chunks = [answer[i:j] for i, j in zip([0] + cuts, cuts + [len(answer)])]
+        assert stream_clean(chunks) == clean_answer(answer)
+
+@pytest.mark.parametrize("tag", ["<think>", "</think>"])
+def test_think_tag_split_at_every_offset(tag):
+    answer = "<think>fees [1]</think>\n\nThe fee is Rs. 120,000 [2]."
+    start = answer.index(tag)
+    for offset in range(1, len(tag)):
+        cut = start + offset
+        assert stream_clean([answer[:cut], answer[cut:]]) == clean_answer(answer)
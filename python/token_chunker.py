@@ -0,0 +1,154 @@
+"""
+TOKEN-BUDGET CHUNKER
+Splits page text into chunks measured in tokens of the embedding model's own
+tokenizer, so every chunk fits the model's window (all-MiniLM-L6-v2 keeps 256
+tokens including [CLS]/[SEP] and silently drops the rest).
+
+- each page is tokenized once, without truncation; token char offsets
+  turn any character span into a token count with two binary searches
+- chunk ends are picked from sentence boundaries (one precompiled regex),
+  falling back to word boundaries when the nearest sentence end would make
+  the chunk less than half the budget, and to a token boundary for a
+  single "word" longer than the budget
+- the next chunk starts up to `overlap` tokens before the previous end, at
+  a sentence start when one is in range, otherwise at a word start
+
+chunk() returns {"text", "tokens"} dicts. "tokens" counts what the model
+sees, special tokens included, so tokens <= max_tokens means nothing was cut.
+
+Tokenizer lookup, offline (first that exists): $SCRAPER_TOKENIZER (a
+tokenizer.json path, or a hub id to download explicitly), the ONNX export's
+models/minilm-onnx/tokenizer.json, a local all-MiniLM-L6-v2/ model directory,
+then the copy SentenceTransformer downloaded into its cache
+($SENTENCE_TRANSFORMERS_HOME or the Hugging Face hub cache). Nothing is
+fetched from the network unless SCRAPER_TOKENIZER names a hub id.
+"""
+
+# ==================== SECTION 1: IMPORTS ====================
+import glob
+import os
+import re
+from bisect import bisect_left, bisect_right
+
+MODEL_NAME = "all-MiniLM-L6-v2"          # what rag_query / build_chromadb load
+TOKENIZER_MODEL = f"sentence-transformers/{MODEL_NAME}"
+ONNX_TOKENIZER = "models/minilm-onnx/tokenizer.json"
+
+# A sentence ends at . ! ? followed by whitespace, or at a line break
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+|\n\s*")
+WORD_BOUNDARY = re.compile(r"\s+")
+
+# ==================== SECTION 2: TOKENIZER ====================
+_tokenizers = {}
+
+def cached_tokenizer_paths():
+    """Where a local copy of the embedding model's tokenizer.json can be, in lookup order"""
+    yield ONNX_TOKENIZER
+    yield os.path.join(MODEL_NAME, "tokenizer.json")
+    cache_dirs = [os.getenv("SENTENCE_TRANSFORMERS_HOME")]
+    try:
+        from huggingface_hub import constants
+        cache_dirs.append(constants.HF_HUB_CACHE)
+    except ImportError:   # optional: fall back to the default location
+        cache_dirs.append(os.path.join(os.path.expanduser("~"), ".cache", "huggingface", "hub"))
+    for cache_dir in filter(None, cache_dirs):
+        repo_dir = "models--" + TOKENIZER_MODEL.replace("/", "--")
+        yield from sorted(glob.glob(os.path.join(cache_dir, repo_dir, "snapshots", "*", "tokenizer.json")))
+        # sentence-transformers < 2.3 cache layout
+        yield os.path.join(cache_dir, TOKENIZER_MODEL.replace("/", "_"), "tokenizer.json")
+
+def find_tokenizer():
+    """$SCRAPER_TOKENIZER, else the first local tokenizer.json; never touches the network"""
+    name = os.getenv("SCRAPER_TOKENIZER")
+    if name:
+        return name
+    for path in cached_tokenizer_paths():
+        if os.path.exists(path):
+            return path
+    raise FileNotFoundError(
+        f"No local tokenizer.json for {TOKENIZER_MODEL} (looked in {ONNX_TOKENIZER}, "
+        f"./{MODEL_NAME}/ and the sentence-transformers / Hugging Face caches). "
+        f"Set SCRAPER_TOKENIZER to a tokenizer.json path, or to '{TOKENIZER_MODEL}' to download it.")
+
+def load_tokenizer(name=None):
+    """Fast tokenizer with truncation and padding off (cached per process)"""
+    from tokenizers import Tokenizer
+    name = name or find_tokenizer()
+    if name not in _tokenizers:
+        if os.path.exists(name):
+            tokenizer = Tokenizer.from_file(name)
+        else:
+            tokenizer = Tokenizer.from_pretrained(name)
+        tokenizer.no_truncation()
+        tokenizer.no_padding()
+        _tokenizers[name] = tokenizer
+    return _tokenizers[name]
+
+# ==================== SECTION 3: CHUNKER ====================
+class TokenChunker:
+    """
+    max_tokens: model window, special tokens included
+    overlap:    tokens the next chunk repeats from the end of the previous one
+    min_chars:  chunks this short (after strip) are dropped, as before
+    """
+    def __init__(self, tokenizer, max_tokens=256, overlap=40, min_chars=50):
+        self.tokenizer = tokenizer
+        self.special_tokens = tokenizer.num_special_tokens_to_add(False)
+        self.budget = max_tokens - self.special_tokens
+        if self.budget <= 0 or not 0 <= overlap < self.budget:
+            raise ValueError(f"need 0 <= overlap < {self.budget} content tokens, got overlap={overlap}")
+        self.max_tokens = max_tokens
+        self.overlap = overlap
+        self.min_chars = min_chars
+
+    def count_tokens(self, text):
+        """Tokens the model sees for `text` (special tokens included)"""
+        return len(self.tokenizer.encode(text).ids)
+
+    def chunk(self, text):
+        if not text or not text.strip():
+            return []
+
+        # Char offset where each token starts; tok(pos) = tokens before pos
+        starts = [start for start, _ in self.tokenizer.encode(text, add_special_tokens=False).offsets]
+        sentences = [m.end() for m in SENTENCE_BOUNDARY.finditer(text)]
+        words = [m.end() for m in WORD_BOUNDARY.finditer(text)]
+        n_tokens = len(starts)
+
+        def tok(pos):
+            return bisect_left(starts, pos)
+
+        def last_boundary(bounds, lo, hi):
+            """Largest boundary in (lo, hi]"""
+            i = bisect_right(bounds, hi) - 1
+            return bounds[i] if i >= 0 and bounds[i] > lo else None
+
+        def first_boundary(bounds, lo, hi):
+            """Smallest boundary in [lo, hi)"""
+            i = bisect_left(bounds, lo)
+            return bounds[i] if i < len(bounds) and bounds[i] < hi else None
+
+        chunks = []
+        start = 0
+        while start < len(text):
+            first = tok(start)
+            if n_tokens - first <= self.budget:
+                end = len(text)
+            else:
+                # Start of the first token that no longer fits
+                limit = starts[first + self.budget]
+                end = last_boundary(sentences, start, limit)
+                if end is None or tok(end) - first < self.budget // 2:
+                    end = last_boundary(words, start, limit) or end or limit
+
+            piece = text[start:end].strip()
+            if len(piece) > self.min_chars:
+                chunks.append({"text": piece, "tokens": tok(end) - first + self.special_tokens})
+            if end >= len(text):
+                break
+
+            # Step back `overlap` tokens, but always move forward
+            back = starts[max(first + 1, tok(end) - self.overlap)] if self.overlap else end
+            next_start = first_boundary(sentences, back, end) or first_boundary(words, back, end)
+            start = next_start if next_start is not None and next_start > start else end
+        return chunks
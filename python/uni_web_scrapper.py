@@ -1,17 +1,50 @@
 # ==================== SECTION 1: IMPORTS ====================
-import requests, json, re, os, sys
+import requests, re, os, sys, time
+import heapq
+import itertools
+import multiprocessing
+from collections import deque
+from urllib.parse import urlparse
 from bs4 import BeautifulSoup
 from tqdm import tqdm
+from crawler import Crawler
+from crawl_state import CrawlState, content_hash, save_changeset
+from raw_store import RawPageStore, read_object
+from jsonl_store import JsonlWriter, count_records, has_records, iter_jsonl, write_jsonl
+from bm25_index import BM25Index, INDEX_PATH as LEXICAL_INDEX_PATH, chunk_id
+from html_cleaner import extract_text
+from token_chunker import TokenChunker, load_tokenizer
 
 # ==================== SECTION 2: CONFIGURATION ====================
 class Config:
-    BASE_URL = "https://jinnah.edu"
-    SITEMAP_INDEX = "https://jinnah.edu/sitemap_index.xml"
+    # Override SCRAPER_BASE_URL to crawl a local stand-in (see fixture_site.py)
+    BASE_URL = os.getenv("SCRAPER_BASE_URL", "https://jinnah.edu").rstrip("/")
+    SITEMAP_INDEX = f"{BASE_URL}/sitemap_index.xml"
+    ALLOWED_DOMAIN = urlparse(BASE_URL).hostname
     MIN_TEXT_LENGTH = 50
-    CHUNK_SIZE = 1500
-    OVERLAP = 250
+    # Chunk sizes are in tokens of the embedding model's tokenizer (see token_chunker.py);
+    # all-MiniLM-L6-v2 reads 256 tokens including [CLS]/[SEP]
+    CHUNK_TOKENS = int(os.getenv("SCRAPER_CHUNK_TOKENS", "256"))
+    OVERLAP_TOKENS = int(os.getenv("SCRAPER_OVERLAP_TOKENS", "40"))
+    MIN_CHUNK_CHARS = 50
     REQUEST_TIMEOUT = 10
     
+    # Concurrent crawler
+    CRAWL_WORKERS = int(os.getenv("SCRAPER_WORKERS", "16"))
+    PER_HOST_CONCURRENCY = int(os.getenv("SCRAPER_PER_HOST", "8"))
+    MAX_RETRIES = 3
+    BACKOFF_BASE = 0.5
+    # Longest wait between retries, also the cap on a server's Retry-After
+    MAX_BACKOFF = float(os.getenv("SCRAPER_MAX_BACKOFF", "30"))
+    TARGET_LATENCY = 2.0
+    
+    # Clean / chunk stages run in a process pool (1 = in-process)
+    PROCESSES = int(os.getenv("SCRAPER_PROCESSES", str(os.cpu_count() or 1)))
+    PROCESS_CHUNKSIZE = int(os.getenv("SCRAPER_PROCESS_CHUNKSIZE", "16"))
+    
+    # Compressed raw HTML of every fetched page, for offline `replay` (see raw_store.py)
+    KEEP_RAW_PAGES = os.getenv("SCRAPER_KEEP_RAW", "1") == "1"
+    
     BLACKLIST_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.gif', '.pdf', '.doc', '.docx', '.zip']
     BLACKLIST_KEYWORDS = ['wp-content/uploads', '/gallery/', '/image/', '/photo/']
 
@@ -21,7 +54,7 @@ def should_include_url(url):
     url_lower = url.lower().strip()
     
     # Must be from jinnah.edu
-    if 'jinnah.edu' not in url_lower:
+    if Config.ALLOWED_DOMAIN not in url_lower:
         return False
     
     # Check blacklisted extensions
@@ -49,82 +82,60 @@ def should_include_url(url):
     return True
 
 # ==================== SECTION 4: URL EXTRACTION ====================
-def get_all_urls():
-    """Extract URLs from sitemap with filtering"""
-    response = requests.get(Config.SITEMAP_INDEX)
-    soup = BeautifulSoup(response.text, "xml")
+def make_crawler():
+    """Crawler configured from Config"""
+    return Crawler(
+        workers=Config.CRAWL_WORKERS,
+        per_host=Config.PER_HOST_CONCURRENCY,
+        retries=Config.MAX_RETRIES,
+        backoff=Config.BACKOFF_BASE,
+        timeout=Config.REQUEST_TIMEOUT,
+        target_latency=Config.TARGET_LATENCY,
+        max_backoff=Config.MAX_BACKOFF,
+    )
 
-    sitemap_urls = [loc.text for loc in soup.find_all("loc")]
-    all_urls = []
+def get_sitemap_entries(crawler=None):
+    """
+    Extract URLs + their <lastmod> from the sitemaps with filtering
+    (sub-sitemaps fetched concurrently). Returns {url: lastmod or None}
+    """
+    own_crawler = crawler is None
+    crawler = crawler or make_crawler()
+    try:
+        index = crawler.fetch(Config.SITEMAP_INDEX)
+        soup = BeautifulSoup(index["text"], "xml")
 
-    for sitemap in sitemap_urls:
-        res = requests.get(sitemap)
-        s = BeautifulSoup(res.text, "xml")
-        urls = [loc.text for loc in s.find_all("loc")]
-        
-        # FILTER URLs
-        for url in urls:
-            if should_include_url(url):
-                all_urls.append(url)
+        sitemap_urls = [loc.text for loc in soup.find_all("loc")]
+        entries = {}
 
-    return list(set(all_urls))  # remove duplicates
+        for res in crawler.fetch_many(sitemap_urls):
+            s = BeautifulSoup(res["text"], "xml")
+            
+            for node in s.find_all("url"):
+                loc = node.find("loc")
+                if loc is None:
+                    continue
+                url = loc.text.strip()
+                # FILTER URLs
+                if should_include_url(url):
+                    lastmod = node.find("lastmod")
+                    entries[url] = lastmod.text.strip() if lastmod else None
+    finally:
+        if own_crawler:
+            crawler.close()
+
+    return entries
+
+def get_all_urls(crawler=None):
+    """Extract URLs from sitemap with filtering"""
+    return sorted(get_sitemap_entries(crawler))
 
 # ==================== SECTION 5: SCRAPING ====================
 def scrape_page(url):
     """Scrape and clean single page"""
     try:
         response = requests.get(url, timeout=Config.REQUEST_TIMEOUT)
-        soup = BeautifulSoup(response.text, "lxml")
-
-        # Remove non-content elements - PHASE 1 (tags)
-        unwanted_tags = ["script", "style", "nav", "footer", "header", 
-                        "noscript", "aside", "sidebar", "share", "pagination"]
-        
-        for tag in unwanted_tags:
-            for element in soup.find_all(tag):
-                element.decompose()
-        
-        # PHASE 2 - Remove by class names
-        unwanted_classes = ["share", "pagination", "navigation", "breadcrumb", 
-                           "related-posts", "post-navigation", "widget",
-                           "comments", "social-share", "meta", "tags"]
-        
-        for class_name in unwanted_classes:
-            for element in soup.find_all(class_=class_name):
-                element.decompose()
-        
-        # PHASE 3 - Remove by ID
-        unwanted_ids = ["comments", "sidebar", "related-posts", "navigation"]
-        
-        for element_id in unwanted_ids:
-            element = soup.find(id=element_id)
-            if element:
-                element.decompose()
-
-        # Extract text
-        text = soup.get_text(separator=" ")
-        text = " ".join(text.split())
-        
-        # REMOVE COMMON FOOTER/NAV PATTERNS
-        unwanted_patterns = [
-            "WhatsApp us",
-            "Share:",
-            "Previous post",
-            "Next post", 
-            "You may also like",
-            "Read More",
-            "Home ",
-            "Archives - Muhammad Ali Jinnah University",
-            "- Muhammad Ali Jinnah University"
-        ]
-        
-        for pattern in unwanted_patterns:
-            text = text.replace(pattern, "")
-        
-        # Clean extra spaces
-        text = " ".join(text.split())
-        
-        return text
+        return extract_text(response.text)
     except Exception as e:
         print(f"Error scraping {url}: {e}")
         return ""
@@ -139,17 +150,18 @@ IMPORTANT_KEYWORDS = [
     "exam", "scholarship"
 ]
 
+EMAIL_PATTERN = re.compile(EMAIL_REGEX)
+PHONE_PATTERN = re.compile(PHONE_REGEX)
+
 def contains_important_info(text):
-    if re.search(EMAIL_REGEX, text):
+    if EMAIL_PATTERN.search(text):
         return True
-    if re.search(PHONE_REGEX, text):
+    if PHONE_PATTERN.search(text):
         return True
 
-    for kw in IMPORTANT_KEYWORDS:
-        if kw.lower() in text.lower():
-            return True
-
-    return False
+    # Keywords are lowercase already; lowercase the text once, not per keyword
+    lowered = text.lower()
+    return any(kw in lowered for kw in IMPORTANT_KEYWORDS)
 
 def is_garbage_text(text):
     """Detect if text is actually binary/image data misread as text"""
@@ -157,25 +169,17 @@ def is_garbage_text(text):
         return True
     
     # Count non-printable/weird characters (binary detection)
-    weird_chars = 0
-    for char in text[:1000]:  # Check first 1000 chars only
-        # Normal text characters: letters, digits, punctuation, whitespace
-        if ord(char) > 127:  # Non-ASCII characters
-            weird_chars += 1
+    head = text[:1000]  # Check first 1000 chars only
+    # Non-ASCII characters are the ones an ASCII encode drops
+    weird_chars = len(head) - len(head.encode("ascii", "ignore"))
     
     # If more than 20% are weird characters, it's likely binary/garbage
-    if len(text) > 0 and (weird_chars / min(len(text), 1000)) > 0.2:
+    if weird_chars / len(head) > 0.2:
         return True
     
-    # Check for common binary patterns
-    binary_patterns = [
-        r'\x00',  # Null bytes
-        r'\ufffd',  # Unicode replacement character �
-    ]
-    
-    for pattern in binary_patterns:
-        if re.search(pattern, text[:500]):
-            return True
+    # Check for common binary patterns: null bytes, Unicode replacement character �
+    if "\x00" in text[:500] or "\ufffd" in text[:500]:
+        return True
     
     # If text is too short but no important info
     if len(text) < 50 and not contains_important_info(text):
@@ -199,41 +203,176 @@ def clean_text(text):
     return None
 
 # ==================== SECTION 7: CHUNKING ====================
+_chunker = None
+
+def get_chunker():
+    """One TokenChunker per process (pool workers load the tokenizer on first use)"""
+    global _chunker
+    if _chunker is None:
+        _chunker = TokenChunker(load_tokenizer(), Config.CHUNK_TOKENS,
+                                Config.OVERLAP_TOKENS, Config.MIN_CHUNK_CHARS)
+    return _chunker
+
 def chunk_text(text):
-    """Split text into chunks"""
-    if not text or len(text.strip()) == 0:
-        return []
-    
-    chunks = []
-    start = 0
-    
-    while start < len(text):
-        # Calculate end position
-        end = min(start + Config.CHUNK_SIZE, len(text))
-        
-        # Try to end at sentence boundary (if not at end of text)
-        if end < len(text):
-            original_end = end
-            # Look backwards for sentence end
-            while end > start and text[end] not in ['.', '!', '?', '\n', ' ']:
-                end -= 1
-            
-            # If we went too far back, use original end
-            if end <= start + Config.CHUNK_SIZE // 2:  # Less than half chunk size
-                end = original_end
-        
-        chunk = text[start:end].strip()
-        if chunk and len(chunk) > 50:  # Skip very small chunks
-            chunks.append(chunk)
-        
-        # Move start for next chunk with overlap
-        start = end - Config.OVERLAP
-        if start <= end:  # Prevent getting stuck
-            start = end  # Skip overlap if issue
-    
-    return chunks
+    """Split text into {"text", "tokens"} chunks that fit the embedding model"""
+    return get_chunker().chunk(text)
+
+# ==================== SECTION 8: PARALLEL STAGES ====================
+class StagePool:
+    """
+    Process pool for the CPU-bound clean and chunk stages. map() hands items
+    to the workers in chunks of PROCESS_CHUNKSIZE and yields results in input
+    order, so output is identical for any number of processes. processes=1
+    runs in-process without a pool.
+    """
+    def __init__(self, processes=None, chunksize=None):
+        self.processes = max(1, processes or Config.PROCESSES)
+        self.chunksize = chunksize or Config.PROCESS_CHUNKSIZE
+        self.pool = multiprocessing.Pool(self.processes) if self.processes > 1 else None
+
+    def map(self, func, items):
+        if self.pool is None:
+            return map(func, items)
+        return self.pool.imap(func, items, self.chunksize)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if exc[0] is not None and self.pool is not None:
+            self.pool.terminate()
+        self.close()
+
+def report_throughput(stage, pages, nbytes, elapsed, processes):
+    elapsed = max(elapsed, 1e-9)
+    print(f"⚡ {stage}: {pages} pages, {nbytes / 1024 / 1024:.1f} MB in {elapsed:.1f}s "
+          f"({pages / elapsed:.0f} pages/sec, {nbytes / 1024 / 1024 / elapsed:.1f} MB/s, "
+          f"{processes} process{'es' if processes > 1 else ''})")
+
+def clean_html(html):
+    """Fetched HTML -> (clean text or None, error or None); runs in the workers"""
+    try:
+        return clean_text(extract_text(html)), None
+    except Exception as e:
+        return None, str(e) or type(e).__name__
+
+def clean_stored(path):
+    """Raw page from the store -> (clean text or None, error or None); runs in the workers"""
+    try:
+        html = read_object(path)
+    except Exception as e:
+        return None, str(e) or type(e).__name__
+    return clean_html(html)
+
+def clean_fetched(results, stages, raw_store=None):
+    """
+    Clean crawler results in the stage pool while the crawler keeps fetching.
+    Yields (res, clean) in the order the crawler returned them. Only
+    successful fetches go to a worker (and into raw_store, if given); failed
+    ones (and 304s) pass through with clean=None, and a page that failed to
+    clean gets res["error"] set. The HTML is dropped from res once it has
+    been handed off.
+    """
+    pending = deque()
+    stats = {"pages": 0, "bytes": 0}
+
+    def fetched_html():
+        for res in results:
+            html = res.pop("text", None)
+            ok = not res["error"] and res["status"] < 400 and res["status"] != 304
+            pending.append((res, ok))
+            if ok:
+                if raw_store is not None:
+                    raw_store.put(res["url"], html, res["headers"], res["status"])
+                stats["pages"] += 1
+                stats["bytes"] += len(html.encode("utf-8"))
+                yield html
+
+    start = time.perf_counter()
+    for clean, error in stages.map(clean_html, fetched_html()):
+        res, ok = pending.popleft()
+        while not ok:
+            yield res, None
+            res, ok = pending.popleft()
+        if error:
+            res["error"] = f"cleaning failed: {error}"
+        yield res, clean
+    while pending:
+        yield pending.popleft()[0], None
+    report_throughput("Cleaning (overlaps fetching)", stats["pages"], stats["bytes"],
+                      time.perf_counter() - start, stages.processes)
+
+def in_url_order(results, urls):
+    """
+    Re-order (res, clean) pairs from clean_fetched into `urls` order, so
+    output is deterministic regardless of completion order. Only results
+    that arrived ahead of a slower URL are held back, not the whole crawl.
+    """
+    position = {url: i for i, url in enumerate(urls)}
+    waiting = {}
+    next_i = 0
+    for res, clean in results:
+        waiting[position[res["url"]]] = (res, clean)
+        while next_i in waiting:
+            yield waiting.pop(next_i)
+            next_i += 1
+    for i in sorted(waiting):
+        yield waiting[i]
+
+def chunk_page(page):
+    """{"url", "content"} -> its {"text", "tokens", "source"} chunks; runs in the workers"""
+    return [dict(chunk, source=page["url"]) for chunk in chunk_text(page["content"])]
+
+def chunk_pages(pages, stages=None, total=None):
+    """
+    Chunk an iterable of {"url", "content"} pages into {"text", "tokens",
+    "source"} chunks. A generator: pages are pulled and chunks yielded as they go, in
+    page order, so a whole corpus never has to be in memory.
+    """
+    if total is None and hasattr(pages, "__len__"):
+        total = len(pages)
+    own_pool = stages is None
+    if own_pool:
+        # Not worth starting workers for a handful of changed pages
+        small = total is not None and total < 2 * Config.PROCESS_CHUNKSIZE
+        stages = StagePool(1 if small else None)
+    stats = {"pages": 0, "bytes": 0, "chunks": 0, "tokens": 0, "max_tokens": 0, "over_limit": 0}
+
+    def counted(pages):
+        for page in pages:
+            stats["pages"] += 1
+            stats["bytes"] += len(page["content"].encode("utf-8"))
+            yield page
+
+    try:
+        start = time.perf_counter()
+        for chunks in tqdm(stages.map(chunk_page, counted(pages)), total=total, desc="Chunking"):
+            for chunk in chunks:
+                stats["chunks"] += 1
+                stats["tokens"] += chunk["tokens"]
+                stats["max_tokens"] = max(stats["max_tokens"], chunk["tokens"])
+                stats["over_limit"] += chunk["tokens"] > Config.CHUNK_TOKENS
+            yield from chunks
+        report_throughput("Chunking", stats["pages"], stats["bytes"],
+                          time.perf_counter() - start, stages.processes)
+        print(f"🔢 Tokens per chunk: mean {stats['tokens'] / max(stats['chunks'], 1):.0f}, "
+              f"max {stats['max_tokens']} (model limit {Config.CHUNK_TOKENS}), "
+              f"{stats['over_limit']} chunks would be truncated")
+    finally:
+        if own_pool:
+            stages.close()
+
+# ==================== SECTION 9: DATA LOADING/SAVING ====================
+# One JSON record per line, written atomically (see jsonl_store.py)
+PAGES_PATH = "data/clean_pages.jsonl"
+CHUNKS_PATH = "data/chunks.jsonl"
 
-# ==================== SECTION 8: DATA LOADING/SAVING ====================
 def load_existing_urls():
     """Load URLs from file if exists"""
     if os.path.exists("data/urls.txt"):
@@ -242,18 +381,12 @@ def load_existing_urls():
     return []
 
 def load_existing_pages():
-    """Load cleaned pages from existing data"""
-    if os.path.exists("data/clean_pages.json"):
-        with open("data/clean_pages.json", "r", encoding="utf-8") as f:
-            return json.load(f)
-    return []
+    """Stream cleaned pages from existing data"""
+    return iter_jsonl(PAGES_PATH)
 
 def load_existing_chunks():
-    """Load chunks from existing data"""
-    if os.path.exists("data/chunks.json"):
-        with open("data/chunks.json", "r", encoding="utf-8") as f:
-            return json.load(f)
-    return []
+    """Stream chunks from existing data"""
+    return iter_jsonl(CHUNKS_PATH)
 
 def save_urls(urls):
     """Save URLs to file"""
@@ -263,58 +396,88 @@ def save_urls(urls):
             f.write(url + "\n")
 
 def save_pages(pages):
-    """Save cleaned pages to file"""
-    with open("data/clean_pages.json", "w", encoding="utf-8") as f:
-        json.dump(pages, f, indent=2, ensure_ascii=False)
+    """Stream cleaned pages to file; returns how many were written"""
+    return write_jsonl(PAGES_PATH, pages)
 
 def save_chunks(chunks):
-    """Save chunks to file"""
-    with open("data/chunks.json", "w", encoding="utf-8") as f:
-        json.dump(chunks, f, indent=2, ensure_ascii=False)
+    """Stream chunks to file; returns (chunk count, total chars)"""
+    sizes = {"chars": 0}
+
+    def counted():
+        for chunk in chunks:
+            sizes["chars"] += len(chunk["text"])
+            yield chunk
 
-# ==================== SECTION 9: MAIN PIPELINE ====================
+    return write_jsonl(CHUNKS_PATH, counted()), sizes["chars"]
+
+def save_raw_store(raw_store, keep):
+    """Forget raw pages for URLs that left the sitemap, drop their objects, write the index"""
+    for url in set(raw_store.urls()) - set(keep):
+        raw_store.remove(url)
+    pruned = raw_store.prune()
+    raw_store.save()
+    stats = raw_store.stats()
+    print(f"🗄️ Raw pages: {stats['pages']} URLs, {stats['objects']} objects, "
+          f"{stats['raw_mb']} MB -> {stats['stored_mb']} MB {stats['codec']}"
+          f"{f', {pruned} stale objects removed' if pruned else ''}")
+
+# ==================== SECTION 10: MAIN PIPELINE ====================
 def run_full_pipeline():
     """Run complete pipeline from start to finish"""
     print("="*60)
     print("UNIVERSITY RAG PIPELINE - FULL RUN")
     print("="*60)
     
+    # Start the workers before the crawler starts its threads (fork-safe)
+    stages = StagePool()
+    crawler = make_crawler()
+    raw_store = RawPageStore.load() if Config.KEEP_RAW_PAGES else None
+    
     print("\nStep 1: Extracting URLs from sitemap...")
-    urls = get_all_urls()
+    entries = get_sitemap_entries(crawler)
+    urls = sorted(entries)
     print(f"✅ Found {len(urls)} URLs after filtering")
     save_urls(urls)
     
-    print(f"\nStep 2: Scraping {len(urls)} pages...")
-    clean_pages = []
-    for url in tqdm(urls, desc="Scraping"):
-        try:
-            text = scrape_page(url)
-            clean = clean_text(text)
-            if clean:
-                clean_pages.append({"url": url, "content": clean})
-        except Exception as e:
-            continue
-    
-    print(f"✅ Scraped and cleaned {len(clean_pages)} pages")
-    save_pages(clean_pages)
-    
-    print(f"\nStep 3: Chunking {len(clean_pages)} pages...")
-    all_chunks = []
-    for page in tqdm(clean_pages, desc="Chunking"):
-        chunks = chunk_text(page["content"])
-        for chunk in chunks:
-            all_chunks.append({"text": chunk, "source": page["url"]})
+    print(f"\nStep 2: Scraping {len(urls)} pages ({Config.CRAWL_WORKERS} workers, "
+          f"cleaning on {stages.processes} processes)...")
+    state = CrawlState()
+    start = time.perf_counter()
+    with stages:
+        results = in_url_order(clean_fetched(crawler.fetch_many(urls), stages, raw_store), urls)
+        # Pages go to disk as they arrive; only the crawl state (hashes) stays in memory
+        with JsonlWriter(PAGES_PATH) as pages_out:
+            for res, clean in tqdm(results, total=len(urls), desc="Scraping"):
+                if res["error"] or res["status"] >= 400:
+                    print(f"Error scraping {res['url']}: {res['error'] or 'HTTP ' + str(res['status'])}")
+                    continue
+                state.record(res["url"], entries[res["url"]], res["headers"], clean)
+                if clean:
+                    pages_out.write({"url": res["url"], "content": clean})
+        elapsed = time.perf_counter() - start
+        crawler.close()
+
+        state.save()
+        if raw_store is not None:
+            save_raw_store(raw_store, keep=set(urls))
+
+        print(f"✅ Scraped and cleaned {pages_out.count} pages in {elapsed:.1f}s "
+              f"({len(urls)/max(elapsed, 1e-9):.1f} pages/sec)")
+        print(f"   Requests: {crawler.stats['requests']}, retries: {crawler.stats['retries']}, "
+              f"failures: {crawler.stats['failures']}")
+
+        print(f"\nStep 3: Chunking {pages_out.count} pages...")
+        count, chars = save_chunks(chunk_pages(load_existing_pages(), stages, total=pages_out.count))
     
-    print(f"✅ Created {len(all_chunks)} chunks")
-    save_chunks(all_chunks)
+    print(f"✅ Created {count} chunks")
     
     print("\n" + "="*60)
     print("✅ PIPELINE COMPLETE!")
-    print(f"📦 Total chunks: {len(all_chunks)}")
-    print(f"📏 Avg chunk size: {sum(len(c['text']) for c in all_chunks)/len(all_chunks):.0f} chars")
+    print(f"📦 Total chunks: {count}")
+    print(f"📏 Avg chunk size: {chars/max(count, 1):.0f} chars")
     print("="*60)
     
-    return all_chunks
+    return count
 
 def run_chunk_only():
     """Only re-chunk existing cleaned data"""
@@ -322,80 +485,202 @@ def run_chunk_only():
     print("RE-CHUNKING EXISTING DATA")
     print("="*60)
     
-    pages = load_existing_pages()
-    if not pages:
-        print("❌ No clean_pages.json found. Run full pipeline first.")
+    if not has_records(PAGES_PATH):
+        print(f"❌ No {PAGES_PATH} found. Run full pipeline first.")
         return
     
-    print(f"📄 Loaded {len(pages)} existing pages")
+    total = count_records(PAGES_PATH)
+    print(f"📄 Found {total} existing pages")
     
     print("\nRe-chunking pages...")
-    all_chunks = []
-    for page in tqdm(pages, desc="Chunking"):
-        chunks = chunk_text(page["content"])
-        for chunk in chunks:
-            all_chunks.append({"text": chunk, "source": page["url"]})
+    count, chars = save_chunks(chunk_pages(load_existing_pages(), total=total))
+    
+    print(f"✅ Created {count} chunks")
+    print(f"📦 Total chunks: {count}")
+    print(f"📏 Avg chunk size: {chars/max(count, 1):.0f} chars")
+
+def run_replay():
+    """Re-clean and re-chunk every page from the raw store - no network"""
+    print("="*60)
+    print("REPLAY FROM RAW PAGE STORE (OFFLINE)")
+    print("="*60)
     
-    print(f"✅ Created {len(all_chunks)} chunks")
-    save_chunks(all_chunks)
+    raw_store = RawPageStore.load()
+    if not len(raw_store):
+        print("❌ Raw page store is empty. Run the full pipeline first (with SCRAPER_KEEP_RAW=1).")
+        return
     
-    print(f"📦 Total chunks: {len(all_chunks)}")
-    print(f"📏 Avg chunk size: {sum(len(c['text']) for c in all_chunks)/len(all_chunks):.0f} chars")
+    # Sitemap order from the last crawl, like the full pipeline
+    urls = [url for url in (load_existing_urls() or raw_store.urls()) if url in raw_store]
+    stats = raw_store.stats()
+    print(f"📄 {len(urls)} stored pages ({stats['stored_mb']} MB {stats['codec']}, {stats['raw_mb']} MB HTML)")
+    
+    state = CrawlState.load()
+    with StagePool() as stages:
+        print(f"\nStep 1: Cleaning on {stages.processes} processes...")
+        start = time.perf_counter()
+        results = stages.map(clean_stored, (raw_store.path_of(url) for url in urls))
+        # Clean pages go straight to disk, then get streamed back for chunking
+        with JsonlWriter(PAGES_PATH) as pages_out:
+            for url, (clean, error) in zip(urls, tqdm(results, total=len(urls), desc="Cleaning")):
+                if error:
+                    print(f"Error cleaning {url}: {error}")
+                    continue
+                if url in state:
+                    state.pages[url]["hash"] = content_hash(clean)  # keep `update` diffs against this output
+                if clean:
+                    pages_out.write({"url": url, "content": clean})
+        nbytes = sum(raw_store.pages[url]["bytes"] for url in urls)
+        report_throughput("Cleaning", len(urls), nbytes, time.perf_counter() - start, stages.processes)
+        print(f"✅ Cleaned {pages_out.count} pages")
+        
+        print(f"\nStep 2: Chunking {pages_out.count} pages...")
+        count, _ = save_chunks(chunk_pages(load_existing_pages(), stages, total=pages_out.count))
+    
+    state.save()
+    print(f"✅ Created {count} chunks")
 
 def run_update():
-    """Smart update - only scrape new URLs"""
+    """
+    Smart update - only refetch pages that changed.
+    Skips URLs whose sitemap lastmod is unchanged, uses conditional GETs
+    (ETag / Last-Modified) for the rest, compares content hashes, and writes
+    data/changeset.json with added / modified / removed pages.
+    """
     print("="*60)
-    print("SMART UPDATE - SCAN FOR NEW PAGES")
+    print("SMART UPDATE - INCREMENTAL REFRESH")
     print("="*60)
     
-    print("Note: This feature needs more development")
-    print("For now, please run 'full' to refresh all data")
-    print("Or 'chunk-only' to re-chunk existing data")
+    state = CrawlState.load()
+    # Only URLs (and hashes of pages the state doesn't know yet) are kept in memory
+    page_urls, page_hashes = set(), {}
+    for page in load_existing_pages():
+        page_urls.add(page["url"])
+        if page["url"] not in state:
+            page_hashes[page["url"]] = content_hash(page["content"])
+    if not state.pages:
+        print("⚠️ No crawl state yet - every page will be checked once to build it")
+    
+    crawler = make_crawler()
+    
+    print("\nStep 1: Reading sitemap lastmod dates...")
+    entries = get_sitemap_entries(crawler)
+    current = set(entries)
+    known = state.urls() | page_urls
+    
+    to_check = [url for url in sorted(current)
+                if not (url in state and state.is_unchanged_in_sitemap(url, entries[url]))]
+    unchanged = len(current) - len(to_check)
+    print(f"✅ {len(current)} URLs in sitemap, {unchanged} unchanged by lastmod, {len(to_check)} to check")
+    
+    print(f"\nStep 2: Conditional fetch of {len(to_check)} pages...")
+    added, modified = set(), set()
+    changed_pages = {}
+    stages = StagePool(1 if len(to_check) < 2 * Config.PROCESS_CHUNKSIZE else None)
+    raw_store = RawPageStore.load() if Config.KEEP_RAW_PAGES else None
+    results = crawler.fetch_many(to_check, headers_for=state.conditional_headers)
+    with stages:
+        for res, clean in tqdm(clean_fetched(results, stages, raw_store), total=len(to_check), desc="Checking"):
+            url = res["url"]
+            if res["status"] == 304:
+                state.touch(url, entries[url])
+                unchanged += 1
+                continue
+            if res["error"] or res["status"] >= 400:
+                # Keep the copy we already have, try again next update
+                print(f"Error scraping {url}: {res['error'] or 'HTTP ' + str(res['status'])}")
+                continue
+            
+            if url in state:
+                old_hash = state.get(url).get("hash")
+            else:
+                old_hash = page_hashes.get(url)
+            state.record(url, entries[url], res["headers"], clean)
+            
+            if old_hash == content_hash(clean):
+                unchanged += 1
+                continue
+            if old_hash is None and not clean:
+                continue  # new page but nothing worth keeping
+            
+            if clean:
+                changed_pages[url] = clean
+            (modified if url in known else added).add(url)
+    crawler.close()
+    
+    removed = known - current
+    for url in removed:
+        state.remove(url)
+    
+    changed = added | modified | removed
+    if changed:
+        print(f"\nStep 3: Re-chunking {len(added | modified)} changed pages...")
+        kept_chunks = (c for c in load_existing_chunks() if c["source"] not in changed)
+        new_pages = [{"url": url, "content": changed_pages[url]} for url in sorted(changed_pages)]
+        count, _ = save_chunks(itertools.chain(kept_chunks, chunk_pages(new_pages)))
+        # Old pages file is streamed through; changed pages are merged in by URL, removed ones dropped
+        kept_pages = (p for p in load_existing_pages() if p["url"] not in changed)
+        save_pages(heapq.merge(kept_pages, new_pages, key=lambda page: page["url"]))
+        print(f"✅ {count} chunks after update")
+    
+    save_urls(sorted(current))
+    state.save()
+    save_changeset(added, modified, removed, unchanged)
+    if raw_store is not None:
+        save_raw_store(raw_store, keep=current)
+    
+    print("\n" + "="*60)
+    print("✅ UPDATE COMPLETE!")
+    print(f"➕ Added: {len(added)}  ✏️ Modified: {len(modified)}  ➖ Removed: {len(removed)}  "
+          f"= Unchanged: {unchanged}")
+    print("📝 Changeset saved: data/changeset.json")
+    print("="*60)
+
+# ==================== SECTION 11: QUICK SEARCH (Bonus!) ====================
+def load_search_index():
+    """
+    The BM25 index build_chromadb.py saved (keyed by chunk_id), if it is at
+    least as new as the chunks file; None when missing or out of date.
+    """
+    if not os.path.exists(LEXICAL_INDEX_PATH) or not os.path.exists(CHUNKS_PATH):
+        return None
+    if os.path.getmtime(LEXICAL_INDEX_PATH) < os.path.getmtime(CHUNKS_PATH):
+        return None
+    index = BM25Index.load(LEXICAL_INDEX_PATH)
+    print(f"🔍 Using saved index: {index.n_docs} chunks ({LEXICAL_INDEX_PATH})")
+    return index
 
-# ==================== SECTION 10: QUICK SEARCH (Bonus!) ====================
 def quick_search(query=None):
     """Quick search through existing chunks"""
-    chunks = load_existing_chunks()
-    if not chunks:
+    if not has_records(CHUNKS_PATH):
         print("❌ No chunks found. Run pipeline first.")
         return
     
-    print(f"🔍 Loaded {len(chunks)} chunks for searching")
+    index = load_search_index()
+    if index is None:
+        # No saved index for these chunks: build one in memory for this search
+        total = count_records(CHUNKS_PATH)
+        print(f"🔍 Indexing {total} chunks for searching (run build_chromadb.py to keep an index)")
+        index = BM25Index.build([chunk_id(chunk) for chunk in load_existing_chunks()],
+                                (chunk['text'] for chunk in load_existing_chunks()))
     
     if not query:
         query = input("\n❓ Enter search query: ").strip()
     
-    query_words = query.lower().split()
-    results = []
-    
-    for chunk in chunks:
-        chunk_text_lower = chunk['text'].lower()
-        
-        # Calculate score
-        score = 0
-        
-        # EXACT MATCH BONUS
-        if any(word in chunk_text_lower for word in ['admission', 'fee', 'scholarship', 'faculty', 'contact']):
-            score += 3
-        
-        # ALL WORDS MATCH BONUS
-        if all(word in chunk_text_lower for word in query_words):
-            score += 2
-        
-        # ANY WORD MATCH
-        score += sum(1 for word in query_words if word in chunk_text_lower)
-        
-        # Normalize score
-        normalized_score = score / max(len(query_words) * 2, 1)
-        
-        if normalized_score > 0.2:
-            results.append({
-                'score': normalized_score,
-                'text': chunk['text'],
-                'source': chunk['source']
-            })
-    
-    results.sort(key=lambda x: x['score'], reverse=True)
+    hits = index.search(query, top_k=10)
+    # One streaming pass picks up just the matching chunks, stopping once all are found
+    wanted = {cid for cid, _ in hits}
+    found = {}
+    for chunk in load_existing_chunks():
+        cid = chunk_id(chunk)
+        if cid in wanted and cid not in found:
+            found[cid] = chunk
+            if len(found) == len(wanted):
+                break
+    results = [
+        {'score': score, 'text': found[cid]['text'], 'source': found[cid]['source']}
+        for cid, score in hits if cid in found
+    ]
     
     print(f"\n🔎 Found {len(results)} results for: '{query}'")
     print("="*60)
@@ -406,7 +691,7 @@ def quick_search(query=None):
         print(f"📝 Content: {res['text'][:300]}...")
         print("-"*60)
 
-# ==================== SECTION 11: MAIN EXECUTION ====================
+# ==================== SECTION 12: MAIN EXECUTION ====================
 if __name__ == "__main__":
     # Ensure data directory exists
     os.makedirs("data", exist_ok=True)
@@ -418,6 +703,8 @@ if __name__ == "__main__":
             run_full_pipeline()
         elif command == "chunk-only":
             run_chunk_only()
+        elif command == "replay":
+            run_replay()
         elif command == "update":
             run_update()
         elif command == "search":
@@ -428,7 +715,8 @@ if __name__ == "__main__":
             print("\nUsage:")
             print("  python single_file.py full           - Run complete pipeline")
             print("  python single_file.py chunk-only     - Re-chunk existing data")
-            print("  python single_file.py update         - Smart update (not ready)")
+            print("  python single_file.py replay         - Re-clean + re-chunk stored raw pages (offline)")
+            print("  python single_file.py update         - Incremental refresh (changed pages only)")
             print("  python single_file.py search [query] - Search existing chunks")
             print("\n  python single_file.py              - Show this help")
     else:
@@ -438,7 +726,8 @@ if __name__ == "__main__":
         print("\nCommands:")
         print("  full           - Run complete pipeline")
         print("  chunk-only     - Re-chunk existing data")
-        print("  update         - Smart update (not ready)")
+        print("  replay         - Re-clean + re-chunk stored raw pages (offline)")
+        print("  update         - Incremental refresh (changed pages only)")
         print("  search [query] - Search existing chunks")
         print("\nExamples:")
         print("  python single_file.py full")
@@ -447,8 +736,7 @@ if __name__ == "__main__":
         print("\nCurrent data status:")
         
         # Check existing files
-        if os.path.exists("data/chunks.json"):
-            chunks = load_existing_chunks()
-            print(f"  ✅ Found {len(chunks)} existing chunks")
+        if has_records(CHUNKS_PATH):
+            print(f"  ✅ Found {count_records(CHUNKS_PATH)} existing chunks")
         else:
             print("  ❌ No existing data found")
\ No newline at end of file